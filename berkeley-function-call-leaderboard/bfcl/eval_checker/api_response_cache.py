@@ -0,0 +1,148 @@
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# How the functions of `executable_python_function.py` that call external APIs get their results:
+#   "cache" (default): reuse a stored result that is younger than the function's TTL, call the API otherwise.
+#   "replay": only use stored results, whatever their age, without network access. A call that was never stored
+#             raises an error, so it fails to execute. This is the offline (mock) mode: the recorded results are
+#             served by the functions themselves rather than by a local server.
+#   "record": always call the API, and store the result.
+#   "off": always call the API, and store nothing.
+API_CACHE_MODE_ENV = "BFCL_API_CACHE_MODE"
+API_CACHE_MODES = ["cache", "replay", "record", "off"]
+# Path of the store; relative paths are relative to the `eval_checker` directory, like the other paths.
+API_CACHE_PATH_ENV = "BFCL_API_CACHE_PATH"
+DEFAULT_API_CACHE_PATH = "../../.api_response_cache.db"
+
+# TTLs, in seconds.
+VOLATILE_TTL = 10 * 60  # Prices and weather.
+DAILY_TTL = 24 * 60 * 60  # Statistics updated about once a day, and exchange rates.
+STABLE_TTL = 7 * 24 * 60 * 60  # Reference data, eg the coordinates of a city.
+
+# Messages that ip-api.com returns, with a 200 status, for addresses it can't locate or when over its quota.
+IP_API_ERROR_MESSAGES = {"private range", "reserved range", "invalid query", "quota exceeded"}
+
+_lock = threading.Lock()
+_connections = {}
+
+
+def get_api_cache_mode():
+    mode = os.environ.get(API_CACHE_MODE_ENV, "cache")
+    if mode not in API_CACHE_MODES:
+        raise ValueError(f"{API_CACHE_MODE_ENV} must be one of {API_CACHE_MODES}, got {mode!r}.")
+    return mode
+
+
+def _get_connection():
+    # One connection per process and path. Keyed by pid too, since an SQLite connection must not be used in a
+    # forked child.
+    path = os.environ.get(API_CACHE_PATH_ENV, DEFAULT_API_CACHE_PATH)
+    connection_key = (path, os.getpid())
+    if connection_key not in _connections:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        connection = sqlite3.connect(path, timeout=60, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                call TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                result BLOB NOT NULL
+            )
+            """
+        )
+        _connections[connection_key] = connection
+    return _connections[connection_key]
+
+
+def make_call_key(func, args, kwargs):
+    """
+    Returns the key of a call, and a readable form of it: the function name and its arguments bound to their
+    parameter names, with the defaults filled in, so that `f(1)`, `f(x=1)` and `f(1, y=<default>)` share a key.
+    """
+    bound_arguments = inspect.signature(func).bind(*args, **kwargs)
+    bound_arguments.apply_defaults()
+    # Tuples and lists of the same values are the same argument to these functions.
+    call = json.dumps(
+        [func.__name__, bound_arguments.arguments], sort_keys=True, ensure_ascii=False, default=repr
+    )
+    return hashlib.sha256(call.encode("utf-8")).hexdigest(), call
+
+
+def is_not_fetch_failure(result):
+    # The functions that check the status code return this message for any other status than 200.
+    return not (isinstance(result, str) and result.startswith("Failed to fetch data"))
+
+
+def is_not_response_body(result):
+    # The functions that return one field of the response return the whole body when the field is missing,
+    # eg the error message of a 429.
+    return not isinstance(result, (dict, list))
+
+
+def is_not_ip_api_error(result):
+    return not (isinstance(result, str) and result in IP_API_ERROR_MESSAGES)
+
+
+def api_cache(ttl, is_cacheable=None):
+    """
+    Memoizes a function that calls an external API, in an SQLite store shared by every process of the
+    evaluation (the ground truth pass, the sanity check, and the model results of every model). Results are kept
+    for `ttl` seconds; see `API_CACHE_MODE_ENV` for the other modes. Calls that raise or return None (eg, the
+    Amazon lookups after running out of retries) are never stored, and neither are the results for which
+    `is_cacheable(result)` is false: the functions return the errors of the API (eg, a 429) rather than raising
+    them. The TTL and the predicate are kept on the wrapper as `api_cache_ttl` and `is_cacheable`.
+    """
+    if is_cacheable is None:
+        is_cacheable = lambda result: True
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            mode = get_api_cache_mode()
+            if mode == "off":
+                return func(*args, **kwargs)
+
+            try:
+                key, call = make_call_key(func, args, kwargs)
+            except TypeError:
+                # The arguments don't fit the signature; let the function raise like it would have.
+                return func(*args, **kwargs)
+
+            if mode != "record":
+                with _lock:
+                    row = (
+                        _get_connection()
+                        .execute("SELECT stored_at, result FROM responses WHERE key = ?", (key,))
+                        .fetchone()
+                    )
+                if row is not None and (mode == "replay" or time.time() - row[0] < ttl):
+                    return pickle.loads(row[1])
+                if mode == "replay":
+                    raise LookupError(f"No recorded result for {call}")
+
+            result = func(*args, **kwargs)
+            if result is None or not is_cacheable(result):
+                return result
+            with _lock:
+                connection = _get_connection()
+                with connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO responses (key, call, stored_at, result) VALUES (?, ?, ?, ?)",
+                        (key, call, time.time(), pickle.dumps(result)),
+                    )
+            return result
+
+        wrapper.api_cache_ttl = ttl
+        wrapper.is_cacheable = is_cacheable
+        return wrapper
+
+    return decorator
@@ -0,0 +1,571 @@
+import hashlib
+import inspect
+import os
+import pickle
+import re
+
+import bfcl.model_handler.constant as model_handler_constant
+from bfcl.model_handler.constant import (
+    UNDERSCORE_TO_DOT,
+    JAVA_TYPE_CONVERSION,
+    JS_TYPE_CONVERSION,
+)
+import checker
+from checker import (
+    PYTHON_TYPE_MAPPING,
+    PYTHON_NESTED_TYPE_CHECK_LIST,
+    NESTED_CONVERSION_TYPE_LIST,
+    find_description,
+    find_perfect_matching,
+    memoize_pair_checker,
+    get_possible_answer_type,
+    type_checker,
+    standardize_string,
+    list_checker,
+    dict_checker,
+    list_dict_checker,
+)
+
+# Bump when the compiled format changes.
+VALIDATOR_VERSION = 1
+# Compiled validators are cached next to the possible answers they were compiled from.
+VALIDATOR_CACHE_DIRNAME = ".compiled_validators"
+
+# The type converters of Java and JavaScript, imported on first use since they need tree-sitter.
+_TYPE_CONVERTERS = {}
+
+
+def _get_type_converter(language):
+    if language not in _TYPE_CONVERTERS:
+        if language == "Java":
+            from java_type_converter import java_type_converter
+
+            _TYPE_CONVERTERS[language] = java_type_converter
+        else:
+            from js_type_converter import js_type_converter
+
+            _TYPE_CONVERTERS[language] = js_type_converter
+    return _TYPE_CONVERTERS[language]
+
+
+class AnswerSet:
+    """
+    The values of a list, for `in` checks by hash lookup. Gives the same result as `in` on the list: unhashable
+    values (lists, dicts) can't be equal to a hashable one, so they are only compared with each other.
+    """
+
+    def __init__(self, values):
+        hashable_values = []
+        self.unhashable_values = []
+        for value in values:
+            try:
+                hash(value)
+                hashable_values.append(value)
+            except TypeError:
+                self.unhashable_values.append(value)
+        self.hashable_values = frozenset(hashable_values)
+
+    def __contains__(self, value):
+        try:
+            return value in self.hashable_values
+        except TypeError:
+            return value in self.unhashable_values
+
+
+def _standardize_items(items):
+    # Same as the loops over the possible answers in `list_checker` and `dict_checker`, which index by position.
+    if type(items) not in (list, str):
+        raise TypeError(f"Cannot compile possible answer {repr(items)}.")
+    return [standardize_string(item) if type(item) == str else item for item in items]
+
+
+def _compile_dict_answers(possible_answers):
+    # For `dict_checker`: None for the optional marker, otherwise for each key its standardized possible values,
+    # as a list for the error message and as an `AnswerSet`, and whether the key is optional.
+    compiled_answers = []
+    for possible_answer in possible_answers:
+        if possible_answer == "":
+            compiled_answers.append(None)
+            continue
+        if type(possible_answer) != dict:
+            raise TypeError(f"Cannot compile possible answer {repr(possible_answer)}.")
+        compiled_answer = {}
+        for key, values in possible_answer.items():
+            standardized_values = _standardize_items(values)
+            compiled_answer[key] = (standardized_values, AnswerSet(standardized_values), "" in values)
+        compiled_answers.append(compiled_answer)
+    return compiled_answers
+
+
+def _check_dict(model_output, compiled_answers):
+    # Same as `dict_checker`, with the possible answers standardized ahead of time.
+    result = {"valid": False, "error": [], "error_type": "dict_checker:unclear"}
+    for possible_answer in compiled_answers:
+
+        if possible_answer is None:
+            continue
+
+        result = {"valid": False, "error": [], "error_type": "dict_checker:unclear"}
+
+        flag = True
+
+        for key, value in model_output.items():
+            if key not in possible_answer:
+                result["valid"] = False
+                result["error"].append(f"Unexpected dict key parameter: '{key}'.")
+                result["error_type"] = "value_error:dict_key"
+                flag = False
+                break
+
+            standardize_value = value
+            if type(value) == str:
+                standardize_value = standardize_string(value)
+
+            standardize_possible_answer, answer_set, _ = possible_answer[key]
+            if standardize_value not in answer_set:
+                result["valid"] = False
+                result["error"].append(
+                    f"Invalid value for parameter {repr(key)}: {repr(value)}. Expected one of {standardize_possible_answer}."
+                )
+                result["error_type"] = "value_error:dict_value"
+                flag = False
+                break
+
+        for key, (_, _, is_optional) in possible_answer.items():
+            if key not in model_output and not is_optional:
+                result["valid"] = False
+                result["error"].append(f"Missing dict key parameter: '{key}'.")
+                result["error_type"] = "value_error:dict_key"
+                flag = False
+                break
+
+        if flag:
+            return {"valid": True, "error": []}
+
+    return result
+
+
+def _check_list_dict(model_output, compiled_answers):
+    # Same as `list_dict_checker`; `compiled_answers` holds the `_compile_dict_answers` output of each dictionary.
+    result = {"valid": False, "error": [], "error_type": "list_dict_checker:unclear"}
+
+    for compiled_dicts in compiled_answers:
+        flag = True
+
+        if len(model_output) != len(compiled_dicts):
+            result["valid"] = False
+            result["error"] = ["Wrong number of dictionaries in the list."]
+            result["error_type"] = "value_error:list_dict_count"
+            flag = False
+            continue
+
+        for dict_index in range(len(model_output)):
+            result = _check_dict(model_output[dict_index], [compiled_dicts[dict_index]])
+            if not result["valid"]:
+                flag = False
+                break
+        if flag:
+            return {"valid": True, "error": []}
+
+    return result
+
+
+class ParamValidator:
+    """
+    One parameter of a `FunctionValidator`: its types resolved for the language, and its possible answers
+    standardized the way the value checker for its type needs them.
+    """
+
+    def __init__(self, param, param_details, possible_answer, language):
+        if type(possible_answer) != list:
+            raise TypeError(f"Cannot compile possible answer {repr(possible_answer)}.")
+        self.param = param
+        self.language = language
+        self.possible_answer = possible_answer
+        self.expected_type_description = param_details["type"]
+        self.nested_type = None
+        self.nested_type_converted = None
+
+        if language == "Java" or language == "JavaScript":
+            type_conversion = JAVA_TYPE_CONVERSION if language == "Java" else JS_TYPE_CONVERSION
+            self.expected_type_converted = type_conversion[self.expected_type_description]
+            if self.expected_type_description in NESTED_CONVERSION_TYPE_LIST:
+                self.nested_type = param_details["items"]["type"]
+                self.nested_type_converted = type_conversion[self.nested_type]
+        elif language == "Python":
+            self.expected_type_converted = PYTHON_TYPE_MAPPING[self.expected_type_description]
+            if self.expected_type_description in PYTHON_NESTED_TYPE_CHECK_LIST:
+                self.nested_type = param_details["items"]["type"]
+                self.nested_type_converted = PYTHON_TYPE_MAPPING[self.nested_type]
+        else:
+            raise ValueError(f"Unsupported language: {language}.")
+
+        # What `type_checker` reports as `is_variable` for a value of the expected type.
+        possible_answer_type = get_possible_answer_type(possible_answer)
+        self.is_variable_if_expected_type = (
+            possible_answer_type != None and possible_answer_type != self.expected_type_converted
+        )
+
+        self.answer_set = AnswerSet(possible_answer)
+        # Standardized possible answers for the value checker of the type; None if they are of a shape only the
+        # interpreted checker handles.
+        self.compiled_answers = None
+        if self.expected_type_converted == dict:
+            try:
+                self.compiled_answers = _compile_dict_answers(possible_answer)
+            except TypeError:
+                pass
+        elif self.expected_type_converted == list and self.nested_type_converted == dict:
+            if all(type(answer) in (list, str) for answer in possible_answer):
+                try:
+                    self.compiled_answers = [_compile_dict_answers(list(answer)) for answer in possible_answer]
+                except TypeError:
+                    pass
+        elif self.expected_type_converted == str:
+            self.compiled_answers = frozenset(
+                standardize_string(answer) for answer in possible_answer if type(answer) == str
+            )
+        elif self.expected_type_converted == list:
+            try:
+                standardized_answers = [_standardize_items(answer) for answer in possible_answer]
+            except TypeError:
+                pass
+            else:
+                # Compared as tuples, so that the hashable ones can be looked up.
+                self.compiled_answers = AnswerSet([tuple(answer) for answer in standardized_answers])
+
+    def check(self, value):
+        """
+        Same as the body of the parameter loop in `simple_function_checker`. Returns None if the value is valid.
+        """
+        param = self.param
+        language = self.language
+        expected_type_description = self.expected_type_description
+        expected_type_converted = self.expected_type_converted
+
+        if language != "Python":
+            if type(value) != str:
+                return {
+                    "valid": False,
+                    "error": [
+                        f"Incorrect type for parameter {repr(param)}. Expected type String, got {type(value).__name__}. Parameter value: {repr(value)}."
+                    ],
+                    "error_type": "type_error:java" if language == "Java" else "type_error:js",
+                }
+            type_converter = _get_type_converter(language)
+            if self.nested_type is not None:
+                value = type_converter(value, expected_type_description, self.nested_type)
+            else:
+                value = type_converter(value, expected_type_description)
+
+        if expected_type_description == "tuple" and type(value) == tuple:
+            value = list(value)
+
+        if language == "Python" and expected_type_description == "float" and type(value) == int:
+            value = float(value)
+
+        if type(value) == expected_type_converted and self.nested_type_converted == None:
+            is_variable = self.is_variable_if_expected_type
+        else:
+            type_check_result = type_checker(
+                param,
+                value,
+                self.possible_answer,
+                expected_type_description,
+                expected_type_converted,
+                self.nested_type_converted,
+            )
+            if not type_check_result["valid"]:
+                return type_check_result
+            is_variable = type_check_result["is_variable"]
+
+        if not is_variable:
+            if expected_type_converted == dict:
+                if self.compiled_answers is None:
+                    result = dict_checker(param, value, self.possible_answer)
+                else:
+                    result = _check_dict(value, self.compiled_answers)
+                return None if result["valid"] else result
+
+            elif expected_type_converted == list and self.nested_type_converted == dict:
+                if self.compiled_answers is None:
+                    result = list_dict_checker(param, value, self.possible_answer)
+                else:
+                    result = _check_list_dict(value, self.compiled_answers)
+                return None if result["valid"] else result
+
+            elif expected_type_converted == str:
+                if standardize_string(value) not in self.compiled_answers:
+                    return {
+                        "valid": False,
+                        "error": [
+                            f"Invalid value for parameter {repr(param)}: {repr(value)}. Expected one of {self.possible_answer}. Case insensitive."
+                        ],
+                        "error_type": "value_error:string",
+                    }
+                return None
+
+            elif expected_type_converted == list:
+                if self.compiled_answers is None:
+                    result = list_checker(param, value, self.possible_answer)
+                    return None if result["valid"] else result
+                standardize_model_output = tuple(
+                    standardize_string(item) if type(item) == str else item for item in value
+                )
+                if standardize_model_output not in self.compiled_answers:
+                    return {
+                        "valid": False,
+                        "error": [
+                            f"Invalid value for parameter {repr(param)}: {repr(value)}. Expected one of {self.possible_answer}."
+                        ],
+                        "error_type": "value_error:list/tuple",
+                    }
+                return None
+
+        if value not in self.answer_set:
+            return {
+                "valid": False,
+                "error": [
+                    f"Invalid value for parameter {repr(param)}: {repr(value)}. Expected one of {self.possible_answer}."
+                ],
+                "error_type": "value_error:others",
+            }
+        return None
+
+
+class FunctionValidator:
+    """
+    `simple_function_checker` compiled for one (function description, possible answer) pair.
+    """
+
+    def __init__(self, func_description, possible_answer, language):
+        # The {function name: {param: possible values}} dict, for the error payloads of the parallel checker.
+        self.possible_answer = possible_answer
+        param_answers = list(possible_answer.values())[0]
+        param_details = func_description["parameters"]["properties"]
+
+        self.func_name = func_description["name"]
+        # The name under which models that don't support "." in function names call it; see `convert_func_name`.
+        self.underscored_func_name = re.sub(r"\.", "_", self.func_name)
+        self.required_params = tuple(func_description["parameters"]["required"])
+        self.params = {
+            param: ParamValidator(param, param_details[param], param_answers[param], language)
+            for param in param_answers
+            if param in param_details
+        }
+        # Possible answer params without the "" marker, which the model output must contain.
+        self.answer_only_params = tuple(param for param in param_answers if "" not in param_answers[param])
+
+    def check(self, model_output, model_name):
+        """
+        Same as `simple_function_checker`, with the same result payloads.
+        """
+        func_name = self.func_name
+        if model_name.replace("_", "/") in UNDERSCORE_TO_DOT:
+            func_name = self.underscored_func_name
+
+        if func_name not in model_output:
+            return {
+                "valid": False,
+                "error": [f"Function name {repr(func_name)} not found in model output."],
+                "error_type": "simple_function_checker:wrong_func_name",
+            }
+
+        model_params = model_output[func_name]
+
+        for param in self.required_params:
+            if param not in model_params:
+                return {
+                    "valid": False,
+                    "error": [f"Missing required parameter: {repr(param)}."],
+                    "error_type": "simple_function_checker:missing_required",
+                }
+
+        for param, value in model_params.items():
+            param_validator = self.params.get(param)
+            if param_validator is None:
+                return {
+                    "valid": False,
+                    "error": [f"Unexpected parameter: {repr(param)}."],
+                    "error_type": "simple_function_checker:unexpected_param",
+                }
+            result = param_validator.check(value)
+            if result is not None:
+                return result
+
+        for param in self.answer_only_params:
+            if param not in model_params:
+                return {
+                    "valid": False,
+                    "error": [f"Optional parameter {repr(param)} not provided and not marked as optional."],
+                    "error_type": "simple_function_checker:missing_optional",
+                }
+
+        return {"valid": True, "error": []}
+
+
+class EntryValidator:
+    """
+    `ast_checker` compiled for one test entry: a `FunctionValidator` per function in the possible answer.
+    """
+
+    def __init__(self, func_descriptions, possible_answers, language, test_category):
+        self.test_category = test_category
+        if "parallel" in test_category:
+            expected_answers = possible_answers
+        else:
+            expected_answers = possible_answers[:1]
+
+        self.function_validators = []
+        for possible_answer in expected_answers:
+            if "parallel" in test_category or "multiple" in test_category:
+                func_description = find_description(func_descriptions, list(possible_answer.keys())[0])
+            else:
+                func_description = func_descriptions[0]
+            self.function_validators.append(FunctionValidator(func_description, possible_answer, language))
+        if not self.function_validators and "parallel" not in test_category:
+            raise ValueError("No possible answer to compile.")
+        self.expected_count = len(possible_answers)
+
+    def check(self, model_output, model_name):
+        """
+        Same as `ast_checker`, with the same result payloads.
+        """
+        if "parallel" in self.test_category:
+            return self._check_parallel_no_order(model_output, model_name)
+
+        if "multiple" in self.test_category:
+            if len(model_output) != self.expected_count:
+                return {
+                    "valid": False,
+                    "error": ["Wrong number of functions."],
+                    "error_type": "multiple_function_checker:wrong_count",
+                }
+        elif len(model_output) != 1:
+            return {
+                "valid": False,
+                "error": ["Wrong number of functions."],
+                "error_type": "simple_function_checker:wrong_count",
+            }
+        return self.function_validators[0].check(model_output[0], model_name)
+
+    def _check_parallel_no_order(self, model_output, model_name):
+        # Same as `parallel_function_checker_no_order`.
+        if len(model_output) != self.expected_count:
+            return {
+                "valid": False,
+                "error": ["Wrong number of functions."],
+                "error_type": "parallel_function_checker_no_order:wrong_count",
+            }
+
+        check_pair = memoize_pair_checker(
+            lambda i, index: self.function_validators[i].check(model_output[index], model_name)
+        )
+        if (
+            find_perfect_matching(
+                len(self.function_validators),
+                len(model_output),
+                lambda i, index: check_pair(i, index)["valid"],
+            )
+            is not None
+        ):
+            return {"valid": True, "error": []}
+
+        matched_indices = set()
+        for i, function_validator in enumerate(self.function_validators):
+            all_errors = []
+            for index in range(len(model_output)):
+                if index in matched_indices:
+                    continue
+
+                result = check_pair(i, index)
+
+                if result["valid"]:
+                    matched_indices.add(index)
+                    break
+                else:
+                    all_errors.append(
+                        {
+                            f"Model Result Index {index}": {
+                                "sub_error": result["error"],
+                                "sub_error_type": result["error_type"],
+                                "model_output_item": model_output[index],
+                                "possible_answer_item": function_validator.possible_answer,
+                            }
+                        }
+                    )
+
+            if not result["valid"]:
+                considered_indices = [i for i in range(len(model_output)) if i not in matched_indices]
+                all_errors.insert(
+                    0,
+                    f"Could not find a matching function among index {considered_indices} of model output for index {i} of possible answers.",
+                )
+                return {
+                    "valid": False,
+                    "error": all_errors,
+                    "error_type": "parallel_function_checker_no_order:cannot_find_match",
+                }
+
+        return {"valid": True, "error": []}
+
+
+def compile_entry_validator(func_descriptions, possible_answers, language, test_category):
+    """
+    Returns the `EntryValidator` of an entry, or None if the entry has a shape that only the interpreted
+    `ast_checker` handles (eg, a missing function description). Those entries are checked with `ast_checker`, which
+    then reports them as before.
+    """
+    try:
+        return EntryValidator(func_descriptions, possible_answers, language, test_category)
+    except Exception:
+        return None
+
+
+def get_validator_version():
+    # Hash of the code that the compiled validators copy their behavior and constants from.
+    digest = hashlib.sha256(str(VALIDATOR_VERSION).encode("utf-8"))
+    for module in (checker, model_handler_constant):
+        with open(inspect.getsourcefile(module), "rb") as f:
+            digest.update(f.read())
+    with open(os.path.abspath(__file__), "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def load_entry_validators(prompt_file, possible_answer_file, prompt, possible_answer, language, test_category):
+    """
+    Returns the `EntryValidator` (or None) of each entry of a test category. They are compiled once and cached
+    in a `VALIDATOR_CACHE_DIRNAME` directory next to the possible answer file, keyed by the content of the prompt
+    and possible answer files, the language and the checker code.
+    """
+    digest = hashlib.sha256(f"{get_validator_version()}|{language}|{test_category}".encode("utf-8"))
+    for file_path in (prompt_file, possible_answer_file):
+        with open(file_path, "rb") as f:
+            digest.update(f.read())
+    cache_key = digest.hexdigest()
+
+    cache_dir = os.path.join(os.path.dirname(possible_answer_file), VALIDATOR_CACHE_DIRNAME)
+    cache_file = os.path.join(cache_dir, f"{test_category}_{language}.pkl")
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            if cached["key"] == cache_key:
+                return cached["validators"]
+        except Exception:
+            # Written by another version, or partially; compiled again below.
+            pass
+
+    validators = [
+        compile_entry_validator(prompt_entry["function"], possible_answer_entry["ground_truth"], language, test_category)
+        for prompt_entry, possible_answer_entry in zip(prompt, possible_answer)
+    ]
+
+    os.makedirs(cache_dir, exist_ok=True)
+    # Written to a temporary file first, so that concurrent runs never read a partial file.
+    temp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(temp_file, "wb") as f:
+        pickle.dump({"key": cache_key, "validators": validators}, f)
+    os.replace(temp_file, cache_file)
+    return validators
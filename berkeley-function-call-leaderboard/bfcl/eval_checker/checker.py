@@ -4,7 +4,9 @@ from bfcl.model_handler.constant import (
     JS_TYPE_CONVERSION,
 )
 from eval_checker_constant import REAL_TIME_MATCH_ALLOWED_DIFFERENCE
+from credential_injection import inject_credentials
 from custom_exception import NoAPIKeyError
+import ast
 import re
 import requests  # Do not remove this import even though it seems to be unused. It's used in the executable_checker_rest function.
 import time
@@ -531,6 +533,55 @@ def parallel_function_checker_enforce_order(
     return {"valid": True, "error": []}
 
 
+def find_perfect_matching(row_count: int, column_count: int, is_compatible):
+    """
+    Pair every row with a distinct column, such that `is_compatible(row, column)` holds for each pair, with Kuhn's
+    maximum bipartite matching algorithm. Returns the column of each row, or None if no such pairing exists.
+
+    Unlike taking the first compatible column for each row in turn, this finds a pairing whenever one exists.
+    `is_compatible` is called lazily, and the free columns are tried before moving a row that is already paired, so
+    when the greedy pairing works, the same pairs are evaluated as for it.
+    """
+    column_to_row = [None] * column_count
+
+    def try_assign(row, visited_columns):
+        for column in range(column_count):
+            if column_to_row[column] is None and column not in visited_columns and is_compatible(row, column):
+                column_to_row[column] = row
+                return True
+        for column in range(column_count):
+            if column_to_row[column] is None or column in visited_columns or not is_compatible(row, column):
+                continue
+            visited_columns.add(column)
+            # Take the column if the row paired with it can move to another column.
+            if try_assign(column_to_row[column], visited_columns):
+                column_to_row[column] = row
+                return True
+        return False
+
+    for row in range(row_count):
+        if not try_assign(row, set()):
+            return None
+
+    row_to_column = [None] * row_count
+    for column, row in enumerate(column_to_row):
+        if row is not None:
+            row_to_column[row] = column
+    return row_to_column
+
+
+def memoize_pair_checker(check_pair):
+    # Each (expected index, model output index) pair is checked at most once, by the matching and the error report.
+    results = {}
+
+    def memoized_check_pair(i, index):
+        if (i, index) not in results:
+            results[(i, index)] = check_pair(i, index)
+        return results[(i, index)]
+
+    return memoized_check_pair
+
+
 def parallel_function_checker_no_order(
     func_descriptions: list,
     model_output: list,
@@ -545,29 +596,45 @@ def parallel_function_checker_no_order(
             "error_type": "parallel_function_checker_no_order:wrong_count",
         }
 
-    matched_indices = []
+    # possible_answers[i] is a dictionary with only one key
+    # We need ground truth to fetch the correct function description
+    func_description_list = [
+        find_description(func_descriptions, list(possible_answer.keys())[0])
+        for possible_answer in possible_answers
+    ]
+
+    check_pair = memoize_pair_checker(
+        lambda i, index: simple_function_checker(
+            func_description_list[i],
+            model_output[index],
+            possible_answers[i],
+            language,
+            model_name,
+        )
+    )
 
-    # We go throught the possible answers one by one, and eliminate the model output that matches the possible answer
-    # It must be this way because we need ground truth to fetch the correct function description
-    for i in range(len(possible_answers)):
-        # possible_answers[i] is a dictionary with only one key
-        func_name_expected = list(possible_answers[i].keys())[0]
-        func_description = find_description(func_descriptions, func_name_expected)
+    if (
+        find_perfect_matching(
+            len(possible_answers),
+            len(model_output),
+            lambda i, index: check_pair(i, index)["valid"],
+        )
+        is not None
+    ):
+        return {"valid": True, "error": []}
 
+    # There is no valid pairing. Report the errors of eliminating the model outputs that match the possible answers
+    # one by one, with the checks already done.
+    matched_indices = []
 
+    for i in range(len(possible_answers)):
         all_errors = []
 
         for index in range(len(model_output)):
             if index in matched_indices:
                 continue
 
-            result = simple_function_checker(
-                func_description,
-                model_output[index],
-                possible_answers[i],
-                language,
-                model_name,
-            )
+            result = check_pair(i, index)
 
             if result["valid"]:
                 matched_indices.append(index)
@@ -689,13 +756,23 @@ def patten_matcher(exec_output, expected_result, function_call, is_sanity_check)
 
 
 #### Helper functions for Exec ####
-def executable_checker_simple(
-    function_call: str,
-    expected_result,
-    expected_result_type: str,
-    is_sanity_check=False,
-):
-    result = {"valid": True, "error": [], "error_type": "executable_checker:unclear"}
+def normalize_function_call(function_call: str) -> str:
+    # Calls that only differ in formatting (spaces, quotes) are the same call.
+    try:
+        return ast.unparse(ast.parse(function_call.strip(), mode="eval"))
+    except (SyntaxError, ValueError, RecursionError):
+        return function_call.strip()
+
+
+def execute_function_call(function_call: str, sandbox=None):
+    """
+    Execute a function call from `executable_python_function`. Returns a dict with `success`, and either the
+    `output` of the call or the `error` it raised. A NoAPIKeyError is raised instead, as it stops the evaluation.
+
+    With an `execution_sandbox.ExecutionSandbox`, the call runs in one of its worker processes.
+    """
+    if sandbox is not None:
+        return sandbox.execute(function_call)
 
     exec_dict = {}
 
@@ -708,17 +785,51 @@ def executable_checker_simple(
     except NoAPIKeyError as e:
         raise e
     except Exception as e:
+        return {"success": False, "error": e}
+
+    # We need to special handle the case where the execution result is a tuple and convert it to a list
+    # Because when json is stored, the tuple is converted to a list, and so the expected result is a list when loaded from json
+    if isinstance(exec_output, tuple):
+        exec_output = list(exec_output)
+
+    return {"success": True, "output": exec_output}
+
+
+def executable_checker_simple(
+    function_call: str,
+    expected_result,
+    expected_result_type: str,
+    is_sanity_check=False,
+    sandbox=None,
+):
+    return execution_result_checker(
+        function_call,
+        execute_function_call(function_call, sandbox),
+        expected_result,
+        expected_result_type,
+        is_sanity_check,
+    )
+
+
+def execution_result_checker(
+    function_call: str,
+    execution: dict,
+    expected_result,
+    expected_result_type: str,
+    is_sanity_check=False,
+):
+    # Compares the `execute_function_call` output of `function_call` against the expected result.
+    result = {"valid": True, "error": [], "error_type": "executable_checker:unclear"}
+
+    if not execution["success"]:
         result["valid"] = False
         result["error"].append(
-            f"Error in execution: {repr(function_call)}. Error: {str(e)}"
+            f"Error in execution: {repr(function_call)}. Error: {str(execution['error'])}"
         )
         result["error_type"] = "executable_checker:execution_error"
         return result
 
-    # We need to special handle the case where the execution result is a tuple and convert it to a list
-    # Because when json is stored, the tuple is converted to a list, and so the expected result is a list when loaded from json
-    if isinstance(exec_output, tuple):
-        exec_output = list(exec_output)
+    exec_output = execution["output"]
 
     if expected_result_type == "exact_match":
         if exec_output != expected_result:
@@ -768,7 +879,10 @@ def executable_checker_simple(
 
 
 def executable_checker_parallel_no_order(
-    decoded_result: list, expected_exec_result: list, expected_exec_result_type: list
+    decoded_result: list,
+    expected_exec_result: list,
+    expected_exec_result_type: list,
+    sandbox=None,
 ):
 
     if len(decoded_result) != len(expected_exec_result):
@@ -780,6 +894,37 @@ def executable_checker_parallel_no_order(
             "error_type": "value_error:exec_result_count",
         }
 
+    # Each distinct function call is executed once, when first needed, and its output compared against every
+    # expected result. Identical calls at different indices share the execution.
+    executions = {}
+
+    def get_execution(index):
+        function_call = normalize_function_call(decoded_result[index])
+        if function_call not in executions:
+            executions[function_call] = execute_function_call(decoded_result[index], sandbox)
+        return executions[function_call]
+
+    check_pair = memoize_pair_checker(
+        lambda i, index: execution_result_checker(
+            decoded_result[index],
+            get_execution(index),
+            expected_exec_result[i],
+            expected_exec_result_type[i],
+            False,
+        )
+    )
+
+    if (
+        find_perfect_matching(
+            len(expected_exec_result),
+            len(decoded_result),
+            lambda i, index: check_pair(i, index)["valid"],
+        )
+        is not None
+    ):
+        return {"valid": True, "error": [], "error_type": "executable_checker:unclear"}
+
+    # There is no valid pairing; report the errors of a one by one elimination, as in `parallel_function_checker_no_order`.
     matched_indices = []
     for i in range(len(expected_exec_result)):
         all_errors = []
@@ -787,12 +932,7 @@ def executable_checker_parallel_no_order(
             if index in matched_indices:
                 continue
 
-            result = executable_checker_simple(
-                decoded_result[index],
-                expected_exec_result[i],
-                expected_exec_result_type[i],
-                False,
-            )
+            result = check_pair(i, index)
 
             if result["valid"]:
                 matched_indices.append(index)
@@ -830,20 +970,40 @@ def executable_checker_parallel_no_order(
 
 
 #### Main function ####
-def executable_checker_rest(func_call, idx):
+def execute_rest_call(func_call: str):
+    """
+    Evaluates a `requests.get` call of the REST category. Returns {"success": True, "output": response}, or
+    {"success": False, "error": exception} when the call raises.
+    """
     if "https://geocode.maps.co" in func_call:
         time.sleep(2)
     if "requests_get" in func_call:
         func_call = func_call.replace("requests_get", "requests.get")
     try:
-        response = eval(func_call)
+        return {"success": True, "output": eval(func_call)}
     except Exception as e:
+        return {"success": False, "error": e}
+
+
+def executable_checker_rest(func_call, idx, rest_executor=None):
+    # The model calls the APIs with the placeholders from the question; the credentials are filled in here.
+    func_call = inject_credentials(func_call)
+    if rest_executor is not None:
+        execution = rest_executor.execute(func_call)
+    else:
+        execution = execute_rest_call(func_call)
+    return rest_response_checker(execution, idx)
+
+
+def rest_response_checker(execution: dict, idx):
+    if not execution["success"]:
         return {
             "valid": False,
-            "error": [f"Execution failed. {str(e)}"],
+            "error": [f"Execution failed. {str(execution['error'])}"],
             "error_type": "executable_checker_rest:execution_error",
         }
 
+    response = execution["output"]
     try:
         if response.status_code == 200:
 
@@ -952,12 +1112,13 @@ def ast_checker(
         )
 
 
-def exec_checker(decoded_result: list, func_description: dict, test_category: str):
+def exec_checker(decoded_result: list, func_description: dict, test_category: str, sandbox=None):
     if "multiple" in test_category or "parallel" in test_category:
         return executable_checker_parallel_no_order(
             decoded_result,
             func_description["execution_result"],
             func_description["execution_result_type"],
+            sandbox,
         )
 
     else:
@@ -972,4 +1133,5 @@ def exec_checker(decoded_result: list, func_description: dict, test_category: st
             func_description["execution_result"][0],
             func_description["execution_result_type"][0],
             False,
+            sandbox,
         )
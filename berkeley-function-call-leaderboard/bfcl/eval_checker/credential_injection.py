@@ -0,0 +1,85 @@
+import json
+import os
+import re
+
+# Relative to the `eval_checker` directory, like the other paths of the evaluation.
+FUNCTION_CREDENTIAL_CONFIG_PATH = "../../function_credential_config.json"
+# Every placeholder starts with this, eg "YOUR-RAPID-API-KEY" for the "RAPID-API-KEY" credential.
+PLACEHOLDER_PREFIX = "YOUR-"
+
+_INJECTORS = {}
+
+
+def load_credentials(config_path=FUNCTION_CREDENTIAL_CONFIG_PATH):
+    """
+    Returns the credentials of `function_credential_config.json` by placeholder, including the empty ones.
+    """
+    with open(config_path) as f:
+        function_credential_config = json.load(f)
+    return {
+        f"{PLACEHOLDER_PREFIX}{name}": value
+        for item in function_credential_config
+        for name, value in item.items()
+    }
+
+
+class CredentialInjector:
+    """
+    Fills in the credentials in place of their placeholders, in memory, so that the dataset files keep the
+    placeholders. All placeholders are found in one pass of a compiled regex; credentials that are not configured
+    (empty) are left as placeholders.
+    """
+
+    def __init__(self, credentials):
+        self.credentials = {placeholder: value for placeholder, value in credentials.items() if value}
+        self.missing_credentials = [placeholder for placeholder, value in credentials.items() if not value]
+        # Longest first, in case a placeholder is a prefix of another.
+        placeholders = sorted(self.credentials, key=len, reverse=True)
+        self._pattern = re.compile("|".join(map(re.escape, placeholders))) if placeholders else None
+
+    def inject(self, text: str) -> str:
+        if self._pattern is None or PLACEHOLDER_PREFIX not in text:
+            return text
+        return self._pattern.sub(lambda match: self.credentials[match.group(0)], text)
+
+    def inject_entry(self, entry: dict) -> dict:
+        """
+        Returns a copy of a dataset entry with the credentials filled in. Only the fields that carry URLs or keys
+        are touched: the ground truth calls and the content of the question messages.
+        """
+        entry = dict(entry)
+        if "ground_truth" in entry:
+            ground_truth = entry["ground_truth"]
+            if isinstance(ground_truth, str):
+                entry["ground_truth"] = self.inject(ground_truth)
+            elif isinstance(ground_truth, list):
+                entry["ground_truth"] = [
+                    self.inject(call) if isinstance(call, str) else call for call in ground_truth
+                ]
+        if "question" in entry:
+            entry["question"] = [self._inject_message(message) for message in entry["question"]]
+        return entry
+
+    def _inject_message(self, message):
+        # The questions are lists of messages, or lists of turns of messages.
+        if isinstance(message, list):
+            return [self._inject_message(item) for item in message]
+        if isinstance(message, dict) and isinstance(message.get("content"), str):
+            return {**message, "content": self.inject(message["content"])}
+        return message
+
+
+def get_credential_injector(config_path=FUNCTION_CREDENTIAL_CONFIG_PATH):
+    # One per config file and process; the config is only read once. Without a config, nothing is filled in.
+    if config_path not in _INJECTORS:
+        credentials = load_credentials(config_path) if os.path.exists(config_path) else {}
+        _INJECTORS[config_path] = CredentialInjector(credentials)
+    return _INJECTORS[config_path]
+
+
+def inject_credentials(text: str) -> str:
+    """
+    Fills in the credentials of the evaluation's `function_credential_config.json` in `text`, eg a function call
+    of the REST category made with the placeholders from the question.
+    """
+    return get_credential_injector().inject(text)
@@ -7,4 +7,12 @@ class NoAPIKeyError(Exception):
 class BadAPIStatusError(Exception):
     def __init__(self, errors, error_rate):
         self.errors = errors
-        self.error_rate = error_rate
\ No newline at end of file
+        self.error_rate = error_rate
+
+
+class SandboxExecutionError(Exception):
+    # An exception raised by a function call in a worker of the execution sandbox, or its timeout. Carries the
+    # message of the original exception, as exceptions don't always survive pickling.
+    def __init__(self, message):
+        self.message = message
+        super().__init__(self.message)
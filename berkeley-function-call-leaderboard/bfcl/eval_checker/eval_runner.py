@@ -1,285 +1,536 @@
 from checker import ast_checker, exec_checker, executable_checker_rest
-from custom_exception import BadAPIStatusError
+from ast_validator import load_entry_validators
 from eval_runner_helper import *
 from eval_checker_constant import TEST_COLLECTION_MAPPING
+from score_cache import SCORE_CACHE_FILENAME, get_checker_version, get_score_cache, make_entry_fingerprint
+from execution_sandbox import (
+    DEFAULT_EXECUTION_TIMEOUT,
+    DEFAULT_MEMORY_LIMIT_MB,
+    close_execution_sandboxes,
+    get_execution_sandbox,
+)
+from rest_executor import DEFAULT_REST_CONCURRENCY, REST_MODES, close_rest_executors, get_rest_executor
 from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import argparse
 
 
 # NOTE: This file should be run in the `eval_checker` directory
 
 
-def single_executable_file_runner(
-    handler, model_result, prompt, model_name, test_category
-):
-    assert len(model_result) == len(prompt)
+# Test categories with more entries than this are split into shards of this size for `--jobs`.
+ENTRY_SHARD_SIZE = 250
 
-    result = []
-    correct_count = 0
-    for i in tqdm(range(len(model_result)), desc="Running tests"):
-        raw_result = model_result[i]["result"]
-        try:
-            decoded_result = handler.decode_execute(raw_result)
-        except Exception as e:
-            result.append(
-                {
-                    "id": i + 1,
-                    "model_name": model_name,
-                    "test_category": test_category,
-                    "valid": False,
-                    "error": [f"Failed to decode executable. {str(e)}"],
-                    "error_type": "executable_decoder:decoder_failed",
-                    "prompt": prompt[i],
-                    "model_result_raw": raw_result,
-                }
-            )
-            continue
 
-        if "rest" in test_category:
-            # REST is always single-functioned. Therefore we take the first one and pass it to the REST checker.
-            if not is_rest_format_output(decoded_result):
-                result.append(
-                    {
-                        "id": i + 1,
-                        "model_name": model_name,
-                        "test_category": test_category,
-                        "valid": False,
-                        "error": [
-                            "Did not output in the specified format. Note: the model_result is wrapped in a string to ensure json serializability."
-                        ],
-                        "error_type": "executable_decoder:rest_wrong_output_format",
-                        "prompt": prompt[i],
-                        "model_result_raw": str(raw_result),
-                        "model_result_decoded": str(decoded_result),
-                    }
-                )
-                continue
+def executable_entry_checker(
+    handler,
+    index,
+    model_result_entry,
+    prompt_entry,
+    model_name,
+    test_category,
+    sandbox=None,
+    rest_executor=None,
+):
+    """
+    Check one entry of an executable test category. Returns None if it is correct, and the record for the score
+    file otherwise. Same for the other `*_entry_checker` functions. The function calls of non-REST categories run
+    in the `sandbox` if given, and those of the REST category with the `rest_executor` if given.
+    """
+    raw_result = model_result_entry["result"]
+    try:
+        decoded_result = handler.decode_execute(raw_result)
+    except Exception as e:
+        return {
+            "id": index + 1,
+            "model_name": model_name,
+            "test_category": test_category,
+            "valid": False,
+            "error": [f"Failed to decode executable. {str(e)}"],
+            "error_type": "executable_decoder:decoder_failed",
+            "prompt": prompt_entry,
+            "model_result_raw": raw_result,
+        }
+
+    if "rest" in test_category:
+        # REST is always single-functioned. Therefore we take the first one and pass it to the REST checker.
+        if not is_rest_format_output(decoded_result):
+            return {
+                "id": index + 1,
+                "model_name": model_name,
+                "test_category": test_category,
+                "valid": False,
+                "error": [
+                    "Did not output in the specified format. Note: the model_result is wrapped in a string to ensure json serializability."
+                ],
+                "error_type": "executable_decoder:rest_wrong_output_format",
+                "prompt": prompt_entry,
+                "model_result_raw": str(raw_result),
+                "model_result_decoded": str(decoded_result),
+            }
+
+        checker_result = executable_checker_rest(decoded_result[0], index, rest_executor)
+
+    else:
+        if not is_executable_format_output(decoded_result):
+            return {
+                "id": index + 1,
+                "model_name": model_name,
+                "test_category": test_category,
+                "valid": False,
+                "error": [
+                    "Did not output in the specified format. Note: the model_result is wrapped in a string to ensure json serializability."
+                ],
+                "error_type": "executable_decoder:wrong_output_format",
+                "prompt": prompt_entry,
+                "model_result_raw": str(raw_result),
+                "model_result_decoded": str(decoded_result),
+            }
+
+        checker_result = exec_checker(decoded_result, prompt_entry, test_category, sandbox)
+
+    if checker_result["valid"]:
+        return None
+
+    temp = {}
+    temp["id"] = index + 1
+    temp["model_name"] = model_name
+    temp["test_category"] = test_category
+    temp["valid"] = checker_result["valid"]
+    temp["error"] = checker_result["error"]
+    temp["error_type"] = checker_result["error_type"]
+    temp["prompt"] = prompt_entry
+    temp["model_result_raw"] = raw_result
+    temp["model_result_decoded"] = decoded_result
+    if "model_executed_output" in checker_result:
+        temp["model_executed_output"] = checker_result["model_executed_output"]
+    return temp
+
+
+def relevance_entry_checker(handler, index, model_result_entry, prompt_entry, model_name, test_category):
+    # This function serves for both relevance and irrelevance tests, which share the exact opposite logic.
+    # If `test_category` is "irrelevance", the model is expected to output no function call. 
+    # No function call means either the AST decoding fails (a error message is generated) or the decoded AST does not contain any function call (such as a empty list, `[]`).
+    # If `test_category` is "relevance", the model is expected to output to a function call, and empty list doesn't count as a function call.
+    model_result_item = model_result_entry["result"]
+    contain_func_call = False
+    decoded_result = None
+    decode_error = None
+
+    try:
+        decoded_result = handler.decode_ast(model_result_item, language="Python")
+        # Decode successfully, which means the model output is in valid function call format
+        contain_func_call = True
+        if is_empty_output(decoded_result):
+            # Empty output is not considered as a valid function call
+            contain_func_call = False
 
-            checker_result = executable_checker_rest(decoded_result[0], i)
+    except Exception as e:
+        # Decode failed, which means the model output is not in valid function call format
+        contain_func_call = False
+        decode_error = str(e)
+
+    # irrelevance test means no function call outputted
+    if "irrelevance" in test_category:
+        success = not contain_func_call
+    else:
+        success = contain_func_call
+
+    if success:
+        return None
+
+    temp = {}
+    temp["id"] = index + 1
+    temp["model_name"] = model_name
+    temp["test_category"] = test_category
+    temp["valid"] = success
+    if "irrelevance" in test_category:
+        temp["error"] = [
+            f"Valid syntax. Successfully decode AST when it should not."
+        ]
+        temp["error_type"] = "irrelevance_error:decoder_success"
+    else: 
+        temp["error"] = [
+            f"Invalid syntax. Failed to decode AST when it should have. {decode_error}"
+        ]
+        temp["error_type"] = "relevance_error:decoder_failed"
+    temp["prompt"] = prompt_entry
+    temp["model_result"] = model_result_item
+    temp["decoded_result"] = decoded_result
+    return temp
+
+
+def ast_entry_checker(
+    handler,
+    index,
+    model_result_entry,
+    prompt_entry,
+    possible_answer_entry,
+    language,
+    test_category,
+    model_name,
+    validator=None,
+):
+    model_result_item = model_result_entry["result"]
+    prompt_item = prompt_entry["function"]
+    possible_answer_item = possible_answer_entry["ground_truth"]
+
+    try:
+        model_result_item_raw = model_result_item
+        model_result_item = handler.decode_ast(model_result_item, language)
+    except Exception as e:
+        return {
+            "id": index + 1,
+            "model_name": model_name,
+            "test_category": test_category,
+            "valid": False,
+            "error": [f"Invalid syntax. Failed to decode AST. {str(e)}"],
+            "error_type": "ast_decoder:decoder_failed",
+            "prompt": prompt_entry,
+            "model_result_raw": model_result_item_raw,
+            "possible_answer": possible_answer_item,
+        }
+
+    decoder_output_valid = is_function_calling_format_output(model_result_item)
+    if not decoder_output_valid:
+        return {
+            "id": index + 1,
+            "model_name": model_name,
+            "test_category": test_category,
+            "valid": False,
+            "error": [
+                "Did not output in the specified format. Note: the model_result is wrapped in a string to ensure json serializability."
+            ],
+            "error_type": "ast_decoder:decoder_wrong_output_format",
+            "prompt": prompt_entry,
+            "model_result_raw": str(model_result_item_raw),
+            "model_result_decoded": str(model_result_item),
+            "possible_answer": possible_answer_item,
+        }
+
+    # The compiled validator of the entry (see `ast_validator.py`) gives the same result as `ast_checker`.
+    if validator is not None:
+        checker_result = validator.check(model_result_item, model_name)
+    else:
+        checker_result = ast_checker(
+            prompt_item,
+            model_result_item,
+            possible_answer_item,
+            language,
+            test_category,
+            model_name,
+        )
 
+    if checker_result["valid"]:
+        return None
+
+    temp = {}
+    temp["id"] = index + 1
+    temp["model_name"] = model_name
+    temp["test_category"] = test_category
+    temp["valid"] = checker_result["valid"]
+    temp["error"] = checker_result["error"]
+    temp["error_type"] = checker_result["error_type"]
+    temp["prompt"] = prompt_entry
+    temp["model_result_raw"] = model_result_item_raw
+    temp["model_result_decoded"] = model_result_item
+    temp["possible_answer"] = possible_answer_item
+    return temp
+
+
+def check_entries(
+    handler,
+    model_result,
+    prompt,
+    possible_answer,
+    language,
+    test_category,
+    model_name,
+    start_index=0,
+    progress_bar=False,
+    score_cache=None,
+    validators=None,
+    sandbox=None,
+    rest_executor=None,
+):
+    """
+    Check a range of entries of one test category, starting at entry `start_index` of the file. Returns the
+    `*_entry_checker` output of each entry, in order.
+
+    With a `score_cache`, entries whose fingerprint was checked before reuse the cached verdict. Executable
+    categories are always checked, since their verdicts depend on live API responses. `validators` are the
+    compiled validators of the entries of an AST category, from `load_entry_validators`. With an execution `sandbox`
+    of more than one worker, the entries of a non-REST executable category are checked concurrently; so are the
+    entries of the REST category with a `rest_executor`.
+    """
+    fingerprints = None
+    cached_verdicts = {}
+    if score_cache is not None and not is_executable(test_category):
+        checker_version = get_checker_version(handler)
+        fingerprints = [
+            make_entry_fingerprint(
+                checker_version,
+                model_name,
+                test_category,
+                start_index + i,
+                model_result[i]["result"],
+                prompt[i],
+                possible_answer[i] if possible_answer is not None else None,
+                language,
+            )
+            for i in range(len(model_result))
+        ]
+        cached_verdicts = score_cache.get_many(fingerprints)
+
+    def check_entry(index):
+        i = index - start_index
+        if fingerprints is not None and fingerprints[i] in cached_verdicts:
+            return cached_verdicts[fingerprints[i]]
+        if is_relevance_or_irrelevance(test_category):
+            return relevance_entry_checker(
+                handler, index, model_result[i], prompt[i], model_name, test_category
+            )
+        elif is_executable(test_category):
+            return executable_entry_checker(
+                handler,
+                index,
+                model_result[i],
+                prompt[i],
+                model_name,
+                test_category,
+                sandbox,
+                rest_executor,
+            )
         else:
-            if not is_executable_format_output(decoded_result):
-                result.append(
-                    {
-                        "id": i + 1,
-                        "model_name": model_name,
-                        "test_category": test_category,
-                        "valid": False,
-                        "error": [
-                            "Did not output in the specified format. Note: the model_result is wrapped in a string to ensure json serializability."
-                        ],
-                        "error_type": "executable_decoder:wrong_output_format",
-                        "prompt": prompt[i],
-                        "model_result_raw": str(raw_result),
-                        "model_result_decoded": str(decoded_result),
-                    }
-                )
-                continue
+            return ast_entry_checker(
+                handler,
+                index,
+                model_result[i],
+                prompt[i],
+                possible_answer[i],
+                language,
+                test_category,
+                model_name,
+                validators[i] if validators is not None else None,
+            )
 
-            prompt_item = prompt[i]
-            checker_result = exec_checker(decoded_result, prompt_item, test_category)
+    indices = range(start_index, start_index + len(model_result))
+    concurrency = 1
+    if is_rest(test_category):
+        if rest_executor is not None:
+            concurrency = rest_executor.max_concurrency
+    elif is_executable(test_category) and sandbox is not None:
+        concurrency = sandbox.num_workers
+    if concurrency > 1:
+        # The calls run in the sandbox workers or on the event loop of the REST executor, so threads are enough to
+        # keep them all busy. `map` keeps the order.
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            entry_results = executor.map(check_entry, indices)
+            if progress_bar:
+                entry_results = tqdm(entry_results, total=len(indices), desc="Running tests")
+            entry_results = list(entry_results)
+    else:
+        if progress_bar:
+            indices = tqdm(indices, desc="Running tests")
+        entry_results = [check_entry(index) for index in indices]
+
+    if fingerprints is not None:
+        score_cache.put_many(
+            {
+                fingerprint: entry_result
+                for fingerprint, entry_result in zip(fingerprints, entry_results)
+                if fingerprint not in cached_verdicts
+            }
+        )
+    return entry_results
 
-        if checker_result["valid"]:
-            correct_count += 1
-        else:
-            temp = {}
-            temp["id"] = i + 1
-            temp["model_name"] = model_name
-            temp["test_category"] = test_category
-            temp["valid"] = checker_result["valid"]
-            temp["error"] = checker_result["error"]
-            temp["error_type"] = checker_result["error_type"]
-            temp["prompt"] = prompt[i]
-            temp["model_result_raw"] = raw_result
-            temp["model_result_decoded"] = decoded_result
-            if "model_executed_output" in checker_result:
-                temp["model_executed_output"] = checker_result["model_executed_output"]
-            result.append(temp)
-
-    accuracy = correct_count / len(model_result)
+
+def write_score_file(entry_results, model_name, test_category):
+    # The score file lists the entries that failed, after a header with the accuracy.
+    result = [entry_result for entry_result in entry_results if entry_result is not None]
+    correct_count = len(entry_results) - len(result)
+
+    accuracy = correct_count / len(entry_results)
     result.insert(
         0,
         {
             "accuracy": accuracy,
             "correct_count": correct_count,
-            "total_count": len(model_result),
+            "total_count": len(entry_results),
         },
     )
     output_file_name = f"BFCL_v2_{test_category}_score.json"
     output_file_dir = os.path.join(OUTPUT_PATH, model_name)
     write_list_of_dicts_to_file(output_file_name, result, output_file_dir)
 
-    return accuracy, len(model_result)
-
+    return accuracy, len(entry_results)
 
-def single_relevance_file_runner(handler, model_result, prompt, model_name, test_category):
-    # This function serves for both relevance and irrelevance tests, which share the exact opposite logic.
-    # If `test_category` is "irrelevance", the model is expected to output no function call. 
-    # No function call means either the AST decoding fails (a error message is generated) or the decoded AST does not contain any function call (such as a empty list, `[]`).
-    # If `test_category` is "relevance", the model is expected to output to a function call, and empty list doesn't count as a function call.
-    result = []
-    correct_count = 0
-    for i in range(len(model_result)):
-        model_result_item = model_result[i]["result"]
-        contain_func_call = False
-        decoded_result = None
-        decode_error = None
-
-        try:
-            decoded_result = handler.decode_ast(model_result_item, language="Python")
-            # Decode successfully, which means the model output is in valid function call format
-            contain_func_call = True
-            if is_empty_output(decoded_result):
-                # Empty output is not considered as a valid function call
-                contain_func_call = False
-
-        except Exception as e:
-            # Decode failed, which means the model output is not in valid function call format
-            contain_func_call = False
-            decode_error = str(e)
 
-        # irrelevance test means no function call outputted
-        if "irrelevance" in test_category:
-            success = not contain_func_call
-        else:
-            success = contain_func_call
+def single_executable_file_runner(
+    handler,
+    model_result,
+    prompt,
+    model_name,
+    test_category,
+    score_cache=None,
+    sandbox=None,
+    rest_executor=None,
+):
+    assert len(model_result) == len(prompt)
 
-        if success:
-            correct_count += 1
-        else:
-            temp = {}
-            temp["id"] = i + 1
-            temp["model_name"] = model_name
-            temp["test_category"] = test_category
-            temp["valid"] = success
-            if "irrelevance" in test_category:
-                temp["error"] = [
-                    f"Valid syntax. Successfully decode AST when it should not."
-                ]
-                temp["error_type"] = "irrelevance_error:decoder_success"
-            else: 
-                temp["error"] = [
-                    f"Invalid syntax. Failed to decode AST when it should have. {decode_error}"
-                ]
-                temp["error_type"] = "relevance_error:decoder_failed"
-            temp["prompt"] = prompt[i]
-            temp["model_result"] = model_result_item
-            temp["decoded_result"] = decoded_result
-
-            result.append(temp)
-
-    accuracy = correct_count / len(model_result)
-    result.insert(
-        0,
-        {
-            "accuracy": accuracy,
-            "correct_count": correct_count,
-            "total_count": len(model_result),
-        },
+    entry_results = check_entries(
+        handler,
+        model_result,
+        prompt,
+        None,
+        "Python",
+        test_category,
+        model_name,
+        progress_bar=True,
+        score_cache=score_cache,
+        sandbox=sandbox,
+        rest_executor=rest_executor,
     )
-    output_file_name = f"BFCL_v2_{test_category}_score.json"
-    output_file_dir = os.path.join(OUTPUT_PATH, model_name)
-    write_list_of_dicts_to_file(output_file_name, result, output_file_dir)
+    return write_score_file(entry_results, model_name, test_category)
 
-    return accuracy, len(model_result)
+
+def single_relevance_file_runner(handler, model_result, prompt, model_name, test_category, score_cache=None):
+    entry_results = check_entries(
+        handler, model_result, prompt, None, "Python", test_category, model_name, score_cache=score_cache
+    )
+    return write_score_file(entry_results, model_name, test_category)
 
 
 def single_ast_file_runner(
-    handler, model_result, prompt, possible_answer, language, test_category, model_name
+    handler,
+    model_result,
+    prompt,
+    possible_answer,
+    language,
+    test_category,
+    model_name,
+    score_cache=None,
+    validators=None,
 ):
     assert (
         len(model_result) == len(prompt) == len(possible_answer)
     ), f"The length of the model result ({len(model_result)}) does not match the length of the prompt ({len(prompt)}) or possible answer ({len(possible_answer)}). Please check the input files for completeness."
 
-    result = []
-    correct_count = 0
-    for i in range(len(model_result)):
-        model_result_item = model_result[i]["result"]
-        prompt_item = prompt[i]["function"]
-        possible_answer_item = possible_answer[i]["ground_truth"]
-
-        try:
-            model_result_item_raw = model_result_item
-            model_result_item = handler.decode_ast(model_result_item, language)
-        except Exception as e:
-            result.append(
-                {
-                    "id": i + 1,
-                    "model_name": model_name,
-                    "test_category": test_category,
-                    "valid": False,
-                    "error": [f"Invalid syntax. Failed to decode AST. {str(e)}"],
-                    "error_type": "ast_decoder:decoder_failed",
-                    "prompt": prompt[i],
-                    "model_result_raw": model_result_item_raw,
-                    "possible_answer": possible_answer_item,
-                }
-            )
-            continue
-
-        decoder_output_valid = is_function_calling_format_output(model_result_item)
-        if not decoder_output_valid:
-            result.append(
-                {
-                    "id": i + 1,
-                    "model_name": model_name,
-                    "test_category": test_category,
-                    "valid": False,
-                    "error": [
-                        "Did not output in the specified format. Note: the model_result is wrapped in a string to ensure json serializability."
-                    ],
-                    "error_type": "ast_decoder:decoder_wrong_output_format",
-                    "prompt": prompt[i],
-                    "model_result_raw": str(model_result_item_raw),
-                    "model_result_decoded": str(model_result_item),
-                    "possible_answer": possible_answer_item,
-                }
+    entry_results = check_entries(
+        handler,
+        model_result,
+        prompt,
+        possible_answer,
+        language,
+        test_category,
+        model_name,
+        score_cache=score_cache,
+        validators=validators,
+    )
+    return write_score_file(entry_results, model_name, test_category)
+
+
+# Handlers built by a worker process of `--jobs`, one per model.
+_WORKER_HANDLERS = {}
+
+
+def _check_entries_in_worker(
+    model_name_escaped,
+    model_result,
+    prompt,
+    possible_answer,
+    language,
+    test_category,
+    model_name,
+    start_index,
+    score_cache_path,
+    validators,
+    sandbox_options,
+    rest_options,
+):
+    # Returns the entry results, and the number of them that came from the score cache.
+    if model_name_escaped not in _WORKER_HANDLERS:
+        _WORKER_HANDLERS[model_name_escaped] = get_handler(model_name_escaped)
+    score_cache = get_score_cache(score_cache_path) if score_cache_path is not None else None
+    sandbox = get_execution_sandbox(sandbox_options) if sandbox_options is not None else None
+    rest_executor = get_rest_executor(rest_options) if rest_options is not None else None
+    hit_count = score_cache.hit_count if score_cache is not None else 0
+    entry_results = check_entries(
+        _WORKER_HANDLERS[model_name_escaped],
+        model_result,
+        prompt,
+        possible_answer,
+        language,
+        test_category,
+        model_name,
+        start_index,
+        score_cache=score_cache,
+        validators=validators,
+        sandbox=sandbox,
+        rest_executor=rest_executor,
+    )
+    if score_cache is not None:
+        hit_count = score_cache.hit_count - hit_count
+    return entry_results, hit_count
+
+
+def submit_file_checks(
+    executor,
+    model_name_escaped,
+    model_result,
+    prompt,
+    possible_answer,
+    language,
+    test_category,
+    model_name,
+    score_cache_path=None,
+    validators=None,
+    sandbox_options=None,
+    rest_options=None,
+):
+    """
+    Submit the checks of one test category to the process pool, split into shards of `ENTRY_SHARD_SIZE` entries.
+    Executable categories are not split, so that the APIs they call see no more concurrent requests than before.
+    """
+    shard_size = len(model_result) if is_executable(test_category) else ENTRY_SHARD_SIZE
+    futures = []
+    for start in range(0, len(model_result), max(shard_size, 1)):
+        end = start + shard_size
+        futures.append(
+            executor.submit(
+                _check_entries_in_worker,
+                model_name_escaped,
+                model_result[start:end],
+                prompt[start:end],
+                possible_answer[start:end] if possible_answer is not None else None,
+                language,
+                test_category,
+                model_name,
+                start,
+                score_cache_path,
+                validators[start:end] if validators is not None else None,
+                sandbox_options,
+                rest_options,
             )
-            continue
-
-        checker_result = ast_checker(
-            prompt_item,
-            model_result_item,
-            possible_answer_item,
-            language,
-            test_category,
-            model_name,
         )
-
-        if checker_result["valid"]:
-            correct_count += 1
-        else:
-            temp = {}
-            temp["id"] = i + 1
-            temp["model_name"] = model_name
-            temp["test_category"] = test_category
-            temp["valid"] = checker_result["valid"]
-            temp["error"] = checker_result["error"]
-            temp["error_type"] = checker_result["error_type"]
-            temp["prompt"] = prompt[i]
-            temp["model_result_raw"] = model_result_item_raw
-            temp["model_result_decoded"] = model_result_item
-            temp["possible_answer"] = possible_answer_item
-            result.append(temp)
-
-    accuracy = correct_count / len(model_result)
-    result.insert(
-        0,
-        {
-            "accuracy": accuracy,
-            "correct_count": correct_count,
-            "total_count": len(model_result),
-        },
-    )
-    output_file_name = f"BFCL_v2_{test_category}_score.json"
-    output_file_dir = os.path.join(OUTPUT_PATH, model_name)
-    write_list_of_dicts_to_file(output_file_name, result, output_file_dir)
-
-    return accuracy, len(model_result)
+    return futures
 
 
 #### Main runner function ####
-def runner(model_names, test_categories, api_sanity_check):
+def runner(
+    model_names,
+    test_categories,
+    api_sanity_check,
+    jobs=1,
+    use_score_cache=True,
+    exec_workers=1,
+    exec_timeout=DEFAULT_EXECUTION_TIMEOUT,
+    exec_memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+    rest_concurrency=DEFAULT_REST_CONCURRENCY,
+    rest_mode="live",
+    rest_cassette=None,
+    api_status_cache_window=API_STATUS_CACHE_WINDOW,
+):
 
     # A flag to indicate if the API has been tested.
     # We should always test the API with ground truth first before running the executable tests.
@@ -289,9 +540,48 @@ def runner(model_names, test_categories, api_sanity_check):
     API_STATUS_ERROR_EXECUTABLE = None
 
     # Before running the executable evaluation, we need to get the expected output from the ground truth.
-    # So we need a list of all the test categories that we have ran the ground truth evaluation on.
-    # We only get the expected output once for each test category.
-    EXECUTABLE_TEST_CATEGORIES_HAVE_RUN = []
+    # We only get the expected output once for each test category, and keep it here by test category.
+    EXECUTABLE_EXPECTED_OUTPUTS = {}
+
+    # With more than one job, the checks run in a pool of worker processes. Their results are collected after all
+    # files have been submitted, in submission order, so the score files and the leaderboard table are the same as
+    # with a single job.
+    executor = ProcessPoolExecutor(max_workers=jobs) if jobs > 1 else None
+    pending_results = []
+
+    # Verdicts of entries that were checked before are reused; see `score_cache.py`.
+    score_cache_path = os.path.join(OUTPUT_PATH, SCORE_CACHE_FILENAME) if use_score_cache else None
+    # Worker processes open their own connection.
+    score_cache = (
+        get_score_cache(score_cache_path)
+        if score_cache_path is not None and executor is None
+        else None
+    )
+    cached_entry_count = 0
+
+    # The function calls of the non-REST executable categories, model output and ground truth, run in a pool of
+    # sandboxed worker processes; see `execution_sandbox.py`. Without workers, they run in this process.
+    sandbox_options = (
+        {
+            "num_workers": exec_workers,
+            "timeout": exec_timeout,
+            "memory_limit_mb": exec_memory_limit_mb,
+        }
+        if exec_workers > 0
+        else None
+    )
+    # The calls of the REST category run concurrently on an event loop, rate limited per host, and can be recorded
+    # to or replayed from a cassette file; see `rest_executor.py`. Without concurrency, they run one by one with
+    # `requests`.
+    rest_options = (
+        {
+            "max_concurrency": rest_concurrency,
+            "mode": rest_mode,
+            "cassette_path": rest_cassette,
+        }
+        if rest_concurrency > 0
+        else None
+    )
 
     # Get a list of all entries in the folder
     entries = os.scandir(INPUT_PATH)
@@ -342,8 +632,23 @@ def runner(model_names, test_categories, api_sanity_check):
             prompt = load_file(prompt_file)
 
             if is_relevance_or_irrelevance(test_category):
+                if executor is not None:
+                    futures = submit_file_checks(
+                        executor,
+                        model_name_escaped,
+                        model_result,
+                        prompt,
+                        None,
+                        language,
+                        test_category,
+                        model_name,
+                        score_cache_path,
+                    )
+                    pending_results.append((model_name, test_category, futures))
+                    continue
+
                 accuracy, total_count = single_relevance_file_runner(
-                    handler, model_result, prompt, model_name, test_category
+                    handler, model_result, prompt, model_name, test_category, score_cache
                 )
                 record_result(
                     LEADERBOARD_TABLE, model_name, test_category, accuracy, total_count
@@ -355,38 +660,75 @@ def runner(model_names, test_categories, api_sanity_check):
                 # We only test the API with ground truth once
                 if not API_TESTED and api_sanity_check:
                     print("---- Sanity checking API status ----")
-                    try:
-                        api_status_sanity_check_rest()
-                    except BadAPIStatusError as e:
-                        API_STATUS_ERROR_REST = e
-
-                    try:
-                        api_status_sanity_check_executable()
-                    except BadAPIStatusError as e:
-                        API_STATUS_ERROR_EXECUTABLE = e    
+                    API_STATUS_ERROR_REST, API_STATUS_ERROR_EXECUTABLE = api_status_sanity_check(
+                        os.path.join(OUTPUT_PATH, API_STATUS_CACHE_FILENAME), api_status_cache_window
+                    )
 
                     display_api_status_error(API_STATUS_ERROR_REST, API_STATUS_ERROR_EXECUTABLE, display_success=True)
                     print("Continuing evaluation...")
                     
                     API_TESTED = True
 
+                category_sandbox_options = sandbox_options if not is_rest(test_category) else None
+                sandbox = (
+                    get_execution_sandbox(category_sandbox_options)
+                    if category_sandbox_options is not None
+                    else None
+                )
+                category_rest_options = rest_options if is_rest(test_category) else None
+                rest_executor = (
+                    get_rest_executor(category_rest_options)
+                    if category_rest_options is not None and executor is None
+                    else None
+                )
+
                 if (
-                    test_category not in EXECUTABLE_TEST_CATEGORIES_HAVE_RUN
+                    test_category not in EXECUTABLE_EXPECTED_OUTPUTS
                     and not is_rest(test_category)
                 ):
                     print(
                         f"---- Getting real-time execution result from ground truth for {test_category} ----"
                     )
-                    get_executable_expected_output(prompt_file)
+                    EXECUTABLE_EXPECTED_OUTPUTS[test_category] = get_executable_expected_output(
+                        prompt_file, sandbox
+                    )
                     print(
                         f"---- Ground truth real-time execution result obtained for {test_category} 🌟 ----"
                     )
-                    EXECUTABLE_TEST_CATEGORIES_HAVE_RUN.append(test_category)
-                    # Need to re-load the prompt file after getting the expected output, as the prompt file has been updated
-                    prompt = load_file(prompt_file)
+                if test_category in EXECUTABLE_EXPECTED_OUTPUTS:
+                    # The checkers read the expected output from the prompt entries; the prompt file is unchanged.
+                    for prompt_entry, execution_result in zip(
+                        prompt, EXECUTABLE_EXPECTED_OUTPUTS[test_category]
+                    ):
+                        prompt_entry["execution_result"] = execution_result
+
+                if executor is not None:
+                    assert len(model_result) == len(prompt)
+                    futures = submit_file_checks(
+                        executor,
+                        model_name_escaped,
+                        model_result,
+                        prompt,
+                        None,
+                        language,
+                        test_category,
+                        model_name,
+                        score_cache_path,
+                        sandbox_options=category_sandbox_options,
+                        rest_options=category_rest_options,
+                    )
+                    pending_results.append((model_name, test_category, futures))
+                    continue
 
                 accuracy, total_count = single_executable_file_runner(
-                    handler, model_result, prompt, model_name, test_category
+                    handler,
+                    model_result,
+                    prompt,
+                    model_name,
+                    test_category,
+                    score_cache,
+                    sandbox,
+                    rest_executor,
                 )
                 record_result(
                     LEADERBOARD_TABLE, model_name, test_category, accuracy, total_count
@@ -400,6 +742,29 @@ def runner(model_names, test_categories, api_sanity_check):
                 POSSIBLE_ANSWER_PATH, test_category
             )
             possible_answer = load_file(possible_answer_file)
+            validators = load_entry_validators(
+                prompt_file, possible_answer_file, prompt, possible_answer, language, test_category
+            )
+
+            if executor is not None:
+                assert (
+                    len(model_result) == len(prompt) == len(possible_answer)
+                ), f"The length of the model result ({len(model_result)}) does not match the length of the prompt ({len(prompt)}) or possible answer ({len(possible_answer)}). Please check the input files for completeness."
+                futures = submit_file_checks(
+                    executor,
+                    model_name_escaped,
+                    model_result,
+                    prompt,
+                    possible_answer,
+                    language,
+                    test_category,
+                    model_name,
+                    score_cache_path,
+                    validators,
+                )
+                pending_results.append((model_name, test_category, futures))
+                continue
+
             accuracy, total_count = single_ast_file_runner(
                 handler,
                 model_result,
@@ -408,23 +773,42 @@ def runner(model_names, test_categories, api_sanity_check):
                 language,
                 test_category,
                 model_name,
+                score_cache,
+                validators,
             )
             record_result(
                 LEADERBOARD_TABLE, model_name, test_category, accuracy, total_count
             )
             print(f"✅ Test completed: {test_category}. 🎯 Accuracy: {accuracy}")
 
+    if executor is not None:
+        with executor:
+            for model_name, test_category, futures in pending_results:
+                entry_results = []
+                for future in futures:
+                    shard_entry_results, shard_cached_entry_count = future.result()
+                    entry_results.extend(shard_entry_results)
+                    cached_entry_count += shard_cached_entry_count
+                accuracy, total_count = write_score_file(entry_results, model_name, test_category)
+                record_result(
+                    LEADERBOARD_TABLE, model_name, test_category, accuracy, total_count
+                )
+                print(f"✅ Test completed: {test_category}. 🎯 Accuracy: {accuracy}")
+
+    close_execution_sandboxes()
+    close_rest_executors()
+
+    if score_cache is not None:
+        cached_entry_count = score_cache.hit_count
+        score_cache.close()
+    if score_cache_path is not None:
+        print(f"♻️ Reused the cached verdicts of {cached_entry_count} entries.")
+
     # This function reads all the score files from local folder and updates the leaderboard table.
     # This is helpful when you only want to run the evaluation for a subset of models and test categories.
     update_leaderboard_table_with_score_file(LEADERBOARD_TABLE, OUTPUT_PATH)
     # Write the leaderboard table to a file
     generate_leaderboard_csv(LEADERBOARD_TABLE, OUTPUT_PATH, model_names, test_categories)
-
-    # Clean up the executable expected output files
-    # They should be re-generated the next time the evaluation is run
-    clean_up_executable_expected_output(
-        PROMPT_PATH, EXECUTABLE_TEST_CATEGORIES_HAVE_RUN
-    )
     
     display_api_status_error(API_STATUS_ERROR_REST, API_STATUS_ERROR_EXECUTABLE, display_success=False)
     
@@ -467,7 +851,74 @@ if __name__ == "__main__":
         help="Perform the REST API status sanity check before running the evaluation. By default, the sanity check is skipped.",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes to run the checks in. Large test categories are split across workers. By default, everything runs in the main process.",
+    )
+
+    parser.add_argument(
+        "--no-score-cache",
+        dest="use_score_cache",
+        action="store_false",
+        default=True,
+        help="Check every entry again, instead of reusing the verdicts of entries that have not changed since the last evaluation.",
+    )
+
+    parser.add_argument(
+        "--exec-workers",
+        type=int,
+        default=1,
+        help="Number of sandboxed worker processes that run the function calls of the executable test categories, each of them with a timeout and a memory limit. More than one runs the calls concurrently. Set to 0 to run them in the evaluator process.",
+    )
+
+    parser.add_argument(
+        "--exec-timeout",
+        type=float,
+        default=DEFAULT_EXECUTION_TIMEOUT,
+        help="Wall-clock limit in seconds for one function call in the sandbox; a call that takes longer fails with an execution error.",
+    )
+
+    parser.add_argument(
+        "--exec-memory-limit",
+        type=int,
+        default=DEFAULT_MEMORY_LIMIT_MB,
+        help="Memory limit in MB of a sandbox worker process. Set to 0 for no limit.",
+    )
+
+    parser.add_argument(
+        "--rest-concurrency",
+        type=int,
+        default=DEFAULT_REST_CONCURRENCY,
+        help="Number of REST API calls in flight at once, still rate limited per host. Set to 0 to make the calls one by one with `requests`, in which case --rest-mode is ignored.",
+    )
+
+    parser.add_argument(
+        "--rest-mode",
+        choices=REST_MODES,
+        default="live",
+        help="How the REST test category gets its API responses: `live` calls the APIs, `record` also saves the responses to the --rest-cassette file, and `replay` only reads them from that file, without network access.",
+    )
+
+    parser.add_argument(
+        "--rest-cassette",
+        type=str,
+        default=None,
+        help="Cassette file (JSON lines) to record the REST API responses to, or replay them from.",
+    )
+
+    parser.add_argument(
+        "--api-status-cache-window",
+        type=int,
+        default=API_STATUS_CACHE_WINDOW,
+        help="Number of seconds for which the outcome of the API status sanity check is reused instead of checking again. Set to 0 to always check.",
+    )
+
     args = parser.parse_args()
+    if args.rest_mode != "live" and args.rest_cassette is None:
+        parser.error(f"--rest-mode {args.rest_mode} requires --rest-cassette.")
 
     api_sanity_check = args.api_sanity_check
     test_categories = None
@@ -488,4 +939,17 @@ if __name__ == "__main__":
             # We patch it here to avoid confusing the user.
             model_names.append(model_name.replace("/", "_"))
 
-    runner(model_names, test_categories, api_sanity_check)
+    runner(
+        model_names,
+        test_categories,
+        api_sanity_check,
+        args.jobs,
+        args.use_score_cache,
+        args.exec_workers,
+        args.exec_timeout,
+        args.exec_memory_limit,
+        args.rest_concurrency,
+        args.rest_mode,
+        args.rest_cassette,
+        args.api_status_cache_window,
+    )
@@ -1,16 +1,32 @@
+import ast
 import glob
+import hashlib
 import json
 import os
 import statistics
-import subprocess
 import re
+import time
 import numpy as np
-from custom_exception import BadAPIStatusError
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from credential_injection import get_credential_injector
+from custom_exception import BadAPIStatusError, NoAPIKeyError
 from bfcl.model_handler.handler_map import handler_map
 from tqdm import tqdm
 
+# Cache of the execution results of the ground truth of the executable test categories, next to the prompt files.
+EXPECTED_OUTPUT_CACHE_DIRNAME = ".executable_expected_output"
+# Bump when the format of the cached execution results changes.
+EXPECTED_OUTPUT_CACHE_VERSION = 2
+
 REST_API_GROUND_TRUTH_FILE_PATH = "api_status_check_ground_truth_REST.json"
 EXECTUABLE_API_GROUND_TRUTH_FILE_PATH = "api_status_check_ground_truth_executable.json"
+# The API status checks run this many calls at once, each with this timeout in seconds.
+API_STATUS_CHECK_WORKERS = 8
+API_STATUS_CHECK_TIMEOUT = 30
+# The outcome of the API status checks is reused for this many seconds.
+API_STATUS_CACHE_WINDOW = 10 * 60
+API_STATUS_CACHE_FILENAME = ".api_status_cache.json"
 
 COLUMNS_NON_LIVE = [
     "Rank",
@@ -801,56 +817,130 @@ def is_empty_output(decoded_output):
         return True
 
 
-def api_status_sanity_check_rest():
+def get_rest_endpoint(function_call):
+    # The host and path of the URL of a REST call, with the placeholders of its credentials if any.
+    from rest_executor import parse_rest_call
 
-    # We only need to import the executable_checker_rest in this function. So a local import is used.
-    from checker import executable_checker_rest
+    parsed_call = parse_rest_call(function_call)
+    if parsed_call is None:
+        return function_call
+    url_parts = urlsplit(parsed_call[0])
+    return f"{url_parts.netloc}{url_parts.path}"
 
-    ground_truth_dummy = load_file(REST_API_GROUND_TRUTH_FILE_PATH)
 
-    # Use the ground truth data to make sure the API is working correctly
-    command = f"cd ../.. ; python apply_function_credential_config.py --input-path ./bfcl/eval_checker/{REST_API_GROUND_TRUTH_FILE_PATH};"
-    try:
-        subprocess.run(command, shell=True, capture_output=True, text=True, check=True)
-    except subprocess.CalledProcessError as e:
-        write_list_of_dicts_to_file(REST_API_GROUND_TRUTH_FILE_PATH, ground_truth_dummy)
-        raise RuntimeError(e.stderr) from e
+def get_function_endpoint(function_call):
+    # The name of the function of an executable call.
+    return function_call.split("(")[0].strip()
+
+
+def api_status_sanity_check_rest(
+    max_workers=API_STATUS_CHECK_WORKERS, timeout=API_STATUS_CHECK_TIMEOUT, status_records=None
+):
+    """
+    Checks the REST ground truth calls, `max_workers` at a time, with their credentials filled in in memory.
+    Calls that don't set a timeout get `timeout` seconds. Appends the endpoint, latency and verdict of each call
+    to `status_records` if given.
+    """
+    # We only need to import the REST checker in this function. So a local import is used.
+    from checker import rest_response_checker
+    from rest_executor import RestExecutor
+
+    credential_injector = get_credential_injector()
+    if not credential_injector.credentials or credential_injector.missing_credentials:
+        raise NoAPIKeyError()
+    ground_truth = load_file(REST_API_GROUND_TRUTH_FILE_PATH)
+    function_calls = [credential_injector.inject(data["ground_truth"]) for data in ground_truth]
+
+    rest_executor = RestExecutor(max_workers, timeout=timeout)
+
+    def check_call(idx):
+        start_time = time.time()
+        execution = rest_executor.execute(function_calls[idx])
+        latency = time.time() - start_time
+        return rest_response_checker(execution, idx), latency
 
-    ground_truth_replaced = load_file(REST_API_GROUND_TRUTH_FILE_PATH)
-    write_list_of_dicts_to_file(REST_API_GROUND_TRUTH_FILE_PATH, ground_truth_dummy)
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(
+                tqdm(
+                    executor.map(check_call, range(len(ground_truth))),
+                    total=len(ground_truth),
+                    desc="API Status Test (REST)",
+                )
+            )
+    finally:
+        rest_executor.close()
 
     correct_count = 0
     errors = []
-    for idx, data in tqdm(
-        enumerate(ground_truth_replaced),
-        total=len(ground_truth_replaced),
-        desc="API Status Test (REST)",
-    ):
-        status = executable_checker_rest(data["ground_truth"], idx)
+    for data, (status, latency) in zip(ground_truth, results):
+        if status_records is not None:
+            status_records.append(
+                {
+                    "category": "REST",
+                    "endpoint": get_rest_endpoint(data["ground_truth"]),
+                    "latency": latency,
+                    "valid": status["valid"],
+                }
+            )
         if status["valid"]:
             correct_count += 1
         else:
             errors.append((data, status))
 
-    if correct_count != len(ground_truth_replaced):
-        raise BadAPIStatusError(errors, f"{len(ground_truth_replaced) - correct_count} / {len(ground_truth_replaced)}")
+    if correct_count != len(ground_truth):
+        raise BadAPIStatusError(errors, f"{len(ground_truth) - correct_count} / {len(ground_truth)}")
 
 
-def api_status_sanity_check_executable():
+def api_status_sanity_check_executable(
+    max_workers=API_STATUS_CHECK_WORKERS, timeout=API_STATUS_CHECK_TIMEOUT, status_records=None
+):
+    """
+    Checks the executable ground truth calls, `max_workers` at a time, in an execution sandbox with a `timeout`
+    per call. Appends the endpoint, latency and verdict of each call to `status_records` if given.
+    """
+    from api_response_cache import API_CACHE_MODE_ENV, get_api_cache_mode
     from checker import executable_checker_simple
+    from execution_sandbox import ExecutionSandbox
 
     ground_truth = load_file(EXECTUABLE_API_GROUND_TRUTH_FILE_PATH)
-    correct_count = 0
-    errors = []
-    for data in tqdm(
-        ground_truth, total=len(ground_truth), desc="API Status Test (Non-REST)"
-    ):
+
+    # The APIs are called even if they have cached results; the fresh results are then cached for the evaluation.
+    environment = {API_CACHE_MODE_ENV: "record"} if get_api_cache_mode() == "cache" else None
+
+    def check_call(data):
+        start_time = time.time()
         status = executable_checker_simple(
             data["ground_truth"][0],
             data["execution_result"][0],
             data["execution_result_type"][0],
             True,
+            sandbox,
         )
+        return status, time.time() - start_time
+
+    with ExecutionSandbox(max_workers, timeout, environment=environment) as sandbox:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(
+                tqdm(
+                    executor.map(check_call, ground_truth),
+                    total=len(ground_truth),
+                    desc="API Status Test (Non-REST)",
+                )
+            )
+
+    correct_count = 0
+    errors = []
+    for data, (status, latency) in zip(ground_truth, results):
+        if status_records is not None:
+            status_records.append(
+                {
+                    "category": "Non-REST",
+                    "endpoint": get_function_endpoint(data["ground_truth"][0]),
+                    "latency": latency,
+                    "valid": status["valid"],
+                }
+            )
         if status["valid"]:
             correct_count += 1
         else:
@@ -860,6 +950,105 @@ def api_status_sanity_check_executable():
         raise BadAPIStatusError(errors, f"{len(ground_truth) - correct_count} / {len(ground_truth)}")
 
 
+def display_api_status_table(status_records):
+    # Availability and latency of each endpoint, over its calls in the sanity check.
+    endpoint_records = {}
+    for record in status_records:
+        endpoint_records.setdefault((record["category"], record["endpoint"]), []).append(record)
+
+    rows = []
+    for (category, endpoint), records in endpoint_records.items():
+        latencies = [record["latency"] for record in records]
+        rows.append(
+            [
+                category,
+                endpoint,
+                f"{sum(record['valid'] for record in records)} / {len(records)}",
+                f"{statistics.mean(latencies):.2f}",
+                f"{max(latencies):.2f}",
+            ]
+        )
+    rows.sort(key=lambda row: (row[0], row[1]))
+
+    header = ["Category", "Endpoint", "Available", "Mean Latency (s)", "Max Latency (s)"]
+    widths = [max(len(str(row[i])) for row in [header] + rows) for i in range(len(header))]
+    for row in [header] + rows:
+        print("  ".join(str(value).ljust(width) for value, width in zip(row, widths)))
+    print()
+
+
+def api_status_sanity_check(
+    status_cache_path=None,
+    cache_window=API_STATUS_CACHE_WINDOW,
+    max_workers=API_STATUS_CHECK_WORKERS,
+    timeout=API_STATUS_CHECK_TIMEOUT,
+):
+    """
+    Runs the REST and the executable API status checks at the same time, and prints the availability and latency
+    of each endpoint. Returns the `BadAPIStatusError` of each check, or None if it passed.
+
+    With a `status_cache_path`, the outcome is saved there, and reused instead of checking again for
+    `cache_window` seconds.
+    """
+    if status_cache_path is not None and cache_window > 0 and os.path.exists(status_cache_path):
+        try:
+            with open(status_cache_path) as f:
+                cached_status = json.load(f)
+            age = time.time() - cached_status["checked_at"]
+            if age < cache_window:
+                print(f"Reusing the API status checked {int(age)} seconds ago.")
+                display_api_status_table(cached_status["status_records"])
+                return tuple(
+                    BadAPIStatusError(*error) if error is not None else None
+                    for error in (cached_status["rest_error"], cached_status["executable_error"])
+                )
+        except Exception:
+            # Written by another version, or partially; checked again below.
+            pass
+
+    def run_check(check, status_records):
+        try:
+            check(max_workers, timeout, status_records)
+        except BadAPIStatusError as e:
+            return e
+        return None
+
+    rest_status_records = []
+    executable_status_records = []
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        rest_future = executor.submit(run_check, api_status_sanity_check_rest, rest_status_records)
+        executable_future = executor.submit(
+            run_check, api_status_sanity_check_executable, executable_status_records
+        )
+        rest_error = rest_future.result()
+        executable_error = executable_future.result()
+
+    status_records = rest_status_records + executable_status_records
+    print()
+    display_api_status_table(status_records)
+
+    if status_cache_path is not None:
+        os.makedirs(os.path.dirname(status_cache_path) or ".", exist_ok=True)
+        # Written to a temporary file first, so that concurrent runs never read a partial file.
+        temp_file = f"{status_cache_path}.{os.getpid()}.tmp"
+        with open(temp_file, "w") as f:
+            json.dump(
+                {
+                    "checked_at": time.time(),
+                    "status_records": status_records,
+                    "rest_error": [rest_error.errors, rest_error.error_rate] if rest_error else None,
+                    "executable_error": (
+                        [executable_error.errors, executable_error.error_rate] if executable_error else None
+                    ),
+                },
+                f,
+                default=repr,
+            )
+        os.replace(temp_file, status_cache_path)
+
+    return rest_error, executable_error
+
+
 def display_api_status_error(rest_error, executable_error, display_success=False):
     if not rest_error and not executable_error:
         if display_success:
@@ -885,33 +1074,147 @@ def display_api_status_error(rest_error, executable_error, display_success=False
     print(f"{RED_FONT}{'-' * 100}\n{RESET}")
 
 
-def get_executable_expected_output(prompt_file_path):
-    # Before we run the evaluation, we need to add the "execution_result" field to the prompt file, using the ground truth data.
+def get_expected_output_version():
+    # Hash of the executable functions that produce the expected outputs; changing them invalidates the cache.
+    digest = hashlib.sha256(str(EXPECTED_OUTPUT_CACHE_VERSION).encode("utf-8"))
+    function_file = os.path.join(os.path.dirname(os.path.abspath(__file__)), "executable_python_function.py")
+    with open(function_file, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+
+def make_expected_output_key(test_id, function_call):
+    return json.dumps([test_id, function_call])
+
+
+def get_api_functions():
+    """
+    Returns the functions of `executable_python_function.py` that call an external API, by name. They are the
+    ones decorated with `api_cache`, which keeps their TTL and `is_cacheable` predicate on them.
+    """
+    import executable_python_function
+
+    return {
+        name: value
+        for name, value in vars(executable_python_function).items()
+        if callable(value) and hasattr(value, "api_cache_ttl")
+    }
+
+
+def get_expected_output_policy(function_call, api_functions):
+    """
+    Returns how long the result of a ground truth call can be reused, in seconds, and whether a given result can be
+    cached at all. A call to an external API (eg, a stock price, or the coordinates of a city) expires with the
+    shortest TTL of the API functions it calls, like the results of these functions in the API response cache,
+    and an error returned by the API is not cached; the results of the other calls never expire (None).
+    """
+    try:
+        node = ast.parse(function_call, mode="eval").body
+    except SyntaxError:
+        return None, lambda output: True
+    called_functions = [
+        api_functions[call.func.id]
+        for call in ast.walk(node)
+        if isinstance(call, ast.Call) and isinstance(call.func, ast.Name) and call.func.id in api_functions
+    ]
+    ttl = min((function.api_cache_ttl for function in called_functions), default=None)
+    # The result is the one of the outermost call.
+    if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in api_functions:
+        return ttl, api_functions[node.func.id].is_cacheable
+    return ttl, lambda output: True
+
+
+def get_executable_expected_output(prompt_file_path, sandbox=None):
+    """
+    Returns the execution results of the ground truth of each entry of an executable test category, in order.
+    They are cached in an `EXPECTED_OUTPUT_CACHE_DIRNAME` directory next to the prompt file, keyed by the test id
+    and the ground truth call, so only new or expired calls are executed (see `get_expected_output_policy`). The
+    prompt file itself is never modified.
+    """
     prompt_content = load_file(prompt_file_path)
-    exec_dict = {}
-    for item in tqdm(prompt_content, desc="Getting Executable Expected Output"):
-        execution_result = []
-        ground_truth = item["ground_truth"]
-        for i in range(len(ground_truth)):
-            exec(
-                "from executable_python_function import *"
-                + "\nresult="
-                + ground_truth[i],
-                exec_dict,
+    cache_dir = os.path.join(os.path.dirname(prompt_file_path), EXPECTED_OUTPUT_CACHE_DIRNAME)
+    cache_file = os.path.join(cache_dir, os.path.basename(prompt_file_path))
+    version = get_expected_output_version()
+    api_functions = get_api_functions()
+    now = time.time()
+
+    cached_results = {}
+    if os.path.exists(cache_file):
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached["version"] == version:
+                cached_results = cached["results"]
+        except Exception:
+            # Written by another version, or partially; executed again below.
+            pass
+
+    keys = [
+        [make_expected_output_key(item["id"], function_call) for function_call in item["ground_truth"]]
+        for item in prompt_content
+    ]
+    results = {}
+    calls_to_execute = {}
+    for item, item_keys in zip(prompt_content, keys):
+        for function_call, key in zip(item["ground_truth"], item_keys):
+            ttl, _ = get_expected_output_policy(function_call, api_functions)
+            cached = cached_results.get(key)
+            if cached is not None and (ttl is None or now - cached["stored_at"] < ttl):
+                results[key] = cached["output"]
+            else:
+                calls_to_execute[key] = function_call
+
+    def execute_ground_truth(function_call):
+        if sandbox is not None:
+            execution = sandbox.execute(function_call)
+        else:
+            exec_dict = {}
+            try:
+                exec("from executable_python_function import *" + "\nresult=" + function_call, exec_dict)
+                execution = {"success": True, "output": exec_dict["result"]}
+            except Exception as e:
+                execution = {"success": False, "error": e}
+        if execution["success"]:
+            # Round-tripped through JSON like the cached results, so that both compare the same way.
+            execution["output"] = json.loads(json.dumps(execution["output"]))
+        return execution
+
+    if calls_to_execute:
+        # The ground truth calls run concurrently in the workers of the execution sandbox.
+        max_workers = sandbox.num_workers if sandbox is not None else 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            executions = list(
+                tqdm(
+                    executor.map(execute_ground_truth, calls_to_execute.values()),
+                    total=len(calls_to_execute),
+                    desc="Getting Executable Expected Output",
+                )
             )
-            execution_result.append(exec_dict["result"])
-        item["execution_result"] = execution_result
 
-    write_list_of_dicts_to_file(prompt_file_path, prompt_content)
+        # The calls that succeeded are cached even if others failed, unless the API returned an error.
+        errors = []
+        for (key, function_call), execution in zip(calls_to_execute.items(), executions):
+            if execution["success"]:
+                results[key] = execution["output"]
+                _, is_cacheable = get_expected_output_policy(function_call, api_functions)
+                if is_cacheable(execution["output"]):
+                    cached_results[key] = {"output": execution["output"], "stored_at": now}
+                else:
+                    cached_results.pop(key, None)
+            else:
+                errors.append(execution["error"])
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Written to a temporary file first, so that concurrent runs never read a partial file.
+        temp_file = f"{cache_file}.{os.getpid()}.tmp"
+        with open(temp_file, "w") as f:
+            json.dump({"version": version, "results": cached_results}, f)
+        os.replace(temp_file, cache_file)
 
+        if errors:
+            raise errors[0]
 
-def clean_up_executable_expected_output(prompt_path, categories):
-    for category in categories:
-        prompt_file = find_file_with_suffix(prompt_path, category)
-        prompt_content = load_file(prompt_file)
-        for item in prompt_content:
-            del item["execution_result"]
-        write_list_of_dicts_to_file(prompt_file, prompt_content)
+    return [[results[key] for key in item_keys] for item_keys in keys]
 
 
 def calculate_weighted_accuracy(accuracy_dict_list):
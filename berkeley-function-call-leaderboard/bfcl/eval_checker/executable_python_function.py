@@ -1,6 +1,15 @@
 import json
 import math
 import requests
+from api_response_cache import (
+    DAILY_TTL,
+    STABLE_TTL,
+    VOLATILE_TTL,
+    api_cache,
+    is_not_fetch_failure,
+    is_not_ip_api_error,
+    is_not_response_body,
+)
 from custom_exception import NoAPIKeyError
 import time
 
@@ -321,6 +330,7 @@ def sort_array(array, reverse=False):
     return sorted(array, reverse=reverse)
 
 
+@api_cache(ttl=VOLATILE_TTL, is_cacheable=is_not_fetch_failure)
 def get_weather_data(coordinates):
     """
     Fetches weather data from the Open-Meteo API for the given latitude and longitude.
@@ -347,6 +357,7 @@ def get_weather_data(coordinates):
         return "Failed to fetch data with status code: {}".format(response.status_code)
 
 
+@api_cache(ttl=STABLE_TTL, is_cacheable=is_not_fetch_failure)
 def get_coordinates_from_city(city_name):
     """
     Fetches the latitude and longitude of a given city name using the Maps.co Geocoding API.
@@ -372,6 +383,7 @@ def get_coordinates_from_city(city_name):
         return "Failed to fetch data with status code: {}".format(response.status_code)
 
 
+@api_cache(ttl=DAILY_TTL, is_cacheable=is_not_fetch_failure)
 def convert_currency(amount, from_currency, to_currency):
     """
     Converts a given amount from one currency to another using the ExchangeRate-API.
@@ -400,6 +412,7 @@ def convert_currency(amount, from_currency, to_currency):
         return "Failed to fetch data with status code: {}".format(response.status_code)
 
 
+@api_cache(ttl=STABLE_TTL)
 def find_term_on_urban_dictionary(term):
     """
     Finds the definition of a term on Urban Dictionary.
@@ -420,6 +433,7 @@ def find_term_on_urban_dictionary(term):
     return response.json()["list"][0]["definition"]
 
 
+@api_cache(ttl=STABLE_TTL, is_cacheable=lambda result: not isinstance(result, str))
 def get_coordinate_by_ip_address(ip_address):
     """
     Finds the latitude and longitude of an IP address.
@@ -434,6 +448,7 @@ def get_coordinate_by_ip_address(ip_address):
         return response.json()["message"]
 
 
+@api_cache(ttl=STABLE_TTL, is_cacheable=is_not_ip_api_error)
 def get_zipcode_by_ip_address(ip_address):
     """
     Finds the zipcode of an IP address.
@@ -448,6 +463,7 @@ def get_zipcode_by_ip_address(ip_address):
         return response.json()["message"]
 
 
+@api_cache(ttl=DAILY_TTL, is_cacheable=is_not_response_body)
 def get_covid_death_by_country(country):
     """
     Finds the most up to date total deaths of a country result from COVID.
@@ -470,6 +486,7 @@ def get_covid_death_by_country(country):
         return response.json()
 
 
+@api_cache(ttl=DAILY_TTL, is_cacheable=is_not_response_body)
 def get_active_covid_case_by_country(country):
     """
     Finds the most up to date active cases of a country result from COVID.
@@ -492,6 +509,7 @@ def get_active_covid_case_by_country(country):
         return response.json()
 
 
+@api_cache(ttl=DAILY_TTL)
 def get_rating_by_amazon_ASIN(ASIN):
     url = "https://real-time-amazon-data.p.rapidapi.com/product-details"
     querystring = {"asin": ASIN, "country": "US"}
@@ -514,6 +532,7 @@ def get_rating_by_amazon_ASIN(ASIN):
     return None
 
 
+@api_cache(ttl=VOLATILE_TTL)
 def get_price_by_amazon_ASIN(ASIN):
     url = "https://real-time-amazon-data.p.rapidapi.com/product-details"
     querystring = {"asin": ASIN, "country": "US"}
@@ -536,6 +555,7 @@ def get_price_by_amazon_ASIN(ASIN):
     return None
 
 
+@api_cache(ttl=STABLE_TTL)
 def get_product_name_by_amazon_ASIN(ASIN):
     url = "https://real-time-amazon-data.p.rapidapi.com/product-details"
     querystring = {"asin": ASIN, "country": "US"}
@@ -558,6 +578,7 @@ def get_product_name_by_amazon_ASIN(ASIN):
     return None
 
 
+@api_cache(ttl=STABLE_TTL, is_cacheable=is_not_response_body)
 def get_company_name_by_stock_name(stock_name):
     """
     Finds the company name of a stock by its stock name.
@@ -580,6 +601,7 @@ def get_company_name_by_stock_name(stock_name):
         return response.json()
 
 
+@api_cache(ttl=VOLATILE_TTL, is_cacheable=is_not_response_body)
 def get_stock_price_by_stock_name(stock_name):
     """
     Finds the price of a stock by its stock name.
@@ -602,6 +624,10 @@ def get_stock_price_by_stock_name(stock_name):
         return response.json()
 
 
+@api_cache(
+    ttl=VOLATILE_TTL,
+    is_cacheable=lambda result: isinstance(result, dict) and "message" not in result,
+)
 def get_stock_history(stock_name, interval, diffandsplits="true"):
     """
     Finds the price of a stock by its stock name.
@@ -631,6 +657,7 @@ def get_stock_history(stock_name, interval, diffandsplits="true"):
         return response.json()
 
 
+@api_cache(ttl=STABLE_TTL, is_cacheable=is_not_response_body)
 def retrieve_city_based_on_zipcode(zipcode):
     """
     Finds the city of a zipcode.
@@ -645,6 +672,7 @@ def retrieve_city_based_on_zipcode(zipcode):
         return response.json()
 
 
+@api_cache(ttl=STABLE_TTL, is_cacheable=lambda result: isinstance(result, list))
 def retrieve_holiday_by_year(country, year):
     """
     Finds the holidays of a year.
@@ -657,6 +685,7 @@ def retrieve_holiday_by_year(country, year):
     return response.json()
 
 
+@api_cache(ttl=STABLE_TTL, is_cacheable=is_not_response_body)
 def get_time_zone_by_coord(long, lat):
     """
     Finds the timezone of a coordinate.
@@ -856,6 +885,7 @@ def order_food(item, quantity, price):
     return total_price
 
 
+@api_cache(ttl=STABLE_TTL)
 def get_movie_rating(movie_name):
     """
     Fetches the age rating of a movie from the OMDB API.
@@ -868,6 +898,7 @@ def get_movie_rating(movie_name):
     return response.json()["Rated"]
 
 
+@api_cache(ttl=STABLE_TTL)
 def get_movie_director(movie_name):
     """
     Fetches the director of a movie from the OMDB API.
@@ -0,0 +1,194 @@
+import os
+import queue
+import socket
+import subprocess
+import sys
+from multiprocessing.connection import Connection
+
+from custom_exception import NoAPIKeyError, SandboxExecutionError
+
+# Wall-clock limit for one function call, in seconds.
+DEFAULT_EXECUTION_TIMEOUT = 60
+# Address space limit of a worker process, in MB; 0 means no limit.
+DEFAULT_MEMORY_LIMIT_MB = 4096
+# A worker is replaced after this many calls, so that whatever a call leaves behind (memory, changed module
+# globals) doesn't build up.
+MAX_CALLS_PER_WORKER = 500
+
+
+def _worker_main(connection, memory_limit_mb):
+    # Imported once per worker; each call then only evaluates the call expression. The import raises a
+    # NoAPIKeyError when the credentials are missing, which is reported back for every call like before.
+    namespace = {}
+    import_error = None
+    try:
+        exec("from executable_python_function import *", namespace)
+    except NoAPIKeyError as e:
+        import_error = e
+
+    if memory_limit_mb:
+        import resource
+
+        memory_limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    while True:
+        try:
+            function_call = connection.recv()
+        except EOFError:
+            # The sandbox closed the connection to retire the worker.
+            return
+
+        if import_error is not None:
+            connection.send(("no_api_key", None))
+            continue
+
+        exec_dict = dict(namespace)
+        try:
+            exec("result=" + function_call, exec_dict)
+            exec_output = exec_dict["result"]
+            # Same as `execute_function_call`.
+            if isinstance(exec_output, tuple):
+                exec_output = list(exec_output)
+            message = ("output", exec_output)
+        except NoAPIKeyError:
+            message = ("no_api_key", None)
+        except Exception as e:
+            message = ("error", str(e))
+
+        try:
+            connection.send(message)
+        except Exception as e:
+            # The output can't be pickled; it couldn't be compared against a JSON expected result either.
+            connection.send(("error", f"Cannot send the execution output back. {str(e)}"))
+
+
+class _Worker:
+    def __init__(self, memory_limit_mb, environment=None):
+        # A fresh interpreter running this file, rather than a fork of the evaluator, so that it only imports the
+        # executable functions and none of the evaluator's state or threads.
+        parent_socket, child_socket = socket.socketpair()
+        self.process = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), str(child_socket.fileno()), str(memory_limit_mb)],
+            pass_fds=(child_socket.fileno(),),
+            env={**os.environ, **environment} if environment else None,
+        )
+        child_socket.close()
+        self.connection = Connection(parent_socket.detach())
+        self.call_count = 0
+
+    def stop(self, kill=False):
+        if kill:
+            self.process.kill()
+        self.connection.close()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+
+class ExecutionSandbox:
+    """
+    A pool of worker processes that execute the function calls of the executable test categories, in place of
+    `exec` in the evaluator process.
+
+    The workers import `executable_python_function` once when they start. Each call runs with a wall-clock
+    `timeout` and in a process with at most `memory_limit_mb` of address space, so that a pathological call (eg,
+    `get_fibonacci_sequence` with a huge n) fails with an execution error instead of hanging or crashing the
+    evaluation. A worker that times out or dies is replaced, and every worker is replaced after
+    `MAX_CALLS_PER_WORKER` calls. `execute` is thread-safe, and runs up to `num_workers` calls at once.
+    `environment` holds extra environment variables for the workers.
+    """
+
+    def __init__(
+        self,
+        num_workers=1,
+        timeout=DEFAULT_EXECUTION_TIMEOUT,
+        memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+        max_calls_per_worker=MAX_CALLS_PER_WORKER,
+        environment=None,
+    ):
+        self.num_workers = num_workers
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.max_calls_per_worker = max_calls_per_worker
+        self.environment = environment
+
+        self._idle_workers = queue.Queue()
+        for _ in range(num_workers):
+            self._idle_workers.put(_Worker(memory_limit_mb, environment))
+
+    def execute(self, function_call: str):
+        """
+        Same as `checker.execute_function_call`, in a worker process. The exceptions of failed calls are returned
+        as a `SandboxExecutionError` with the same message.
+        """
+        worker = self._idle_workers.get()
+        try:
+            try:
+                worker.connection.send(function_call)
+                if not worker.connection.poll(self.timeout):
+                    worker.stop(kill=True)
+                    worker = _Worker(self.memory_limit_mb, self.environment)
+                    return {
+                        "success": False,
+                        "error": SandboxExecutionError(
+                            f"Execution timed out after {self.timeout} seconds."
+                        ),
+                    }
+                status, payload = worker.connection.recv()
+            except (EOFError, OSError):
+                # Killed, eg by the kernel for running out of memory.
+                worker.stop(kill=True)
+                worker = _Worker(self.memory_limit_mb, self.environment)
+                return {
+                    "success": False,
+                    "error": SandboxExecutionError("The execution worker process exited unexpectedly."),
+                }
+
+            worker.call_count += 1
+            if worker.call_count >= self.max_calls_per_worker:
+                worker.stop()
+                worker = _Worker(self.memory_limit_mb, self.environment)
+        finally:
+            self._idle_workers.put(worker)
+
+        if status == "no_api_key":
+            raise NoAPIKeyError()
+        if status == "error":
+            return {"success": False, "error": SandboxExecutionError(payload)}
+        return {"success": True, "output": payload}
+
+    def close(self):
+        for _ in range(self.num_workers):
+            self._idle_workers.get().stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Sandboxes of this process, keyed by their options and the pid.
+_SANDBOXES = {}
+
+
+def get_execution_sandbox(sandbox_options):
+    # Keyed by pid too, since a forked child (eg, a `--jobs` worker) must not use the workers of its parent.
+    sandbox_key = (tuple(sorted(sandbox_options.items())), os.getpid())
+    if sandbox_key not in _SANDBOXES:
+        _SANDBOXES[sandbox_key] = ExecutionSandbox(**sandbox_options)
+    return _SANDBOXES[sandbox_key]
+
+
+def close_execution_sandboxes():
+    for sandbox_key in list(_SANDBOXES):
+        if sandbox_key[1] == os.getpid():
+            _SANDBOXES.pop(sandbox_key).close()
+
+
+if __name__ == "__main__":
+    # Started by `_Worker` with the file descriptor of its end of the connection, and the memory limit.
+    _worker_main(Connection(int(sys.argv[1])), int(sys.argv[2]))
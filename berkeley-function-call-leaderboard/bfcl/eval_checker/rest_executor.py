@@ -0,0 +1,281 @@
+import ast
+import asyncio
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+from checker import execute_rest_call
+from credential_injection import get_credential_injector
+
+# Number of REST calls in flight at once.
+DEFAULT_REST_CONCURRENCY = 8
+# Requests per second per host, unless set in `HOST_RATE_LIMITS`. Up to this many can be sent at once after an
+# idle period.
+DEFAULT_HOST_RATE_LIMIT = 10
+HOST_RATE_LIMITS = {
+    # Rejects more than one request every two seconds.
+    "geocode.maps.co": 0.5,
+}
+# Default for the calls that don't set a timeout (`requests` waits forever by default).
+DEFAULT_REST_TIMEOUT = 60
+
+REST_MODES = ["live", "record", "replay"]
+# Query parameters that carry credentials. They are left out of the cassette keys, as are the headers, so that a
+# cassette recorded with one set of API keys replays with any other.
+CASSETTE_EXCLUDED_PARAMS = {"key", "api_key", "apikey", "access_key", "access_token", "token", "appid"}
+
+# Keyword arguments of `requests.get` that are sent with httpx; calls with any other go through `requests`.
+# `stream` only changes when `requests` reads the body, which the checker reads in full anyway.
+SUPPORTED_ARGUMENTS = {"params", "headers", "timeout", "auth", "cookies", "allow_redirects", "stream"}
+
+
+def parse_rest_call(func_call: str):
+    """
+    Returns the URL and keyword arguments of a `requests.get` call whose arguments are all literals, or None for
+    anything else.
+    """
+    try:
+        node = ast.parse(func_call.strip(), mode="eval").body
+    except SyntaxError:
+        return None
+    if not isinstance(node, ast.Call):
+        return None
+    func = node.func
+    is_requests_get = (
+        isinstance(func, ast.Attribute)
+        and func.attr == "get"
+        and isinstance(func.value, ast.Name)
+        and func.value.id == "requests"
+    ) or (isinstance(func, ast.Name) and func.id == "requests_get")
+    if not is_requests_get or any(keyword.arg is None for keyword in node.keywords):
+        return None
+
+    try:
+        args = [ast.literal_eval(arg) for arg in node.args]
+        kwargs = {keyword.arg: ast.literal_eval(keyword.value) for keyword in node.keywords}
+    except (ValueError, TypeError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+    # requests.get(url, params=None, **kwargs)
+    for name, value in zip(["url", "params"], args):
+        if name in kwargs:
+            return None
+        kwargs[name] = value
+    if len(args) > 2 or "url" not in kwargs or not isinstance(kwargs["url"], str):
+        return None
+    url = kwargs.pop("url")
+    if set(kwargs) - SUPPORTED_ARGUMENTS:
+        return None
+    if kwargs.get("timeout") is not None and not isinstance(kwargs["timeout"], (int, float)):
+        return None
+    return url, kwargs
+
+
+def _encode_params(params):
+    # The query parameters as `requests` encodes them: None values are dropped, other values go through `str`.
+    if params is None:
+        return []
+    if isinstance(params, str):
+        return parse_qsl(params, keep_blank_values=True)
+    items = params.items() if isinstance(params, dict) else params
+    encoded_params = []
+    for key, value in items:
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if item is not None:
+                encoded_params.append((str(key), str(item)))
+    return encoded_params
+
+
+def _load_credential_placeholders():
+    # Maps each configured credential to its placeholder in the dataset, eg the RapidAPI key to "YOUR-RAPID-API-KEY".
+    return {value: placeholder for placeholder, value in get_credential_injector().credentials.items()}
+
+
+def make_cassette_key(url, params, credential_placeholders):
+    """
+    Key of a GET request in a cassette: the URL with a lowercase scheme and host, and its query parameters merged
+    with `params` and sorted, without credentials.
+    """
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True) + _encode_params(params)
+    query = sorted((key, value) for key, value in query if key.lower() not in CASSETTE_EXCLUDED_PARAMS)
+    cassette_key = f"GET {parts.scheme.lower()}://{parts.netloc.lower()}{parts.path}?{urlencode(query)}"
+    # Some APIs take the key in the path instead.
+    for credential, placeholder in credential_placeholders.items():
+        cassette_key = cassette_key.replace(credential, placeholder)
+    return cassette_key
+
+
+class RecordedResponse:
+    """
+    A response replayed from a cassette, with the attributes of a `requests` response that the checker uses.
+    """
+
+    def __init__(self, status_code, text):
+        self.status_code = status_code
+        self.text = text
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class TokenBucket:
+    """
+    Allows `rate` requests per second on average, and bursts of up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RestExecutor:
+    """
+    Runs the `requests.get` calls of the REST category concurrently on an event loop in a background thread, with
+    one httpx connection pool for all of them and a token bucket per host in place of fixed sleeps.
+
+    In "record" mode, every response is also appended to the `cassette_path` JSON lines file, keyed by
+    `make_cassette_key`. In "replay" mode, responses only come from the cassette, so the REST category is scored
+    offline and deterministically; a call that was never recorded fails to execute.
+
+    Calls that aren't a `requests.get` with literal arguments, or that use arguments httpx doesn't support, run
+    with `requests` as before in "live" mode. They can't be keyed, so they fail to execute in the other modes,
+    and a recorded run scores the same as its replay. `timeout` applies to the calls that don't set one. `execute` is thread-safe and
+    blocks until the response is in.
+    """
+
+    def __init__(
+        self, max_concurrency=DEFAULT_REST_CONCURRENCY, mode="live", cassette_path=None, timeout=DEFAULT_REST_TIMEOUT
+    ):
+        if mode != "live" and cassette_path is None:
+            raise ValueError(f"The {mode} mode needs a cassette file.")
+        self.max_concurrency = max_concurrency
+        self.mode = mode
+        self.cassette_path = cassette_path
+        self.timeout = timeout
+
+        self._credential_placeholders = _load_credential_placeholders()
+        self._cassette = {}
+        if mode == "replay":
+            with open(cassette_path) as f:
+                for line in f:
+                    if line.strip():
+                        recorded = json.loads(line)
+                        # The last recording of a key wins.
+                        self._cassette[recorded["key"]] = recorded
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+        self._thread.start()
+        self._host_buckets = {}
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._client = None
+        if mode != "replay":
+            import httpx
+
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+                timeout=timeout,
+            )
+
+    def _get_host_bucket(self, url):
+        host = (urlsplit(url).hostname or "").lower()
+        if host not in self._host_buckets:
+            rate = HOST_RATE_LIMITS.get(host, DEFAULT_HOST_RATE_LIMIT)
+            self._host_buckets[host] = TokenBucket(rate, max(1, rate))
+        return self._host_buckets[host]
+
+    def _record(self, cassette_key, response):
+        with open(self.cassette_path, "a") as f:
+            f.write(
+                json.dumps({"key": cassette_key, "status_code": response.status_code, "text": response.text}) + "\n"
+            )
+
+    async def _execute(self, func_call):
+        parsed_call = parse_rest_call(func_call)
+
+        if self.mode != "live" and parsed_call is None:
+            return {
+                "success": False,
+                "error": ValueError("Only `requests.get` calls with literal arguments can be replayed."),
+            }
+
+        if self.mode == "replay":
+            url, kwargs = parsed_call
+            cassette_key = make_cassette_key(url, kwargs.get("params"), self._credential_placeholders)
+            if cassette_key not in self._cassette:
+                return {"success": False, "error": LookupError(f"No recorded response for {cassette_key}")}
+            recorded = self._cassette[cassette_key]
+            return {"success": True, "output": RecordedResponse(recorded["status_code"], recorded["text"])}
+
+        if parsed_call is None:
+            # Not ours to interpret; `eval` it like before, off the event loop.
+            return await self._loop.run_in_executor(None, execute_rest_call, func_call)
+
+        url, kwargs = parsed_call
+        async with self._semaphore:
+            await self._get_host_bucket(url).acquire()
+            try:
+                response = await self._client.get(
+                    url,
+                    params=_encode_params(kwargs.get("params")),
+                    headers=kwargs.get("headers"),
+                    cookies=kwargs.get("cookies"),
+                    auth=kwargs.get("auth"),
+                    timeout=kwargs.get("timeout") or self.timeout,
+                    follow_redirects=kwargs.get("allow_redirects", True),
+                )
+            except Exception as e:
+                return {"success": False, "error": e}
+
+        if self.mode == "record":
+            self._record(make_cassette_key(url, kwargs.get("params"), self._credential_placeholders), response)
+        return {"success": True, "output": response}
+
+    def execute(self, func_call: str):
+        """
+        Same as `checker.execute_rest_call`.
+        """
+        return asyncio.run_coroutine_threadsafe(self._execute(func_call), self._loop).result()
+
+    def close(self):
+        if self._client is not None:
+            asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+# REST executors of this process, keyed by their options and the pid.
+_REST_EXECUTORS = {}
+
+
+def get_rest_executor(rest_options):
+    # Keyed by pid too, since a forked child (eg, a `--jobs` worker) must not use the event loop of its parent.
+    executor_key = (tuple(sorted(rest_options.items())), os.getpid())
+    if executor_key not in _REST_EXECUTORS:
+        _REST_EXECUTORS[executor_key] = RestExecutor(**rest_options)
+    return _REST_EXECUTORS[executor_key]
+
+
+def close_rest_executors():
+    for executor_key in list(_REST_EXECUTORS):
+        if executor_key[1] == os.getpid():
+            _REST_EXECUTORS.pop(executor_key).close()
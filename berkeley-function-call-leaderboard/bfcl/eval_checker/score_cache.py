@@ -0,0 +1,141 @@
+import hashlib
+import inspect
+import json
+import os
+import sqlite3
+
+import bfcl.model_handler.utils as model_handler_utils
+
+# Bump when the format of the cached verdicts changes.
+SCORE_CACHE_VERSION = 1
+SCORE_CACHE_FILENAME = ".score_cache.db"
+# Source files whose code decides the verdict of an entry, next to this file. The model handler's decoder is
+# added per handler class.
+CHECKER_SOURCE_FILES = [
+    "ast_validator.py",
+    "checker.py",
+    "eval_checker_constant.py",
+    "eval_runner.py",
+    "eval_runner_helper.py",
+    "java_type_converter.py",
+    "js_type_converter.py",
+]
+# The same, in `bfcl/model_handler`: the parsers and constants that the model handler utils decode with.
+MODEL_HANDLER_SOURCE_FILES = [
+    "constant.py",
+    "java_parser.py",
+    "js_parser.py",
+]
+# SQLite limits the number of parameters in one statement.
+MAX_KEYS_PER_QUERY = 500
+
+_CHECKER_VERSIONS = {}
+_SCORE_CACHES = {}
+
+
+def get_checker_version(handler):
+    """
+    Hash of the code that produces the verdicts for `handler`: the checker modules, plus the handler classes (for
+    `decode_ast`/`decode_execute`) and the model handler utils they parse with. Any change to them invalidates
+    the cached verdicts.
+    """
+    handler_class = type(handler)
+    if handler_class not in _CHECKER_VERSIONS:
+        checker_dir = os.path.dirname(os.path.abspath(__file__))
+        source_files = [os.path.join(checker_dir, filename) for filename in CHECKER_SOURCE_FILES]
+        for cls in handler_class.__mro__:
+            if cls is not object:
+                source_files.append(inspect.getsourcefile(cls))
+        source_files.append(inspect.getsourcefile(model_handler_utils))
+        model_handler_dir = os.path.dirname(os.path.abspath(inspect.getsourcefile(model_handler_utils)))
+        source_files += [os.path.join(model_handler_dir, filename) for filename in MODEL_HANDLER_SOURCE_FILES]
+
+        digest = hashlib.sha256(str(SCORE_CACHE_VERSION).encode("utf-8"))
+        for source_file in dict.fromkeys(source_files):
+            with open(source_file, "rb") as f:
+                digest.update(f.read())
+        _CHECKER_VERSIONS[handler_class] = digest.hexdigest()
+    return _CHECKER_VERSIONS[handler_class]
+
+
+def make_entry_fingerprint(
+    checker_version, model_name, test_category, index, model_result, prompt, possible_answer, language
+):
+    # The score file record of a failed entry also contains its position, model name and category.
+    serialized = json.dumps(
+        [checker_version, model_name, test_category, index, model_result, prompt, possible_answer, language],
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class ScoreCache:
+    """
+    On-disk cache of per-entry verdicts, backed by SQLite and keyed by `make_entry_fingerprint`.
+
+    A verdict is the output of the entry checker: None for a correct entry, or the record that goes into the score
+    file. It only depends on the fingerprinted inputs, so a re-run only checks the entries whose result, prompt,
+    possible answer or checker code changed. Several worker processes may share the same file.
+    """
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.hit_count = 0
+        self.miss_count = 0
+
+        self._connection = sqlite3.connect(path, timeout=60)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS verdicts (
+                key TEXT PRIMARY KEY,
+                verdict TEXT NOT NULL
+            )
+            """
+        )
+
+    def get_many(self, keys):
+        """
+        Returns a dict of the cached verdicts among `keys`.
+        """
+        verdicts = {}
+        unique_keys = list(dict.fromkeys(keys))
+        for start in range(0, len(unique_keys), MAX_KEYS_PER_QUERY):
+            batch = unique_keys[start : start + MAX_KEYS_PER_QUERY]
+            rows = self._connection.execute(
+                f"SELECT key, verdict FROM verdicts WHERE key IN ({','.join('?' * len(batch))})", batch
+            ).fetchall()
+            for key, verdict in rows:
+                verdicts[key] = json.loads(verdict)
+        self.hit_count += sum(1 for key in keys if key in verdicts)
+        self.miss_count += sum(1 for key in keys if key not in verdicts)
+        return verdicts
+
+    def put_many(self, verdicts):
+        # The score files are written with `json.dumps`, so a verdict loaded back from JSON writes out the same.
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO verdicts (key, verdict) VALUES (?, ?)",
+                [(key, json.dumps(verdict)) for key, verdict in verdicts.items()],
+            )
+
+    def get_stats(self):
+        lookup_count = self.hit_count + self.miss_count
+        return {
+            "hit_count": self.hit_count,
+            "miss_count": self.miss_count,
+            "hit_rate": self.hit_count / lookup_count if lookup_count else 0,
+        }
+
+    def close(self):
+        self._connection.close()
+
+
+def get_score_cache(path):
+    # One connection per process. Keyed by pid too, since an SQLite connection must not be used in a forked child.
+    cache_key = (path, os.getpid())
+    if cache_key not in _SCORE_CACHES:
+        _SCORE_CACHES[cache_key] = ScoreCache(path)
+    return _SCORE_CACHES[cache_key]
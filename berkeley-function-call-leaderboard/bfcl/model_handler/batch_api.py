@@ -0,0 +1,291 @@
+import copy
+import json
+import os
+import time
+
+from bfcl.model_handler.transport import get_http_client
+from bfcl.model_handler.utils import unpack_test_case
+
+# Kept next to the result files of each model, so that an interrupted run picks up its submitted batches again.
+BATCH_STATE_FILENAME = ".batch_api_state.json"
+# Providers cap the size of one batch; larger runs are split into several.
+MAX_REQUESTS_PER_BATCH = 10000
+DEFAULT_POLL_INTERVAL = 60
+
+ANTHROPIC_VERSION = "2023-06-01"
+ANTHROPIC_BATCH_BETA = "message-batches-2024-09-24"
+
+
+class _RequestCaptured(Exception):
+    def __init__(self, request):
+        super().__init__("Request captured for the batch API")
+        self.request = request
+
+
+def render_request(handler, test_case):
+    """
+    Build the request that `handler.inference` would send for this test case, without sending it.
+    """
+    user_question, functions, test_category = unpack_test_case(test_case)
+
+    def capture(send, request):
+        raise _RequestCaptured(request)
+
+    handler._request_interceptor = capture
+    try:
+        # The handlers edit the question in place (eg, to add the system prompt), and it is used again to parse
+        # the response.
+        handler.inference(copy.deepcopy(user_question), functions, test_category)
+    except _RequestCaptured as captured:
+        return captured.request
+    finally:
+        handler._request_interceptor = None
+    raise RuntimeError(f"{type(handler).__name__} did not send a request for {test_case['id']}")
+
+
+def parse_response(handler, test_case, response):
+    """
+    Run `handler.inference` for this test case with `response` standing in for the provider's answer, so that
+    batch results go through exactly the same decoding as interactive ones.
+    """
+    user_question, functions, test_category = unpack_test_case(test_case)
+    # Batch requests have no meaningful latency.
+    handler._request_interceptor = lambda send, request: (response, None)
+    try:
+        result, metadata = handler.inference(copy.deepcopy(user_question), functions, test_category)
+    finally:
+        handler._request_interceptor = None
+    if metadata.get("latency", 0) is None:
+        del metadata["latency"]
+
+    result_to_write = {"id": test_case["id"], "result": result}
+    result_to_write.update(metadata)
+    return result_to_write
+
+
+class OpenAIBatchClient:
+    """
+    OpenAI Batch API, through the handler's OpenAI client.
+    """
+
+    def __init__(self, handler):
+        self.client = handler.client
+
+    def submit(self, requests):
+        lines = [
+            json.dumps(
+                {
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": request,
+                }
+            )
+            for custom_id, request in requests
+        ]
+        input_file = self.client.files.create(
+            file=("batch_input.jsonl", ("\n".join(lines) + "\n").encode("utf-8")),
+            purpose="batch",
+        )
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+        return batch.id
+
+    def poll(self, batch_id):
+        """
+        Returns None while the batch is running, then a list of `(custom_id, response body, error message)`.
+        Requests that were not processed (eg, the batch expired) are left out, so they are submitted again.
+        """
+        batch = self.client.batches.retrieve(batch_id)
+        if batch.status in ("validating", "in_progress", "finalizing", "cancelling"):
+            return None
+        if batch.status == "failed":
+            raise RuntimeError(f"OpenAI batch {batch_id} failed: {batch.errors}")
+
+        results = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id is None:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                error = entry.get("error")
+                response = entry.get("response") or {}
+                if error is None and response.get("status_code") == 200:
+                    results.append((entry["custom_id"], response["body"], None))
+                elif error is not None and error.get("code") in ("batch_expired", "batch_cancelled"):
+                    continue
+                else:
+                    error = error or response.get("body", {}).get("error")
+                    results.append((entry["custom_id"], None, str(error)))
+        return results
+
+    @staticmethod
+    def to_response(body):
+        from openai.types.chat import ChatCompletion
+
+        return ChatCompletion.model_validate(body)
+
+
+class AnthropicBatchClient:
+    """
+    Anthropic Message Batches API. The pinned `anthropic` SDK predates it, so this calls the REST endpoints directly.
+    """
+
+    def __init__(self, handler):
+        self.base_url = str(handler.client.base_url).rstrip("/")
+        self.http_client = get_http_client(self.base_url)
+        self.headers = {
+            "x-api-key": handler.client.api_key,
+            "anthropic-version": ANTHROPIC_VERSION,
+            "anthropic-beta": ANTHROPIC_BATCH_BETA,
+        }
+
+    def submit(self, requests):
+        response = self.http_client.post(
+            f"{self.base_url}/v1/messages/batches",
+            headers=self.headers,
+            json={
+                "requests": [
+                    {"custom_id": custom_id, "params": request}
+                    for custom_id, request in requests
+                ]
+            },
+            timeout=600,
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def poll(self, batch_id):
+        # Same contract as `OpenAIBatchClient.poll`.
+        response = self.http_client.get(
+            f"{self.base_url}/v1/messages/batches/{batch_id}", headers=self.headers, timeout=60
+        )
+        response.raise_for_status()
+        batch = response.json()
+        if batch["processing_status"] != "ended":
+            return None
+
+        response = self.http_client.get(batch["results_url"], headers=self.headers, timeout=600)
+        response.raise_for_status()
+        results = []
+        for line in response.text.splitlines():
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            result = entry["result"]
+            if result["type"] == "succeeded":
+                results.append((entry["custom_id"], result["message"], None))
+            elif result["type"] == "errored":
+                results.append((entry["custom_id"], None, str(result.get("error"))))
+        return results
+
+    @staticmethod
+    def to_response(body):
+        from anthropic.types import Message
+
+        return Message.model_validate(body)
+
+
+BATCH_CLIENTS = {
+    "openai": OpenAIBatchClient,
+    "anthropic": AnthropicBatchClient,
+}
+
+
+class BatchGenerationJob:
+    """
+    Batch API generation for one model. The submitted batches are recorded in a state file in the model's
+    result directory, so that polling resumes where it left off if the process is restarted.
+    """
+
+    def __init__(self, handler, test_cases, result_dir):
+        self.handler = handler
+        self.test_cases = {test_case["id"]: test_case for test_case in test_cases}
+        self.client = BATCH_CLIENTS[handler.batch_api](handler)
+        self.state_path = os.path.join(result_dir, BATCH_STATE_FILENAME)
+        os.makedirs(result_dir, exist_ok=True)
+        self.batches = self._load_state()
+
+    def _load_state(self):
+        if not os.path.exists(self.state_path):
+            return []
+        with open(self.state_path) as f:
+            state = json.load(f)
+        if state["model_name"] != self.handler.model_name:
+            raise ValueError(f"{self.state_path} belongs to another model: {state['model_name']}")
+        return state["batches"]
+
+    def _save_state(self):
+        if not self.batches:
+            if os.path.exists(self.state_path):
+                os.remove(self.state_path)
+            return
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as f:
+            json.dump({"model_name": self.handler.model_name, "batches": self.batches}, f)
+        os.replace(temp_path, self.state_path)
+
+    def submit(self):
+        # Test cases of batches submitted by an earlier run are not submitted again.
+        in_flight = {custom_id for batch in self.batches for custom_id in batch["custom_ids"]}
+        pending = [test_case for test_case_id, test_case in self.test_cases.items() if test_case_id not in in_flight]
+        for start in range(0, len(pending), MAX_REQUESTS_PER_BATCH):
+            chunk = pending[start : start + MAX_REQUESTS_PER_BATCH]
+            requests = [(test_case["id"], render_request(self.handler, test_case)) for test_case in chunk]
+            batch_id = self.client.submit(requests)
+            self.batches.append({"batch_id": batch_id, "custom_ids": [custom_id for custom_id, _ in requests]})
+            self._save_state()
+            print(f"📤 Submitted batch {batch_id} with {len(requests)} requests for {self.handler.model_name}.")
+
+    def poll(self):
+        """
+        Check every running batch once and write the results of the finished ones. Returns True once all are done.
+        """
+        for batch in list(self.batches):
+            results = self.client.poll(batch["batch_id"])
+            if results is None:
+                continue
+            for custom_id, body, error in results:
+                test_case = self.test_cases.get(custom_id)
+                if test_case is None:
+                    # Submitted by an earlier run and already written since.
+                    continue
+                if error is not None:
+                    result_to_write = {"id": custom_id, "result": f"Error during inference: {error}"}
+                else:
+                    try:
+                        result_to_write = parse_response(self.handler, test_case, self.client.to_response(body))
+                    except Exception as e:
+                        result_to_write = {"id": custom_id, "result": f"Error during inference: {str(e)}"}
+                self.handler.write(result_to_write)
+                del self.test_cases[custom_id]
+            self.batches.remove(batch)
+            self._save_state()
+            print(f"📥 Batch {batch['batch_id']} for {self.handler.model_name} is done: {len(results)} results.")
+        return not self.batches
+
+
+def run_batch_generation(generation_jobs, poll_interval=DEFAULT_POLL_INTERVAL):
+    """
+    Submit the pending test cases of every job, then poll until all batches are done.
+
+    Test cases that come back without a result (eg, because the batch expired) are submitted again.
+    """
+    for job in generation_jobs:
+        job.submit()
+    while True:
+        running = [job for job in generation_jobs if not job.poll()]
+        if not running:
+            # Submit whatever the finished batches did not return.
+            for job in generation_jobs:
+                if job.test_cases:
+                    job.submit()
+            running = [job for job in generation_jobs if job.batches]
+            if not running:
+                return
+        time.sleep(poll_interval)
@@ -1,12 +1,12 @@
 import json
 import os
-import time
 
 from anthropic import Anthropic
 from anthropic.types import TextBlock, ToolUseBlock
 from bfcl.model_handler.constant import GORILLA_TO_OPENAPI, DEFAULT_SYSTEM_PROMPT
 from bfcl.model_handler.handler import BaseHandler
 from bfcl.model_handler.model_style import ModelStyle
+from bfcl.model_handler.transport import get_http_client
 from bfcl.model_handler.utils import (
     ast_parse,
     convert_to_function_call,
@@ -18,16 +18,20 @@ from bfcl.model_handler.utils import (
 
 
 class ClaudeHandler(BaseHandler):
+    batch_api = "anthropic"
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.Anthropic
 
-        self.client = Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+        self.client = Anthropic(
+            api_key=os.getenv("ANTHROPIC_API_KEY"),
+            http_client=get_http_client("https://api.anthropic.com"),
+        )
 
     def inference(self, prompt, functions, test_category):
         # Chatting model
         if "FC" not in self.model_name:
-            start = time.time()
             functions = func_doc_language_specific_pre_processing(
                 functions, test_category
             )
@@ -41,7 +45,8 @@ class ClaudeHandler(BaseHandler):
 
             message = prompt
 
-            response = self.client.messages.create(
+            response, latency = self._request(
+                self.client.messages.create,
                 model=self.model_name,
                 max_tokens=self.max_tokens,
                 temperature=self.temperature,
@@ -49,7 +54,6 @@ class ClaudeHandler(BaseHandler):
                 system=system_prompt,
                 messages=message,
             )
-            latency = time.time() - start
             metadata = {}
             metadata["input_token_count"] = response.usage.input_tokens
             metadata["output_token_count"] = response.usage.output_tokens
@@ -72,14 +76,13 @@ class ClaudeHandler(BaseHandler):
             prompt = convert_system_prompt_into_user_prompt(prompt)
             message = combine_consecutive_user_prompr(prompt)
 
-            start_time = time.time()
-            response = self.client.messages.create(
+            response, latency = self._request(
+                self.client.messages.create,
                 model=self.model_name.strip("-FC"),
                 max_tokens=self.max_tokens,
                 tools=claude_tool,
                 messages=message,
             )
-            latency = time.time() - start_time
             text_outputs = []
             tool_call_outputs = []
             for content in response.content:
@@ -2,6 +2,7 @@ import os
 
 from bfcl.model_handler.handler import BaseHandler
 from bfcl.model_handler.model_style import ModelStyle
+from bfcl.model_handler.transport import get_http_client
 from bfcl.model_handler.utils import (
     func_doc_language_specific_pre_processing,
     convert_to_tool,
@@ -11,7 +12,6 @@ from bfcl.model_handler.constant import (
     DEFAULT_SYSTEM_PROMPT,
     GORILLA_TO_PYTHON,
 )
-import time
 import cohere
 
 from bfcl.model_handler.constant import USE_COHERE_OPTIMIZATION
@@ -19,12 +19,16 @@ from bfcl.model_handler.constant import USE_COHERE_OPTIMIZATION
 
 class CohereHandler(BaseHandler):
     client: cohere.Client
+    endpoint_url = "https://api.cohere.com"
 
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.COHERE
 
-        self.client = cohere.Client(api_key=os.getenv("COHERE_API_KEY"))
+        self.client = cohere.Client(
+            api_key=os.getenv("COHERE_API_KEY"),
+            httpx_client=get_http_client(self.endpoint_url),
+        )
 
         # System prompt for function calling.
         if USE_COHERE_OPTIMIZATION:
@@ -85,8 +89,8 @@ class CohereHandler(BaseHandler):
             chat_history = self._substitute_content_name(chat_history)
             message = self._extract_last_user_message(chat_history)
             
-            start_time = time.time()
-            response = self.client.chat(
+            response, latency = self._request(
+                self.client.chat,
                 message=message,
                 model=self.model_name,
                 temperature=self.temperature,
@@ -94,7 +98,6 @@ class CohereHandler(BaseHandler):
                 preamble=system_prompt,
                 chat_history=chat_history,
             )
-            latency = time.time() - start_time
             result = response.text
             metadata["processed_message"] = {"system": system_prompt, "message": message}
             
@@ -114,9 +117,8 @@ class CohereHandler(BaseHandler):
             cohere_tool = convert_to_tool(
                 functions, GORILLA_TO_PYTHON, self.model_style, test_category
             )
-            start_time = time.time()
-
-            response = self.client.chat(
+            response, latency = self._request(
+                self.client.chat,
                 message=message,
                 model=self.model_name.replace("-FC", ""),
                 temperature=self.temperature,
@@ -126,7 +128,6 @@ class CohereHandler(BaseHandler):
                 chat_history=chat_history if len(chat_history) > 0 else None,
             )
 
-            latency = time.time() - start_time
             try:
                 result = [
                     {func_call.name: func_call.parameters}
@@ -0,0 +1,159 @@
+import os
+import subprocess
+import threading
+import time
+from datetime import timezone
+
+try:
+    import google.auth
+    import google.auth.exceptions
+    import google.auth.transport.requests
+except ImportError:
+    # Optional; without it the gcloud CLI is used.
+    google = None
+
+# Tokens are refreshed this many seconds before they expire, in the background while the old one is still valid.
+TOKEN_REFRESH_MARGIN = 300
+# `gcloud auth print-access-token` doesn't say when the token it prints expires. Access tokens live for an hour,
+# but gcloud may hand out a cached one that is already partly used, so only trust it for this long.
+GCLOUD_TOKEN_LIFETIME = 15 * 60
+GCP_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+
+
+class CachedTokenProvider:
+    """
+    Thread-safe cache for a short-lived access token.
+
+    `fetch_token` is called without arguments and returns `(token, expires_at)`, with `expires_at` as a
+    `time.time()` timestamp. The token is fetched on first use, then refreshed in a background thread once it
+    gets within `refresh_margin` seconds of expiring, so requests normally never wait for a refresh.
+    """
+
+    def __init__(self, fetch_token, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self.fetch_token = fetch_token
+        self.refresh_margin = refresh_margin
+        self.token = None
+        self.expires_at = 0.0
+        self.refresh_count = 0
+
+        self._lock = threading.Lock()
+        self._refresh_timer = None
+
+    def get_token(self):
+        token, expires_at = self.token, self.expires_at
+        if token is not None and time.time() < expires_at:
+            return token
+        with self._lock:
+            # Another thread may have refreshed it while we were waiting for the lock.
+            if self.token is None or time.time() >= self.expires_at:
+                self._refresh()
+            return self.token
+
+    def invalidate(self):
+        """
+        Drop the cached token, eg. after the endpoint rejected it. The next `get_token` fetches a new one.
+        """
+        with self._lock:
+            self.token = None
+            self.expires_at = 0.0
+
+    def _refresh(self):
+        # Must be called with `_lock` held.
+        token, expires_at = self.fetch_token()
+        self.token, self.expires_at = token, expires_at
+        self.refresh_count += 1
+        self._schedule_refresh()
+
+    def _schedule_refresh(self):
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+        delay = max(0.0, self.expires_at - self.refresh_margin - time.time())
+        self._refresh_timer = threading.Timer(delay, self._background_refresh)
+        self._refresh_timer.daemon = True
+        self._refresh_timer.start()
+
+    def _background_refresh(self):
+        with self._lock:
+            try:
+                self._refresh()
+            except Exception as e:
+                # Not fatal: the current token is still valid for a while, and `get_token` retries once it expires.
+                print(f"⚠️ Failed to refresh access token in the background: {e}")
+
+
+def _run_gcloud(command):
+    return subprocess.run(
+        command,
+        check=False,
+        shell=True,
+        capture_output=True,
+        text=True,
+    ).stdout.strip()
+
+
+class GCPCredentialProvider:
+    """
+    GCP project ID and access token for the Vertex AI endpoints.
+
+    The project is resolved once. Uses Application Default Credentials if the optional `google-auth` package is
+    installed, and falls back to the gcloud CLI otherwise.
+    """
+
+    def __init__(self):
+        self._project = None
+        self._lock = threading.Lock()
+        self._google_credentials = None
+        if google is not None:
+            try:
+                self._google_credentials, self._project = google.auth.default(scopes=GCP_SCOPES)
+                self._google_request = google.auth.transport.requests.Request()
+            except google.auth.exceptions.DefaultCredentialsError:
+                self._google_credentials = None
+
+        fetch_token = (
+            self._fetch_google_auth_token
+            if self._google_credentials is not None
+            else self._fetch_gcloud_token
+        )
+        self.token_provider = CachedTokenProvider(fetch_token)
+
+    @property
+    def project(self):
+        if self._project is None:
+            with self._lock:
+                if self._project is None:
+                    self._project = os.getenv("GOOGLE_CLOUD_PROJECT") or _run_gcloud(
+                        "gcloud config get-value project"
+                    )
+        return self._project
+
+    def get_token(self):
+        return self.token_provider.get_token()
+
+    def invalidate_token(self):
+        self.token_provider.invalidate()
+
+    def _fetch_google_auth_token(self):
+        self._google_credentials.refresh(self._google_request)
+        expiry = self._google_credentials.expiry
+        if expiry is None:
+            return self._google_credentials.token, time.time() + GCLOUD_TOKEN_LIFETIME
+        # google-auth reports the expiry as a naive UTC datetime.
+        return self._google_credentials.token, expiry.replace(tzinfo=timezone.utc).timestamp()
+
+    def _fetch_gcloud_token(self):
+        token = _run_gcloud("gcloud auth print-access-token")
+        return token, time.time() + GCLOUD_TOKEN_LIFETIME
+
+
+_GCP_CREDENTIALS = None
+_GCP_CREDENTIALS_LOCK = threading.Lock()
+
+
+def get_gcp_credentials():
+    # One provider per process, shared by every handler and thread.
+    global _GCP_CREDENTIALS
+    with _GCP_CREDENTIALS_LOCK:
+        if _GCP_CREDENTIALS is None:
+            _GCP_CREDENTIALS = GCPCredentialProvider()
+        return _GCP_CREDENTIALS
@@ -1,5 +1,6 @@
 from bfcl.model_handler.handler import BaseHandler
 from bfcl.model_handler.model_style import ModelStyle
+from bfcl.model_handler.transport import get_http_client
 from bfcl.model_handler.utils import (
     func_doc_language_specific_pre_processing,
     system_prompt_pre_processing_chat_model,
@@ -9,7 +10,6 @@ from bfcl.model_handler.utils import (
 from bfcl.model_handler.constant import (
     DEFAULT_SYSTEM_PROMPT,
 )
-import time
 from openai import OpenAI
 import re
 
@@ -23,6 +23,7 @@ class DatabricksHandler(BaseHandler):
         self.client = OpenAI(
             api_key="{YOUR_DATABRICKS_API_KEY}",
             base_url="{YOUR_DATABRICKS_AZURE_ENDPOINT_URL}",
+            http_client=get_http_client("{YOUR_DATABRICKS_AZURE_ENDPOINT_URL}"),
         )
 
     def inference(self, prompt, functions, test_category):
@@ -32,8 +33,8 @@ class DatabricksHandler(BaseHandler):
         prompt = combine_consecutive_user_prompr(prompt)
         message = prompt
 
-        start_time = time.time()
-        response = self.client.chat.completions.create(
+        response, latency = self._request(
+            self.client.chat.completions.create,
             messages=message,
             model=self.model_name,
             temperature=self.temperature,
@@ -41,7 +42,6 @@ class DatabricksHandler(BaseHandler):
             top_p=self.top_p,
         )
 
-        latency = time.time() - start_time
         result = response.choices[0].message.content
         metadata = {}
         metadata["input_token_count"] = response.usage.prompt_tokens
@@ -1,6 +1,5 @@
 import json
 import os
-import time
 
 from bfcl.model_handler.constant import GORILLA_TO_OPENAPI
 from bfcl.model_handler.gpt_handler import OpenAIHandler
@@ -9,10 +8,13 @@ from bfcl.model_handler.utils import (
     convert_to_tool,
     func_doc_language_specific_pre_processing,
 )
+from bfcl.model_handler.transport import get_http_client
 from openai import OpenAI
 
 
 class FireworkAIHandler(OpenAIHandler):
+    batch_api = None
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.FIREWORK_AI
@@ -20,6 +22,7 @@ class FireworkAIHandler(OpenAIHandler):
         self.client = OpenAI(
             base_url="https://api.fireworks.ai/inference/v1",
             api_key=os.getenv("FIRE_WORKS_API_KEY"),
+            http_client=get_http_client("https://api.fireworks.ai/inference/v1"),
         )
 
     def inference(self, prompt, functions, test_category):
@@ -30,11 +33,11 @@ class FireworkAIHandler(OpenAIHandler):
             functions, GORILLA_TO_OPENAPI, self.model_style, test_category
         )
 
-        start_time = time.time()
         model_name = self.model_name.replace("-FC", "")
         model_name = f"accounts/fireworks/models/{model_name}"
         if len(oai_tool) > 0:
-            response = self.client.chat.completions.create(
+            response, latency = self._request(
+                self.client.chat.completions.create,
                 messages=message,
                 model=model_name,
                 temperature=self.temperature,
@@ -44,14 +47,14 @@ class FireworkAIHandler(OpenAIHandler):
                 frequency_penalty=0.4,
             )
         else:
-            response = self.client.chat.completions.create(
+            response, latency = self._request(
+                self.client.chat.completions.create,
                 messages=message,
                 model=model_name,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
                 top_p=self.top_p,
             )
-        latency = time.time() - start_time
         try:
             result = [
                 {func_call.function.name: func_call.function.arguments}
@@ -1,12 +1,19 @@
 from bfcl.model_handler.gpt_handler import OpenAIHandler
 from bfcl.model_handler.model_style import ModelStyle
 import os, json
+from bfcl.model_handler.transport import get_http_client
 from openai import OpenAI
 
 # For setup instructions, please refer to https://github.com/MeetKai/functionary for setup details. 
 class FunctionaryHandler(OpenAIHandler):
+    batch_api = None
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.OpenAI
 
-        self.client = OpenAI(base_url="http://localhost:8000/v1", api_key="functionary")
+        self.client = OpenAI(
+            base_url="http://localhost:8000/v1",
+            api_key="functionary",
+            http_client=get_http_client("http://localhost:8000/v1"),
+        )
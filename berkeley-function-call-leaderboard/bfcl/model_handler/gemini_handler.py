@@ -6,33 +6,51 @@ from bfcl.model_handler.utils import (
     func_doc_language_specific_pre_processing,
 )
 from bfcl.model_handler.constant import GORILLA_TO_OPENAPI
-import subprocess, requests, json, time
+from bfcl.model_handler.credentials import get_gcp_credentials
+from bfcl.model_handler.transport import get_requests_session
+import json
 
 
 class GeminiHandler(BaseHandler):
+    endpoint_url = "https://us-central1-aiplatform.googleapis.com"
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.Google
 
+    def _post_gemini(self, json_data):
+        # The project ID and access token are looked up here rather than in `_query_gemini`, so that they are
+        # not part of the request that the response cache key is computed from.
+        # They are resolved once per process and the token is refreshed in the background before it expires.
+        credentials = get_gcp_credentials()
+        YOUR_GCP_PROJECT_ID_HERE = credentials.project
+
+        # NOTE: To run the gemini model, you need to provide your own GCP project ID, which can be found in the GCP console.
+        API_URL = (
+            f"{self.endpoint_url}/v1beta1/projects/{YOUR_GCP_PROJECT_ID_HERE}/locations/us-central1/publishers/google/models/"
+            + self.model_name
+            + ":generateContent"
+        )
+        for attempt in range(2):
+            headers = {
+                "Authorization": "Bearer " + credentials.get_token(),
+                "Content-Type": "application/json",
+            }
+            response = get_requests_session(API_URL).post(
+                API_URL,
+                headers=headers,
+                data=json.dumps(json_data),
+            )
+            if response.status_code != 401:
+                break
+            # The cached token was revoked or expired early; fetch a new one and try once more.
+            credentials.invalidate_token()
+        return response
+
     def _query_gemini(self, prompt, functions):
         """
         Query Gemini Pro model.
         """
-        YOUR_GCP_PROJECT_ID_HERE = subprocess.run(
-            "gcloud config get-value project",
-            shell=True,
-            capture_output=True,
-            text=True,
-        ).stdout.strip()
-
-        token = subprocess.run(
-            "gcloud auth print-access-token",
-            check=False,
-            shell=True,
-            capture_output=True,
-            text=True,
-        ).stdout.strip()
-
         system_prompt = self._extract_system_prompt(prompt)
         if system_prompt:
             json_data = {
@@ -54,23 +72,7 @@ class GeminiHandler(BaseHandler):
                 "tools": {"function_declarations": functions},
             }
 
-        # NOTE: To run the gemini model, you need to provide your own GCP project ID, which can be found in the GCP console.
-        API_URL = (
-            f"https://us-central1-aiplatform.googleapis.com/v1beta1/projects/{YOUR_GCP_PROJECT_ID_HERE}/locations/us-central1/publishers/google/models/"
-            + self.model_name
-            + ":generateContent"
-        )
-        headers = {
-            "Authorization": "Bearer " + token,
-            "Content-Type": "application/json",
-        }
-        start = time.time()
-        response = requests.post(
-            API_URL,
-            headers=headers,
-            data=json.dumps(json_data),
-        )
-        latency = time.time() - start
+        response, latency = self._request(self._post_gemini, json_data=json_data)
         result = json.loads(response.content)
         if "error" in result:
             return result["error"]["message"], {
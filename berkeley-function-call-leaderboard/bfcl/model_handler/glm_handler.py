@@ -8,6 +8,7 @@ class GLMHandler(OSSHandler):
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.max_model_len = 4096
         self.stop_token_ids = [151329, 151336, 151338]
+        self.tokenizer = None
 
     def apply_chat_template(self, prompts, function, test_category):
         return self.tokenizer.apply_chat_template(
@@ -17,9 +18,11 @@ class GLMHandler(OSSHandler):
     def inference(self, test_question, num_gpus, gpu_memory_utilization):
         from transformers import AutoTokenizer
 
-        self.tokenizer = AutoTokenizer.from_pretrained(
-            self.model_name, trust_remote_code=True
-        )
+        # Loaded once; `inference` is called once per chunk.
+        if self.tokenizer is None:
+            self.tokenizer = AutoTokenizer.from_pretrained(
+                self.model_name, trust_remote_code=True
+            )
 
         return super().inference(
             test_question,
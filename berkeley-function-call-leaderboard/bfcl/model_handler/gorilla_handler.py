@@ -2,14 +2,15 @@ from bfcl.model_handler.handler import BaseHandler
 from bfcl.model_handler.model_style import ModelStyle
 from bfcl.model_handler.utils import (
     ast_parse,
-    system_prompt_pre_processing_chat_model,
     func_doc_language_specific_pre_processing,
 )
-from bfcl.model_handler.constant import DEFAULT_SYSTEM_PROMPT
-import requests, json, re, time
+from bfcl.model_handler.transport import get_requests_session
+import json, re
 
 
 class GorillaHandler(BaseHandler):
+    endpoint_url = "https://luigi.millennium.berkeley.edu:443"
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.Gorilla
@@ -23,17 +24,16 @@ class GorillaHandler(BaseHandler):
             "top_p": self.top_p,
             "max_tokens": self.max_tokens,
         }
-        url = "https://luigi.millennium.berkeley.edu:443/v1/chat/completions"
-        start = time.time()
-        response = requests.post(
-            url,
+        url = f"{self.endpoint_url}/v1/chat/completions"
+        response, latency = self._request(
+            get_requests_session(url).post,
+            url=url,
             headers={
                 "Content-Type": "application/json",
                 "Authorization": "EMPTY",  # Hosted for free with ❤️ from UC Berkeley
             },
             data=json.dumps(requestData),
         )
-        latency = time.time() - start
         jsonResponse = response.json()
         metadata = {}
         metadata["input_token_count"] = jsonResponse["usage"]["prompt_tokens"]
@@ -11,72 +11,93 @@ from bfcl.model_handler.constant import (
     GORILLA_TO_OPENAPI,
     DEFAULT_SYSTEM_PROMPT,
 )
-from openai import OpenAI
-import os, time, json
+from bfcl.model_handler.transport import get_http_client, get_async_http_client
+from openai import OpenAI, AsyncOpenAI
+import os, json
 
 
 class OpenAIHandler(BaseHandler):
+    batch_api = "openai"
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.OpenAI
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = OpenAI(
+            api_key=os.getenv("OPENAI_API_KEY"),
+            http_client=get_http_client("https://api.openai.com/v1"),
+        )
+        # Created on first use from `self.client`, so subclasses that swap the client get a matching async one.
+        self.async_client = None
 
     def inference(self, prompt, functions, test_category):
-        # Chatting model
-        if "FC" not in self.model_name:
-            functions = func_doc_language_specific_pre_processing(
-                functions, test_category
+        request, metadata = self._build_request(prompt, functions, test_category)
+
+        response, latency = self._request(self.client.chat.completions.create, **request)
+
+        return self._parse_response(response, latency, metadata)
+
+    async def inference_async(self, prompt, functions, test_category):
+        # Subclasses that override `inference` talk to their endpoint differently, so they use the thread-offload fallback.
+        if type(self).inference is not OpenAIHandler.inference:
+            return await super().inference_async(prompt, functions, test_category)
+
+        if self.async_client is None:
+            self.async_client = AsyncOpenAI(
+                api_key=self.client.api_key,
+                base_url=self.client.base_url,
+                http_client=get_async_http_client(self.client.base_url),
             )
 
+        request, metadata = self._build_request(prompt, functions, test_category)
+
+        response, latency = await self._request_async(
+            self.async_client.chat.completions.create, **request
+        )
+
+        return self._parse_response(response, latency, metadata)
+
+    def _build_request(self, prompt, functions, test_category):
+        functions = func_doc_language_specific_pre_processing(functions, test_category)
+        metadata = {}
+
+        # Chatting model
+        if "FC" not in self.model_name:
             prompt = system_prompt_pre_processing_chat_model(
                 prompt, DEFAULT_SYSTEM_PROMPT, functions
             )
             message = prompt
-
-            start_time = time.time()
-            response = self.client.chat.completions.create(
-                messages=message,
-                model=self.model_name,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens,
-                top_p=self.top_p,
-            )
-            latency = time.time() - start_time
-            result = response.choices[0].message.content
-            metadata = {}
-            metadata["input_token_count"] = response.usage.prompt_tokens
-            metadata["output_token_count"] = response.usage.completion_tokens
-            metadata["latency"] = latency
+            request = {
+                "messages": message,
+                "model": self.model_name,
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "top_p": self.top_p,
+            }
             metadata["processed_message"] = message
         # Function call model
         else:
-            functions = func_doc_language_specific_pre_processing(
-                functions, test_category
-            )
-
             message = prompt
             oai_tool = convert_to_tool(
                 functions, GORILLA_TO_OPENAPI, self.model_style, test_category
             )
-            start_time = time.time()
+            request = {
+                "messages": message,
+                "model": self.model_name.replace("-FC", ""),
+                "temperature": self.temperature,
+                "max_tokens": self.max_tokens,
+                "top_p": self.top_p,
+            }
             if len(oai_tool) > 0:
-                response = self.client.chat.completions.create(
-                    messages=message,
-                    model=self.model_name.replace("-FC", ""),
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                    top_p=self.top_p,
-                    tools=oai_tool,
-                )
-            else:
-                response = self.client.chat.completions.create(
-                    messages=message,
-                    model=self.model_name.replace("-FC", ""),
-                    temperature=self.temperature,
-                    max_tokens=self.max_tokens,
-                    top_p=self.top_p,
-                )
-            latency = time.time() - start_time
+                request["tools"] = oai_tool
+            metadata["processed_message"] = message
+            metadata["processed_tool"] = oai_tool
+
+        return request, metadata
+
+    def _parse_response(self, response, latency, metadata):
+        if "FC" not in self.model_name:
+            result = response.choices[0].message.content
+        else:
             try:
                 result = [
                     {func_call.function.name: func_call.function.arguments}
@@ -84,14 +105,13 @@ class OpenAIHandler(BaseHandler):
                 ]
             except:
                 result = response.choices[0].message.content
-            metadata = {}
-            metadata["input_token_count"] = response.usage.prompt_tokens
-            metadata["output_token_count"] = response.usage.completion_tokens
-            metadata["latency"] = latency
-            metadata["processed_message"] = message
-            metadata["processed_tool"] = oai_tool
 
-        return result, metadata
+        return result, {
+            "input_token_count": response.usage.prompt_tokens,
+            "output_token_count": response.usage.completion_tokens,
+            "latency": latency,
+            **metadata,
+        }
 
     def decode_ast(self, result, language="Python"):
         if "FC" not in self.model_name:
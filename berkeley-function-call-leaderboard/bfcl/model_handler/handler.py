@@ -1,9 +1,23 @@
 from bfcl.model_handler.model_style import ModelStyle
-import json, os
+from bfcl.model_handler.response_cache import make_cache_key
+from bfcl.model_handler.result_store import get_result_store
+from urllib.parse import urlparse
+import asyncio, time
 
 class BaseHandler:
     model_name: str
     model_style: ModelStyle
+    # Set by the generation script when the on-disk response cache is enabled.
+    response_cache = None
+    # Set by the generation script when it runs one shard of the test cases; defaults to `./result/<model>`.
+    result_dir = None
+    # Provider batch endpoint that the requests of this handler can be sent to with `--batch-api`, if any.
+    batch_api = None
+    # Set by the batch API mode to capture requests instead of sending them, and to feed batch results back in.
+    # Called with `(send, request)` and returns the same `(response, latency)` pair as `_request`.
+    _request_interceptor = None
+    # Endpoint of the handlers whose client has no `base_url` (eg, the ones that post to it directly).
+    endpoint_url = None
 
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         self.model_name = model_name
@@ -15,6 +29,86 @@ class BaseHandler:
         # This method is used to retrive model response for each model.
         pass
 
+    async def inference_async(self, prompt, functions, test_category):
+        # Async variant of `inference`, used by the asyncio generation engine.
+        # Handlers without a native async client fall back to running the blocking `inference` in a worker thread.
+        return await asyncio.to_thread(self.inference, prompt, functions, test_category)
+
+    def _request(self, send, **request):
+        """
+        Send one request to the model endpoint and time it.
+
+        `send` is the callable that makes the network call (usually an SDK method) and `request` holds its
+        keyword arguments. When the response cache is enabled, a byte-identical earlier request is answered
+        from disk instead. Returns the raw response and the latency in seconds.
+        """
+        if self._request_interceptor is not None:
+            return self._request_interceptor(send, request)
+
+        cache_key = self._get_cache_key(request)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        start_time = time.time()
+        response = send(**request)
+        latency = time.time() - start_time
+
+        if cache_key is not None and self._is_cacheable(response):
+            self.response_cache.put(cache_key, response, latency)
+        return response, latency
+
+    async def _request_async(self, send, **request):
+        # Same as `_request`, for endpoints that return an awaitable.
+        if self._request_interceptor is not None:
+            return self._request_interceptor(send, request)
+
+        cache_key = self._get_cache_key(request)
+        if cache_key is not None:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        start_time = time.time()
+        response = await send(**request)
+        latency = time.time() - start_time
+
+        if cache_key is not None and self._is_cacheable(response):
+            self.response_cache.put(cache_key, response, latency)
+        return response, latency
+
+    def _is_cacheable(self, response):
+        # Only successful responses are cached. The SDKs raise on errors, but the handlers that post to their
+        # endpoint directly get the error back as the response: an HTTP error status (Gemini), or an "error"
+        # field in the decoded JSON (Nexus).
+        status_code = getattr(response, "status_code", None)
+        if isinstance(status_code, int) and status_code >= 400:
+            return False
+        if isinstance(response, dict) and "error" in response:
+            return False
+        return True
+
+    def _get_cache_key(self, request):
+        if self.response_cache is None:
+            return None
+        return make_cache_key(
+            model_name=self.model_name,
+            handler=type(self).__name__,
+            provider=self.provider,
+            request=request,
+        )
+
+    @property
+    def provider(self):
+        # Requests that go to the same provider share one concurrency budget during generation.
+        # Handlers are keyed by the host of their endpoint, like the shared HTTP clients that report the quota
+        # headers of each response to the limiter of that host; handlers without a known endpoint by their model style.
+        base_url = getattr(getattr(self, "client", None), "base_url", None) or self.endpoint_url
+        if base_url is not None:
+            return urlparse(str(base_url)).netloc or str(base_url)
+        return self.model_style.value
+
     def decode_ast(self, result, language="Python"):
         # This method takes raw model output and convert it to standard AST checker input.
         pass
@@ -24,16 +118,15 @@ class BaseHandler:
         pass
 
     def write(self, result):
-        model_name_dir = self.model_name.replace("/", "_")
-        os.makedirs(f"./result/{model_name_dir}", exist_ok=True)
-        
+        # Entries are committed to `<result_dir>/BFCL_v2_<category>_result.json` by the result store's writer thread.
+        result_dir = self.result_dir
+        if result_dir is None:
+            model_name_dir = self.model_name.replace("/", "_")
+            result_dir = f"./result/{model_name_dir}"
+        result_store = get_result_store(result_dir)
+
         if type(result) is dict:
             result = [result]
-            
+
         for entry in result:
-            test_category = entry["id"].rsplit("_", 1)[0]
-            file_to_write = f"BFCL_v2_{test_category}_result.json"
-            file_to_write = f"./result/{model_name_dir}/{file_to_write}"
-            
-            with open(file_to_write, "a+") as f:
-                f.write(json.dumps(entry) + "\n")
+            result_store.put(entry)
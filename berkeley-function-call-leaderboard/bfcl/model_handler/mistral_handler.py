@@ -11,16 +11,32 @@ from bfcl.model_handler.utils import (
     func_doc_language_specific_pre_processing,
     system_prompt_pre_processing_chat_model,
 )
+from bfcl.model_handler.transport import get_http_client
 from mistralai.client import MistralClient
-import os, time, json
+from mistralai.constants import ENDPOINT
+import os, json
+
+
+class SharedTransportMistralClient(MistralClient):
+    # `MistralClient` takes no `http_client` argument, so its own client is swapped for the shared one.
+    def __init__(self, api_key):
+        super().__init__(api_key=api_key, endpoint=ENDPOINT)
+        self._client.close()
+        self._client = get_http_client(ENDPOINT)
+
+    def __del__(self):
+        # The shared client outlives the handler; `close_all_transports` closes it.
+        pass
 
 
 class MistralHandler(BaseHandler):
+    endpoint_url = ENDPOINT
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.Mistral
 
-        self.client = MistralClient(api_key=os.getenv("MISTRAL_API_KEY"))
+        self.client = SharedTransportMistralClient(api_key=os.getenv("MISTRAL_API_KEY"))
 
     def inference(self, prompt, functions, test_category):
         if "FC" in self.model_name:
@@ -32,12 +48,12 @@ class MistralHandler(BaseHandler):
             )
             message = prompt
 
-            start = time.time()
             if "Any" in self.model_name:
                 tool_choice = "any"
             else:
                 tool_choice = "auto"
-            chat_response = self.client.chat(
+            chat_response, latency = self._request(
+                self.client.chat,
                 model=self.model_name.replace("-FC-Any", "").replace("-FC-Auto", ""),
                 messages=message,
                 tools=tool,
@@ -45,7 +61,6 @@ class MistralHandler(BaseHandler):
                 temperature=self.temperature,
                 top_p=self.top_p,
             )
-            latency = time.time() - start
             try:
                 result = [
                     {func_call.function.name: func_call.function.arguments}
@@ -67,14 +82,13 @@ class MistralHandler(BaseHandler):
             prompt = system_prompt_pre_processing_chat_model(prompt, DEFAULT_SYSTEM_PROMPT, functions)
             message = prompt
 
-            start = time.time()
-            chat_response = self.client.chat(
+            chat_response, latency = self._request(
+                self.client.chat,
                 model=self.model_name,
                 messages=message,
                 temperature=self.temperature,
                 top_p=self.top_p,
             )
-            latency = time.time() - start
             result = chat_response.choices[0].message.content
             metadata = {
                 "input_token_count": chat_response.usage.prompt_tokens,
@@ -4,10 +4,12 @@ from bfcl.model_handler.utils import (
     ast_parse,
     func_doc_language_specific_pre_processing,
 )
-import requests, time
+from bfcl.model_handler.transport import get_requests_session
 
 
 class NexusHandler(BaseHandler):
+    endpoint_url = "http://nexusraven.nexusflow.ai"
+
     def __init__(self, model_name, temperature=0.001, top_p=1, max_tokens=1000) -> None:
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.NEXUS
@@ -109,19 +111,19 @@ class NexusHandler(BaseHandler):
         Query Nexus-Raven.
         """
 
-        API_URL = "http://nexusraven.nexusflow.ai"
+        API_URL = self.endpoint_url
         headers = {"Content-Type": "application/json"}
 
         def query(payload):
             """
             Sends a payload to a TGI endpoint.
             """
-            response = requests.post(API_URL, headers=headers, json=payload)
+            response = get_requests_session(API_URL).post(API_URL, headers=headers, json=payload)
             return response.json()
 
-        start = time.time()
-        output = query(
-            {
+        output, latency = self._request(
+            query,
+            payload={
                 "inputs": prompt,
                 "parameters": {
                     "temperature": self.temperature,
@@ -132,7 +134,6 @@ class NexusHandler(BaseHandler):
                 },
             }
         )
-        latency = time.time() - start
         call = output[0]["generated_text"].replace("Call:", "").strip()
         return call, {"latency": latency, "processed_message": prompt}
 
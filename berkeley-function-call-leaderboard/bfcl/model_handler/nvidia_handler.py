@@ -1,5 +1,6 @@
-import time, os
+import os
 from openai import OpenAI
+from bfcl.model_handler.transport import get_http_client
 from bfcl.model_handler.handler import BaseHandler
 from bfcl.model_handler.model_style import ModelStyle
 from bfcl.model_handler.utils import ast_parse
@@ -20,6 +21,7 @@ class NvidiaHandler(BaseHandler):
         self.client = OpenAI(
             base_url="https://integrate.api.nvidia.com/v1",
             api_key=os.getenv("NVIDIA_API_KEY"),
+            http_client=get_http_client("https://integrate.api.nvidia.com/v1"),
         )
 
     def inference(self, prompt, functions, test_category):
@@ -29,15 +31,14 @@ class NvidiaHandler(BaseHandler):
         prompt = combine_consecutive_user_prompr(prompt)
         message = prompt
 
-        start_time = time.time()
-        response = self.client.chat.completions.create(
+        response, latency = self._request(
+            self.client.chat.completions.create,
             messages=message,
             model=self.model_name,
             temperature=self.temperature,
             max_tokens=self.max_tokens,
             top_p=self.top_p,
         )
-        latency = time.time() - start_time
         result = response.choices[0].message.content
         input_token = response.usage.prompt_tokens
         output_token = response.usage.completion_tokens
@@ -0,0 +1,274 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from bfcl.model_handler.transport import get_http_client
+
+# Default budget of padded tokens (prompt + generation) per batch for the transformers backend.
+DEFAULT_MAX_BATCH_TOKENS = 32768
+# Default number of concurrent requests the server backend sends; the server batches them continuously.
+DEFAULT_SERVER_CONCURRENCY = 64
+
+# Loaded backends, keyed by their configuration. Loading the weights takes minutes, so generation in chunks
+# reuses the backend of the first chunk instead of building a new one per call.
+_BACKENDS = {}
+
+
+def get_vllm_engine_args(model_path, dtype, max_model_len=None, num_gpus=1, gpu_memory_utilization=0.9):
+    # Shared by the in-process engine and the server launcher, so that both generate the same way.
+    return dict(
+        model=model_path,
+        dtype=dtype,
+        trust_remote_code=True,
+        disable_custom_all_reduce=True,
+        max_model_len=max_model_len,
+        tensor_parallel_size=num_gpus,
+        gpu_memory_utilization=gpu_memory_utilization,
+    )
+
+
+class VLLMBackend:
+    """
+    vLLM engine with tensor parallelism over `num_gpus` GPUs.
+    """
+
+    def __init__(self, model_path, dtype, max_model_len=None, num_gpus=1, gpu_memory_utilization=0.9):
+        from vllm import LLM
+
+        engine_args = get_vllm_engine_args(model_path, dtype, max_model_len, num_gpus, gpu_memory_utilization)
+        try:
+            # Test cases that share a function doc share a long prompt prefix, whose KV cache is then computed once.
+            self.llm = LLM(enable_prefix_caching=True, **engine_args)
+        except (NotImplementedError, ValueError) as e:
+            # Rejected at config validation for some architectures (eg, sliding window attention).
+            print(f"⚠️ Prefix caching is not supported for {model_path}, running without it: {e}")
+            self.llm = LLM(**engine_args)
+
+    def generate(self, prompts, temperature, max_tokens, top_p, stop_token_ids=None):
+        from vllm import SamplingParams
+
+        sampling_params = SamplingParams(
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            stop_token_ids=stop_token_ids,
+        )
+        outputs = self.llm.generate(prompts, sampling_params)
+
+        texts = []
+        token_counts = {"input_token_count": 0, "output_token_count": 0}
+        for output in outputs:
+            texts.append(output.outputs[0].text)
+            token_counts["input_token_count"] += len(output.prompt_token_ids)
+            token_counts["output_token_count"] += len(output.outputs[0].token_ids)
+        return texts, token_counts
+
+
+class TransformersBackend:
+    """
+    CPU inference with Hugging Face transformers, for machines without a GPU supported by vLLM.
+
+    Prompts are sorted by length and packed into batches of at most `max_batch_tokens` padded tokens, so that
+    little compute goes to padding. Decoding uses the model's KV cache. With `quantize`, the linear layers are
+    quantized to int8 with PyTorch dynamic quantization, which is usually about twice as fast on CPU for a small
+    loss in accuracy. The output text is decoded the same way as vLLM does (up to and excluding the first stop
+    token, without special tokens), so the result files have the same format.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        dtype,
+        max_model_len=None,
+        num_gpus=1,
+        gpu_memory_utilization=0.9,
+        quantize=False,
+        num_threads=0,
+        max_batch_tokens=DEFAULT_MAX_BATCH_TOKENS,
+    ):
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+
+        # Intra-op parallelism is what matters for batched matmuls; by default use every core we may run on.
+        torch.set_num_threads(num_threads or len(os.sched_getaffinity(0)))
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # Can only be set once per process, before any parallel work.
+            pass
+
+        self.max_model_len = max_model_len
+        self.max_batch_tokens = max_batch_tokens
+        self.tokenizer = AutoTokenizer.from_pretrained(model_path, trust_remote_code=True)
+        self.tokenizer.padding_side = "left"
+        if self.tokenizer.pad_token_id is None:
+            self.tokenizer.pad_token = self.tokenizer.eos_token
+
+        # Most CPUs have no fast bfloat16/float16 matmuls, and dynamic quantization needs float32 weights.
+        # `dtype` is kept for the vLLM backend and ignored here.
+        model = AutoModelForCausalLM.from_pretrained(
+            model_path, torch_dtype=torch.float32, trust_remote_code=True
+        )
+        model.eval()
+        if quantize:
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+    def _get_stop_token_ids(self, stop_token_ids):
+        stop_token_ids = set(stop_token_ids or [])
+        eos_token_id = self.model.generation_config.eos_token_id
+        if isinstance(eos_token_id, int):
+            stop_token_ids.add(eos_token_id)
+        elif eos_token_id is not None:
+            stop_token_ids.update(eos_token_id)
+        if self.tokenizer.eos_token_id is not None:
+            stop_token_ids.add(self.tokenizer.eos_token_id)
+        return sorted(stop_token_ids)
+
+    def _make_batches(self, prompt_token_ids, max_tokens):
+        # Longest first, so that running out of memory shows up on the first batch rather than after hours.
+        order = sorted(range(len(prompt_token_ids)), key=lambda i: -len(prompt_token_ids[i]))
+        batches = []
+        batch = []
+        for i in order:
+            # Every row of a batch is padded to the longest prompt in it, which is its first one.
+            padded_length = len(prompt_token_ids[batch[0] if batch else i]) + max_tokens
+            if batch and (len(batch) + 1) * padded_length > self.max_batch_tokens:
+                batches.append(batch)
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def generate(self, prompts, temperature, max_tokens, top_p, stop_token_ids=None):
+        import torch
+
+        stop_token_ids = self._get_stop_token_ids(stop_token_ids)
+        stop_token_id_set = set(stop_token_ids)
+        # Tokenized like vLLM does it, including the BOS token.
+        prompt_token_ids = [self.tokenizer(prompt)["input_ids"] for prompt in prompts]
+
+        texts = [None] * len(prompts)
+        token_counts = {"input_token_count": 0, "output_token_count": 0}
+        for batch in self._make_batches(prompt_token_ids, max_tokens):
+            inputs = self.tokenizer.pad(
+                {"input_ids": [prompt_token_ids[i] for i in batch]}, return_tensors="pt"
+            )
+            max_new_tokens = max_tokens
+            if self.max_model_len is not None:
+                # Same limit as vLLM: prompt and generation together must fit in the context window.
+                max_new_tokens = min(max_tokens, max(1, self.max_model_len - inputs["input_ids"].shape[1]))
+            with torch.inference_mode():
+                outputs = self.model.generate(
+                    **inputs,
+                    max_new_tokens=max_new_tokens,
+                    do_sample=temperature > 0,
+                    temperature=temperature,
+                    top_p=top_p,
+                    eos_token_id=stop_token_ids,
+                    pad_token_id=self.tokenizer.pad_token_id,
+                    use_cache=True,
+                )
+
+            input_length = inputs["input_ids"].shape[1]
+            for row, i in enumerate(batch):
+                generated_token_ids = outputs[row, input_length:].tolist()
+                for position, token_id in enumerate(generated_token_ids):
+                    if token_id in stop_token_id_set:
+                        generated_token_ids = generated_token_ids[:position]
+                        break
+                texts[i] = self.tokenizer.decode(generated_token_ids, skip_special_tokens=True)
+                token_counts["input_token_count"] += len(prompt_token_ids[i])
+                token_counts["output_token_count"] += len(generated_token_ids)
+        return texts, token_counts
+
+
+class ServerBackend:
+    """
+    Client for a long-lived vLLM OpenAI-compatible server (see `oss_server.py`), so that the model is loaded once per
+    node instead of once per generation run. The prompts are sent concurrently to the completions endpoint and the
+    server batches them continuously, also together with the requests of other generation processes.
+
+    The engine settings (dtype, max_model_len, GPUs) are those the server was started with; the ones passed here
+    are only used to check that it serves the right model.
+    """
+
+    def __init__(
+        self,
+        model_path,
+        dtype,
+        max_model_len=None,
+        num_gpus=1,
+        gpu_memory_utilization=0.9,
+        base_url="http://localhost:8000/v1",
+        max_concurrency=DEFAULT_SERVER_CONCURRENCY,
+    ):
+        from openai import OpenAI
+
+        self.model_path = model_path
+        self.max_concurrency = max_concurrency
+        self.client = OpenAI(base_url=base_url, api_key="EMPTY", http_client=get_http_client(base_url))
+
+        served_models = [model.id for model in self.client.models.list().data]
+        if model_path not in served_models:
+            raise ValueError(
+                f"The OSS model server at {base_url} serves {served_models}, not {model_path}. "
+                f"Start one with `python -m bfcl.model_handler.oss_server --model {model_path}`."
+            )
+
+    def _complete(self, prompt, temperature, max_tokens, top_p, stop_token_ids):
+        response = self.client.completions.create(
+            model=self.model_path,
+            prompt=prompt,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            top_p=top_p,
+            # vLLM extension of the completions API.
+            extra_body={"stop_token_ids": stop_token_ids} if stop_token_ids else None,
+        )
+        return response.choices[0].text, response.usage
+
+    def generate(self, prompts, temperature, max_tokens, top_p, stop_token_ids=None):
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            outputs = list(
+                executor.map(
+                    lambda prompt: self._complete(prompt, temperature, max_tokens, top_p, stop_token_ids),
+                    prompts,
+                )
+            )
+
+        texts = []
+        token_counts = {"input_token_count": 0, "output_token_count": 0}
+        for text, usage in outputs:
+            texts.append(text)
+            token_counts["input_token_count"] += usage.prompt_tokens
+            token_counts["output_token_count"] += usage.completion_tokens
+        return texts, token_counts
+
+
+BACKENDS = {
+    "vllm": VLLMBackend,
+    "transformers": TransformersBackend,
+    "server": ServerBackend,
+}
+
+
+def get_backend(
+    backend_name, model_path, dtype, max_model_len=None, num_gpus=1, gpu_memory_utilization=0.9, **options
+):
+    backend_key = (
+        backend_name,
+        model_path,
+        dtype,
+        max_model_len,
+        num_gpus,
+        gpu_memory_utilization,
+        tuple(sorted(options.items())),
+    )
+    if backend_key not in _BACKENDS:
+        # Only one model is kept loaded at a time; vLLM can't hold two engines on the same GPUs anyway.
+        _BACKENDS.clear()
+        _BACKENDS[backend_key] = BACKENDS[backend_name](
+            model_path, dtype, max_model_len, num_gpus, gpu_memory_utilization, **options
+        )
+    return _BACKENDS[backend_key]
@@ -1,4 +1,8 @@
+import json
+import os
+
 from bfcl.model_handler.handler import BaseHandler
+from bfcl.model_handler.oss_backend import get_backend
 from bfcl.model_handler.model_style import ModelStyle
 from bfcl.model_handler.utils import (
     ast_parse,
@@ -7,6 +11,44 @@ from bfcl.model_handler.utils import (
 )
 from bfcl.model_handler.constant import DEFAULT_SYSTEM_PROMPT
 
+def order_by_shared_prefix(test_cases):
+    """
+    Reorder test cases so that the ones whose prompts share a prefix are generated back to back.
+
+    Prompts are built from the function doc followed by the question, so test cases with the same category and
+    function doc are grouped together (groups in order of first appearance), and sorted by question length within
+    a group. Results are keyed by id, so the order of generation doesn't matter for the result files.
+    """
+    groups = {}
+    for test_case in test_cases:
+        group_key = (
+            test_case["id"].rsplit("_", 1)[0],
+            json.dumps(test_case["function"]),
+        )
+        groups.setdefault(group_key, []).append(test_case)
+
+    ordered_test_cases = []
+    for group in groups.values():
+        ordered_test_cases.extend(
+            sorted(group, key=lambda test_case: len(json.dumps(test_case["question"])))
+        )
+    return ordered_test_cases
+
+
+def estimate_prefix_hit_rate(prompts):
+    """
+    Share of prompt characters that repeat the prefix of the prompt before it, as an estimate of how much of the
+    prefill the prefix cache saves. The actual rate is somewhat lower, since vLLM caches whole blocks of tokens.
+    """
+    total_length = sum(len(prompt) for prompt in prompts)
+    if total_length == 0:
+        return 0.0
+    shared_length = sum(
+        len(os.path.commonprefix([previous_prompt, prompt]))
+        for previous_prompt, prompt in zip(prompts, prompts[1:])
+    )
+    return shared_length / total_length
+
 
 class OSSHandler(BaseHandler):
     def __init__(
@@ -15,6 +57,12 @@ class OSSHandler(BaseHandler):
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.OSSMODEL
         self.dtype = dtype
+        # Inference backend from `oss_backend.BACKENDS` and its extra options, set by the generation script.
+        self.backend = "vllm"
+        self.backend_options = {}
+        # Token counts and estimated prefix cache hit rate of the last `inference` call, for throughput reporting.
+        self.last_token_counts = None
+        self.last_prefix_hit_rate = None
 
     def _format_prompt(prompts, function, test_category):
         prompt_string = ""
@@ -34,35 +82,21 @@ class OSSHandler(BaseHandler):
         max_model_len=None,
         num_gpus=8,
         gpu_memory_utilization=0.9,
+        backend="vllm",
+        backend_options=None,
     ):
-        from vllm import LLM, SamplingParams
-
         print("start generating, test question length: ", len(test_question))
 
-        sampling_params = SamplingParams(
-            temperature=temperature,
-            max_tokens=max_tokens,
-            top_p=top_p,
-            stop_token_ids=stop_token_ids,
-        )
-        llm = LLM(
-            model=model_path,
-            dtype=dtype,
-            trust_remote_code=True,
-            disable_custom_all_reduce=True,
-            max_model_len=max_model_len,
-            tensor_parallel_size=num_gpus,
-            gpu_memory_utilization=gpu_memory_utilization,
+        backend = get_backend(
+            backend,
+            model_path,
+            dtype,
+            max_model_len,
+            num_gpus,
+            gpu_memory_utilization,
+            **(backend_options or {}),
         )
-        outputs = llm.generate(test_question, sampling_params)
-
-        final_ans_jsons = []
-
-        for output in outputs:
-            text = output.outputs[0].text
-            final_ans_jsons.append(text)
-
-        return final_ans_jsons
+        return backend.generate(test_question, temperature, max_tokens, top_p, stop_token_ids)
 
     @staticmethod
     def process_input(
@@ -104,7 +138,9 @@ class OSSHandler(BaseHandler):
             include_system_prompt=include_system_prompt,
         )
 
-        ans_jsons = self._batch_generate(
+        self.last_prefix_hit_rate = estimate_prefix_hit_rate(test_question)
+
+        ans_jsons, self.last_token_counts = self._batch_generate(
             test_question=test_question,
             model_path=self.model_name,
             temperature=self.temperature,
@@ -115,6 +151,8 @@ class OSSHandler(BaseHandler):
             max_model_len=max_model_len,
             num_gpus=num_gpus,
             gpu_memory_utilization=gpu_memory_utilization,
+            backend=self.backend,
+            backend_options=self.backend_options,
         )
 
         return ans_jsons, test_question
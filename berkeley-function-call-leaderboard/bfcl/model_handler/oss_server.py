@@ -0,0 +1,76 @@
+"""
+Start a long-lived vLLM OpenAI-compatible server for an OSS model, to generate with `--oss-backend server`.
+
+    python -m bfcl.model_handler.oss_server --model meta-llama/Meta-Llama-3-8B-Instruct --num-gpus 1 --port 8000
+
+The model is then loaded once per node, and any number of generation runs (different test categories, or several
+processes at once) send their prompts to it; vLLM batches all of them continuously. The engine is configured from
+the model's handler exactly as for the in-process vLLM backend.
+"""
+
+import argparse
+import os
+import sys
+
+from bfcl.model_handler.handler_map import handler_map
+from bfcl.model_handler.model_style import ModelStyle
+from bfcl.model_handler.oss_backend import get_vllm_engine_args
+
+
+def build_server_command(model_name, num_gpus, gpu_memory_utilization, host, port, prefix_caching=True):
+    handler = handler_map[model_name](model_name)
+    if handler.model_style != ModelStyle.OSSMODEL:
+        raise ValueError(f"{model_name} is not an OSS model.")
+
+    engine_args = get_vllm_engine_args(
+        handler.model_name,
+        handler.dtype,
+        # Only set by the handlers that need a shorter context window than the model's default.
+        getattr(handler, "max_model_len", None),
+        num_gpus,
+        gpu_memory_utilization,
+    )
+    command = [
+        sys.executable,
+        "-m",
+        "vllm.entrypoints.openai.api_server",
+        "--host",
+        host,
+        "--port",
+        str(port),
+    ]
+    if prefix_caching:
+        command.append("--enable-prefix-caching")
+    for key, value in engine_args.items():
+        if value is None or value is False:
+            continue
+        flag = "--" + key.replace("_", "-")
+        if value is True:
+            command.append(flag)
+        else:
+            command.extend([flag, str(value)])
+    return command
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", type=str, required=True)
+    parser.add_argument("--num-gpus", default=1, type=int)
+    parser.add_argument("--gpu-memory-utilization", default=0.9, type=float)
+    parser.add_argument("--host", default="0.0.0.0", type=str)
+    parser.add_argument("--port", default=8000, type=int)
+    # For architectures whose prefix caching vLLM doesn't support.
+    parser.add_argument("--no-prefix-caching", action="store_true", default=False)
+    args = parser.parse_args()
+
+    command = build_server_command(
+        args.model,
+        args.num_gpus,
+        args.gpu_memory_utilization,
+        args.host,
+        args.port,
+        prefix_caching=not args.no_prefix_caching,
+    )
+    print(" ".join(command))
+    # Replace this process, so that signals (eg, Ctrl-C) go straight to the server.
+    os.execv(sys.executable, command)
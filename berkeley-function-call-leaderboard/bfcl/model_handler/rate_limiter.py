@@ -0,0 +1,269 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+# Exponential backoff used when the provider does not tell us how long to wait.
+BACKOFF_BASE = 2  # Delay in seconds for the first retry
+BACKOFF_MAX = 120  # Upper bound for a single backoff delay in seconds
+# How often a blocked `acquire` re-checks the limiter state.
+POLL_INTERVAL = 0.05
+# Start pacing requests once fewer than this fraction of the provider's request quota is left.
+LOW_QUOTA_FRACTION = 0.1
+
+_DURATION_PATTERN = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1, "m": 60, "h": 3600}
+
+
+def _parse_duration(value):
+    # Reset headers come either as plain seconds ("1.5"), as a Go-style duration ("6m0s", "20ms") or as a timestamp.
+    value = value.strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    matches = _DURATION_PATTERN.findall(value)
+    if matches:
+        return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in matches)
+    try:
+        reset_time = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            reset_time = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    return max(0.0, (reset_time - datetime.now(timezone.utc)).total_seconds())
+
+
+def _get_header(headers, *names):
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+def get_error_headers(e):
+    # OpenAI, Anthropic and Mistral errors carry the httpx response; `requests` errors carry a requests response.
+    response = getattr(e, "response", None)
+    headers = getattr(response, "headers", None) or getattr(e, "headers", None)
+    return headers or {}
+
+
+class AdaptiveRateLimiter:
+    """
+    Limits the requests sent to one provider across all generation threads and tasks.
+
+    The number of in-flight requests follows AIMD: each successful request raises the limit by about one
+    per round of requests, and each throttled request halves it (at most once per backoff period). A
+    throttled request also pauses the whole provider until its backoff delay has passed, and the
+    x-ratelimit-* headers of every response (see `record_response_headers`) are used to pace requests once the
+    remaining quota runs low, until the quota resets.
+    """
+
+    def __init__(self, provider, max_concurrency, min_concurrency=1):
+        self.provider = provider
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.concurrency_limit = float(max_concurrency)
+        self.in_flight = 0
+        # No new request is started before this time.
+        self.blocked_until = 0.0
+        self.next_decrease_time = 0.0
+        # Token bucket used for pacing. `None` means the provider has not asked us to slow down.
+        self.request_rate = None
+        # Pacing stops at this time, when the quota resets, unless newer headers say otherwise.
+        self.request_rate_until = 0.0
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+
+        self.request_count = 0
+        self.throttle_count = 0
+        self.backoff_time = 0.0
+        self.lowest_concurrency_limit = max_concurrency
+
+        self._lock = threading.Lock()
+
+    def _try_acquire(self):
+        # Returns 0 if a request slot was taken, otherwise how long to wait before trying again.
+        with self._lock:
+            now = time.monotonic()
+            if now < self.blocked_until:
+                return self.blocked_until - now
+
+            if self.request_rate is not None and now >= self.request_rate_until:
+                self.request_rate = None
+            if self.request_rate is not None:
+                self.tokens = min(
+                    1.0, self.tokens + (now - self.last_refill) * self.request_rate
+                )
+                self.last_refill = now
+                if self.tokens < 1.0:
+                    return (1.0 - self.tokens) / self.request_rate
+
+            if self.in_flight >= int(self.concurrency_limit):
+                return POLL_INTERVAL
+
+            if self.request_rate is not None:
+                self.tokens -= 1.0
+            self.in_flight += 1
+            self.request_count += 1
+            return 0
+
+    def acquire(self):
+        while True:
+            wait_time = self._try_acquire()
+            if wait_time == 0:
+                return
+            time.sleep(min(wait_time, POLL_INTERVAL))
+
+    async def acquire_async(self):
+        while True:
+            wait_time = self._try_acquire()
+            if wait_time == 0:
+                return
+            await asyncio.sleep(min(wait_time, POLL_INTERVAL))
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def record_success(self, headers=None):
+        with self._lock:
+            # Additive increase: roughly one extra slot per full round of successful requests.
+            self.concurrency_limit = min(
+                self.max_concurrency,
+                self.concurrency_limit + 1 / self.concurrency_limit,
+            )
+            if headers:
+                self._update_from_headers(headers)
+
+    def record_headers(self, headers):
+        # Quota headers of any response, successful or not.
+        with self._lock:
+            self._update_from_headers(headers)
+
+    def record_throttle(self, e, attempt):
+        """
+        Record a throttled request and pause the provider. Returns the backoff delay in seconds.
+        """
+        headers = get_error_headers(e)
+        retry_after = self._get_retry_after(headers)
+
+        if retry_after is not None:
+            # A little jitter on top, so that the paused requests don't all resume at the same instant.
+            delay = retry_after * random.uniform(1.0, 1.1)
+        else:
+            # Jittered exponential backoff, so that throttled requests don't all come back at the same time.
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt) * random.uniform(0.5, 1.5)
+
+        with self._lock:
+            now = time.monotonic()
+            self.throttle_count += 1
+            self.backoff_time += delay
+            self.blocked_until = max(self.blocked_until, now + delay)
+
+            # Multiplicative decrease, applied once per backoff period rather than once per throttled request.
+            if now >= self.next_decrease_time:
+                self.concurrency_limit = max(
+                    self.min_concurrency, self.concurrency_limit / 2
+                )
+                self.lowest_concurrency_limit = min(
+                    self.lowest_concurrency_limit, int(self.concurrency_limit)
+                )
+                self.next_decrease_time = now + delay
+
+            if headers:
+                self._update_from_headers(headers)
+
+        return delay
+
+    @staticmethod
+    def _get_retry_after(headers):
+        retry_after_ms = _get_header(headers, "retry-after-ms")
+        if retry_after_ms is not None:
+            try:
+                return float(retry_after_ms) / 1000
+            except ValueError:
+                pass
+        retry_after = _get_header(headers, "retry-after")
+        if retry_after is not None:
+            return _parse_duration(retry_after)
+        return None
+
+    def _update_from_headers(self, headers):
+        # OpenAI style (x-ratelimit-*) and Anthropic style (anthropic-ratelimit-*) request quota headers.
+        limit = _get_header(
+            headers, "x-ratelimit-limit-requests", "anthropic-ratelimit-requests-limit"
+        )
+        remaining = _get_header(
+            headers,
+            "x-ratelimit-remaining-requests",
+            "anthropic-ratelimit-requests-remaining",
+        )
+        reset = _get_header(
+            headers, "x-ratelimit-reset-requests", "anthropic-ratelimit-requests-reset"
+        )
+        if remaining is None or reset is None:
+            return
+        try:
+            remaining = int(remaining)
+            limit = int(limit) if limit is not None else None
+        except ValueError:
+            return
+        reset_seconds = _parse_duration(reset)
+        if reset_seconds is None:
+            return
+
+        now = time.monotonic()
+        if remaining <= 0:
+            self.blocked_until = max(self.blocked_until, now + reset_seconds)
+        elif limit and remaining < limit * LOW_QUOTA_FRACTION and reset_seconds > 0:
+            # Spread the remaining quota over the time left until it resets.
+            self.request_rate = remaining / reset_seconds
+            self.request_rate_until = now + reset_seconds
+        else:
+            self.request_rate = None
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "provider": self.provider,
+                "request_count": self.request_count,
+                "throttle_count": self.throttle_count,
+                "backoff_time": round(self.backoff_time, 2),
+                "concurrency_limit": int(self.concurrency_limit),
+                "lowest_concurrency_limit": self.lowest_concurrency_limit,
+            }
+
+
+# One limiter per provider, shared by every handler and thread in the process.
+_RATE_LIMITERS = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(provider, max_concurrency):
+    with _RATE_LIMITERS_LOCK:
+        if provider not in _RATE_LIMITERS:
+            _RATE_LIMITERS[provider] = AdaptiveRateLimiter(provider, max_concurrency)
+        return _RATE_LIMITERS[provider]
+
+
+def record_response_headers(provider, headers):
+    """
+    Feed the headers of a response from `provider` to its limiter, if it has one. Meant to be called by the HTTP
+    clients for every response, since the SDKs don't return the headers of successful responses.
+    """
+    with _RATE_LIMITERS_LOCK:
+        limiter = _RATE_LIMITERS.get(provider)
+    if limiter is not None:
+        limiter.record_headers(headers)
+
+
+def get_all_rate_limiter_stats():
+    with _RATE_LIMITERS_LOCK:
+        limiters = list(_RATE_LIMITERS.values())
+    return [limiter.get_stats() for limiter in limiters]
@@ -0,0 +1,156 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+# Once the cache grows past its size limit, evict the least recently used entries down to this fraction of it.
+EVICTION_TARGET_FRACTION = 0.9
+
+
+def make_cache_key(**fields):
+    # The key covers everything that is sent to the provider (model name, processed messages, tool schema and
+    # sampling parameters), so two requests share an entry only if they are byte-identical.
+    serialized = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Content-addressed, size-bounded on-disk cache of raw model responses, backed by SQLite.
+
+    Entries are evicted in least recently used order once the total size goes over `max_size_mb`.
+    With `refresh=True`, lookups always miss, so every request goes to the provider and overwrites the
+    cached response.
+    """
+
+    def __init__(self, cache_dir, max_size_mb=2048, refresh=False):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "responses.db")
+        self.max_size = max_size_mb * 1024 * 1024
+        self.refresh = refresh
+
+        self.hit_count = 0
+        self.miss_count = 0
+        self.eviction_count = 0
+
+        self._lock = threading.Lock()
+        # Several generation processes (eg, shards on the same node) may share one cache file.
+        self._connection = sqlite3.connect(
+            self.path, timeout=60, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response BLOB NOT NULL,
+                latency REAL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        # Kept up to date on every write, so that the size check doesn't need a table scan.
+        self._total_size = self._query_total_size()
+
+    def _query_total_size(self):
+        return self._connection.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM responses"
+        ).fetchone()[0]
+
+    def get(self, key):
+        """
+        Returns the cached (response, latency) pair, or None on a miss.
+        """
+        if self.refresh:
+            with self._lock:
+                self.miss_count += 1
+            return None
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, latency FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.miss_count += 1
+                return None
+            try:
+                response = pickle.loads(row[0])
+            except Exception:
+                # Written by an incompatible SDK version; drop it and query the provider again.
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.miss_count += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hit_count += 1
+            return response, row[1]
+
+    def put(self, key, response, latency):
+        try:
+            blob = pickle.dumps(response)
+        except Exception:
+            # Some SDK response objects can't be pickled; such requests are just not cached.
+            return
+
+        with self._lock:
+            replaced = self._connection.execute(
+                "SELECT size FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if replaced is not None:
+                self._total_size -= replaced[0]
+            self._total_size += len(blob)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, latency, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, blob, latency, len(blob), time.time()),
+            )
+            self._evict_if_needed()
+
+    def _evict_if_needed(self):
+        if self._total_size <= self.max_size:
+            return
+        # Other processes may have written to the same file, so get the exact size before evicting.
+        total_size = self._query_total_size()
+        if total_size <= self.max_size:
+            self._total_size = total_size
+            return
+
+        target_size = self.max_size * EVICTION_TARGET_FRACTION
+        rows = self._connection.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        ).fetchall()
+        evicted_keys = []
+        for key, size in rows:
+            if total_size <= target_size:
+                break
+            evicted_keys.append((key,))
+            total_size -= size
+        self._connection.executemany("DELETE FROM responses WHERE key = ?", evicted_keys)
+        self.eviction_count += len(evicted_keys)
+        self._total_size = total_size
+
+    def get_stats(self):
+        with self._lock:
+            entry_count, total_size = self._connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            lookup_count = self.hit_count + self.miss_count
+            return {
+                "hit_count": self.hit_count,
+                "miss_count": self.miss_count,
+                "hit_rate": self.hit_count / lookup_count if lookup_count else 0,
+                "eviction_count": self.eviction_count,
+                "entry_count": entry_count,
+                "size_mb": round(total_size / 1024 / 1024, 2),
+            }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
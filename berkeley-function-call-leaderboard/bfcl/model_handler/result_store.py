@@ -0,0 +1,310 @@
+import json
+import os
+import queue
+import threading
+
+from bfcl.model_handler.utils import sort_key
+
+# Upper bound on the number of entries committed (and fsynced) together by the writer thread.
+MAX_BATCH_SIZE = 512
+# Prefix of the index lines that record the size and modification time of the result file.
+INDEX_STAMP_PREFIX = "#\t"
+
+
+def get_result_filename(test_category):
+    return f"BFCL_v2_{test_category}_result.json"
+
+
+def _fsync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+class _ResultFile:
+    """
+    One `BFCL_v2_<category>_result.json` file and its id index.
+
+    The result file itself is the append-only log, so it always stays in the JSONL layout that `eval_runner.py`
+    reads. The index is a hidden sidecar file with one `<id>\\t<end offset>` line per committed entry. It is only
+    ever written after the entries it lists have been fsynced to the result file, so on load every indexed id is
+    known to be on disk, and only the part of the result file past the last indexed offset has to be re-read.
+
+    Each write to the index ends with a stamp line holding the size and modification time of the result file.
+    If they don't match on load, the result file was changed by something else (eg, entries deleted by hand to
+    regenerate them), and the index is rebuilt from the result file.
+    """
+
+    def __init__(self, result_dir, filename):
+        self.path = os.path.join(result_dir, filename)
+        self.index_path = os.path.join(result_dir, f".{filename}.ids")
+        self.ids = set()
+        self.end_offset = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            if os.path.exists(self.index_path):
+                os.remove(self.index_path)
+            return
+
+        log_size = os.path.getsize(self.path)
+        indexed_entries = []
+        # Whether the index file has to be rewritten rather than appended to.
+        rewrite_index = not os.path.exists(self.index_path)
+        if not rewrite_index:
+            stamp = None
+            with open(self.index_path) as f:
+                for line in f:
+                    if line.startswith(INDEX_STAMP_PREFIX) and line.endswith("\n"):
+                        stamp = line[len(INDEX_STAMP_PREFIX) : -1]
+                        continue
+                    entry_id, _, end_offset = line.rstrip("\n").partition("\t")
+                    if not line.endswith("\n") or not end_offset.isdigit() or int(end_offset) > log_size:
+                        # A crash while appending to the index leaves a partial last line; the rest is re-derived below.
+                        rewrite_index = True
+                        break
+                    indexed_entries.append((entry_id, int(end_offset)))
+            if stamp != self._get_stamp():
+                # The result file was edited, or the index is from before stamps; read the whole result file.
+                indexed_entries = []
+                rewrite_index = True
+
+        if indexed_entries and not self._is_line_boundary(indexed_entries[-1][1]):
+            # The result file was rewritten behind our back (eg, by an older version of this script); don't trust the index.
+            indexed_entries = []
+            rewrite_index = True
+
+        self.end_offset = indexed_entries[-1][1] if indexed_entries else 0
+        has_tail = self.end_offset < log_size
+        recovered = self._recover_tail() if has_tail else []
+        if rewrite_index:
+            self._rewrite_index(indexed_entries + recovered)
+        elif has_tail:
+            self._append_index(recovered)
+        self.ids = {entry_id for entry_id, _ in indexed_entries + recovered}
+
+    def _get_stamp(self):
+        stat = os.stat(self.path)
+        return f"{stat.st_size}\t{stat.st_mtime_ns}"
+
+    def _format_index(self, indexed_entries):
+        lines = [f"{entry_id}\t{end_offset}\n" for entry_id, end_offset in indexed_entries]
+        lines.append(f"{INDEX_STAMP_PREFIX}{self._get_stamp()}\n")
+        return lines
+
+    def _is_line_boundary(self, offset):
+        with open(self.path, "rb") as f:
+            f.seek(offset - 1)
+            return f.read(1) == b"\n"
+
+    def _recover_tail(self):
+        # Read back the entries that made it to the result file but not to the index, and cut off a partially written last line.
+        recovered = []
+        offset = self.end_offset
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry_id = json.loads(line)["id"]
+                except (ValueError, KeyError, TypeError) as e:
+                    # Only a crash mid-write is repaired automatically; a complete but malformed line is left alone.
+                    raise ValueError(
+                        f"Malformed entry at byte {offset} of {self.path}, please fix or remove it."
+                    ) from e
+                offset += len(line)
+                recovered.append((entry_id, offset))
+
+        if offset < os.path.getsize(self.path):
+            with open(self.path, "r+b") as f:
+                f.truncate(offset)
+                _fsync(f)
+        self.end_offset = offset
+        return recovered
+
+    def _append_index(self, indexed_entries):
+        with open(self.index_path, "a") as f:
+            f.writelines(self._format_index(indexed_entries))
+
+    def _rewrite_index(self, indexed_entries):
+        temp_path = self.index_path + ".tmp"
+        with open(temp_path, "w") as f:
+            f.writelines(self._format_index(indexed_entries))
+            _fsync(f)
+        os.replace(temp_path, self.index_path)
+
+    def append(self, entries):
+        indexed_entries = []
+        offset = self.end_offset
+        with open(self.path, "ab") as f:
+            for entry in entries:
+                line = (json.dumps(entry) + "\n").encode("utf-8")
+                f.write(line)
+                offset += len(line)
+                indexed_entries.append((entry["id"], offset))
+            _fsync(f)
+        self._append_index(indexed_entries)
+        self.ids.update(entry["id"] for entry in entries)
+        self.end_offset = offset
+
+    def read_entries(self):
+        """
+        Return the committed entries, one per id (the latest one wins), sorted the same way as the dataset.
+        """
+        if not os.path.exists(self.path):
+            return []
+        entries = {}
+        with open(self.path) as f:
+            for line in f:
+                entry = json.loads(line)
+                entries[entry["id"]] = entry
+        return sorted(entries.values(), key=sort_key)
+
+    def export(self):
+        """
+        Rewrite the result file deduplicated and in dataset order.
+        """
+        if not os.path.exists(self.path):
+            return
+        sorted_entries = self.read_entries()
+
+        temp_path = self.path + ".tmp"
+        indexed_entries = []
+        offset = 0
+        with open(temp_path, "wb") as f:
+            for entry in sorted_entries:
+                line = (json.dumps(entry) + "\n").encode("utf-8")
+                f.write(line)
+                offset += len(line)
+                indexed_entries.append((entry["id"], offset))
+            _fsync(f)
+        # Drop the index first: if we crash between the two replaces, it is rebuilt from the result file on the next load.
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+        os.replace(temp_path, self.path)
+        self._rewrite_index(indexed_entries)
+        self.ids = {entry["id"] for entry in sorted_entries}
+        self.end_offset = offset
+
+
+class ResultStore:
+    """
+    Durable store for the generation results of one model, in `result_dir`.
+
+    `put` only enqueues; a dedicated writer thread commits whatever has been queued in one batch per result
+    file, with a single fsync per batch. Committed ids are kept in a persistent index, so `contains` is O(1)
+    and resuming an interrupted run does not need to re-read the result files. `export` rewrites the result
+    files deduplicated and in dataset order, which is what `eval_runner.py` expects.
+    """
+
+    def __init__(self, result_dir):
+        self.result_dir = result_dir
+        os.makedirs(result_dir, exist_ok=True)
+        self._files = {}
+        self._files_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._error = None
+        self._closed = False
+        self._writer = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer.start()
+
+    def _get_file(self, test_category):
+        with self._files_lock:
+            if test_category not in self._files:
+                self._files[test_category] = _ResultFile(
+                    self.result_dir, get_result_filename(test_category)
+                )
+            return self._files[test_category]
+
+    def contains(self, entry_id):
+        test_category = entry_id.rsplit("_", 1)[0]
+        return entry_id in self._get_file(test_category).ids
+
+    def put(self, entry):
+        self._raise_if_failed()
+        self._queue.put(entry)
+
+    def flush(self):
+        """
+        Block until every entry queued so far is committed to disk.
+        """
+        self._queue.join()
+        self._raise_if_failed()
+
+    def read_entries(self, test_category):
+        self.flush()
+        return self._get_file(test_category).read_entries()
+
+    def export(self):
+        self.flush()
+        with self._files_lock:
+            result_files = list(self._files.values())
+        for result_file in result_files:
+            result_file.export()
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise RuntimeError(f"Failed to write results to {self.result_dir}") from self._error
+
+    def _write_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            # Group commit: take everything else that is already waiting.
+            while len(batch) < MAX_BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in batch
+            entries = [entry for entry in batch if entry is not None]
+            try:
+                if self._error is None:
+                    self._commit(entries)
+            except Exception as e:
+                self._error = e
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                return
+
+    def _commit(self, entries):
+        entries_by_category = {}
+        for entry in entries:
+            test_category = entry["id"].rsplit("_", 1)[0]
+            entries_by_category.setdefault(test_category, []).append(entry)
+        for test_category, category_entries in entries_by_category.items():
+            self._get_file(test_category).append(category_entries)
+
+
+# One store per result directory, shared by every handler and thread in the process.
+_RESULT_STORES = {}
+_RESULT_STORES_LOCK = threading.Lock()
+
+
+def get_result_store(result_dir):
+    result_dir = os.path.normpath(result_dir)
+    with _RESULT_STORES_LOCK:
+        if result_dir not in _RESULT_STORES:
+            _RESULT_STORES[result_dir] = ResultStore(result_dir)
+        return _RESULT_STORES[result_dir]
+
+
+def close_all_result_stores(export=True):
+    with _RESULT_STORES_LOCK:
+        result_stores = list(_RESULT_STORES.values())
+        _RESULT_STORES.clear()
+    for result_store in result_stores:
+        if export:
+            result_store.export()
+        result_store.close()
@@ -0,0 +1,219 @@
+import importlib.util
+import ssl
+import threading
+from urllib.parse import urlparse
+
+import certifi
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+from bfcl.model_handler.rate_limiter import record_response_headers
+
+# Idle keep-alive connections are closed after this many seconds.
+KEEPALIVE_EXPIRY = 120
+# Default timeout in seconds for requests that don't set their own (the SDKs always do).
+DEFAULT_TIMEOUT = 600
+
+# Set once by the generation script through `configure_transport`, before any handler is built.
+_pool_size = 64
+_http2 = False
+
+# One client per host, shared by every handler and thread in the process.
+_HTTP_CLIENTS = {}
+_ASYNC_HTTP_CLIENTS = {}
+_REQUESTS_SESSIONS = {}
+_TRANSPORT_STATS = {}
+_TRANSPORT_LOCK = threading.Lock()
+_ssl_context = None
+
+
+def configure_transport(pool_size, http2=False):
+    """
+    Size the per-host connection pools to the configured concurrency. HTTP/2 is only used if the `h2` package is installed.
+    """
+    global _pool_size, _http2
+    _pool_size = pool_size
+    if http2 and importlib.util.find_spec("h2") is None:
+        print("⚠️ HTTP/2 was requested but the `h2` package is not installed; falling back to HTTP/1.1.")
+        http2 = False
+    _http2 = http2
+
+
+def _get_host(url):
+    return urlparse(str(url)).netloc or str(url)
+
+
+def _get_ssl_context():
+    # Building an SSL context loads the whole CA bundle, so all clients share one.
+    global _ssl_context
+    if _ssl_context is None:
+        _ssl_context = ssl.create_default_context(cafile=certifi.where())
+    return _ssl_context
+
+
+class _TransportStats:
+    def __init__(self, host):
+        self.host = host
+        self.request_count = 0
+        self.connection_count = 0
+        self.tls_handshake_count = 0
+        self._lock = threading.Lock()
+
+    def record(self, event_name):
+        with self._lock:
+            if event_name == "request":
+                self.request_count += 1
+            elif event_name == "connection.connect_tcp.complete":
+                self.connection_count += 1
+            elif event_name == "connection.start_tls.complete":
+                self.tls_handshake_count += 1
+
+    def set_connection_count(self, connection_count):
+        with self._lock:
+            self.connection_count = connection_count
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "host": self.host,
+                "request_count": self.request_count,
+                "connection_count": self.connection_count,
+                "tls_handshake_count": self.tls_handshake_count,
+                # Share of requests that went over an already open connection.
+                "connection_reuse_rate": (
+                    1 - self.connection_count / self.request_count if self.request_count else 0
+                ),
+            }
+
+
+def _get_stats(host):
+    # Must be called with `_TRANSPORT_LOCK` held.
+    if host not in _TRANSPORT_STATS:
+        _TRANSPORT_STATS[host] = _TransportStats(host)
+    return _TRANSPORT_STATS[host]
+
+
+def _get_limits():
+    return httpx.Limits(
+        max_connections=_pool_size,
+        max_keepalive_connections=_pool_size,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def get_http_client(base_url):
+    """
+    Shared `httpx.Client` for the host of `base_url`, to pass as `http_client` to the OpenAI and Anthropic SDKs.
+    """
+    host = _get_host(base_url)
+    with _TRANSPORT_LOCK:
+        if host not in _HTTP_CLIENTS:
+            stats = _get_stats(host)
+
+            def trace(event_name, info):
+                stats.record(event_name)
+
+            def on_request(request):
+                stats.record("request")
+                # httpcore reports connection setup through the trace extension.
+                request.extensions["trace"] = trace
+
+            def on_response(response, host=host):
+                # The rate limiter of the provider adapts to the quota headers of successful responses too.
+                record_response_headers(host, response.headers)
+
+            _HTTP_CLIENTS[host] = httpx.Client(
+                limits=_get_limits(),
+                http2=_http2,
+                verify=_get_ssl_context(),
+                timeout=DEFAULT_TIMEOUT,
+                event_hooks={"request": [on_request], "response": [on_response]},
+            )
+        return _HTTP_CLIENTS[host]
+
+
+def get_async_http_client(base_url):
+    """
+    Same as `get_http_client`, for the async SDK clients.
+    """
+    host = _get_host(base_url)
+    with _TRANSPORT_LOCK:
+        if host not in _ASYNC_HTTP_CLIENTS:
+            stats = _get_stats(host)
+
+            async def trace(event_name, info):
+                stats.record(event_name)
+
+            async def on_request(request):
+                stats.record("request")
+                request.extensions["trace"] = trace
+
+            async def on_response(response, host=host):
+                record_response_headers(host, response.headers)
+
+            _ASYNC_HTTP_CLIENTS[host] = httpx.AsyncClient(
+                limits=_get_limits(),
+                http2=_http2,
+                verify=_get_ssl_context(),
+                timeout=DEFAULT_TIMEOUT,
+                event_hooks={"request": [on_request], "response": [on_response]},
+            )
+        return _ASYNC_HTTP_CLIENTS[host]
+
+
+def get_requests_session(url):
+    """
+    Shared `requests.Session` with a keep-alive connection pool for the host of `url`, for handlers that
+    call their endpoint directly.
+    """
+    host = _get_host(url)
+    with _TRANSPORT_LOCK:
+        if host not in _REQUESTS_SESSIONS:
+            stats = _get_stats(host)
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=_pool_size)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.hooks["response"].append(lambda response, *args, **kwargs: stats.record("request"))
+            session.hooks["response"].append(
+                lambda response, *args, host=host, **kwargs: record_response_headers(host, response.headers)
+            )
+            _REQUESTS_SESSIONS[host] = session
+        return _REQUESTS_SESSIONS[host]
+
+
+def _count_requests_connections(session):
+    # urllib3 counts the connections each pool has opened. Both prefixes are mounted on the same adapter.
+    connection_count = 0
+    adapters = {id(adapter): adapter for adapter in session.adapters.values()}
+    for adapter in adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connection_count += pool.num_connections
+    return connection_count
+
+
+def get_all_transport_stats():
+    with _TRANSPORT_LOCK:
+        sessions = dict(_REQUESTS_SESSIONS)
+        all_stats = list(_TRANSPORT_STATS.values())
+    for host, session in sessions.items():
+        _TRANSPORT_STATS[host].set_connection_count(_count_requests_connections(session))
+    return [stats.get_stats() for stats in all_stats if stats.request_count > 0]
+
+
+def close_all_transports():
+    with _TRANSPORT_LOCK:
+        clients = list(_HTTP_CLIENTS.values())
+        sessions = list(_REQUESTS_SESSIONS.values())
+        _HTTP_CLIENTS.clear()
+        _REQUESTS_SESSIONS.clear()
+        # Async clients belong to the event loop that used them, which is closed by now.
+        _ASYNC_HTTP_CLIENTS.clear()
+    for client in clients:
+        client.close()
+    for session in sessions:
+        session.close()
@@ -1,9 +1,32 @@
-import re, ast, builtins, ast, json
+import re, ast, builtins, ast, json, threading
+from collections import OrderedDict
 from bfcl.model_handler.model_style import ModelStyle
 from bfcl.model_handler.java_parser import parse_java_function_call
 from bfcl.model_handler.js_parser import parse_javascript_function_call
 from bfcl.model_handler.constant import GORILLA_TO_OPENAPI, USE_COHERE_OPTIMIZATION
 
+def sort_key(entry):
+    """
+    Index comes in two forms: TestCategory_Index or TestCategory_Index-FuncDocSubIndex-PromptSubIndex; both 0-indexed.
+    
+    TestCategory_Index: For example, `simple_20` means the 21st entry in the `simple` test category.
+    
+    TestCategory_Index-FuncDocSubIndex-PromptSubIndex is used when there are multiple prompts for a single function doc; this only happens in the live dataset.
+    FuncDocSubIndex increments for each unique function doc.
+    PromptSubIndex is per function doc. It resets to 0 for each function doc.
+        For example, `live_simple_19-3-15` means the 20th entry in the `live_simple` test category. 
+        This entry has the 4th unique function doc and the 16th prompt for that function doc (there are at least 15 other prompts for this same function doc in this category).
+    
+    In either case, the universal index is enough to sort the entries.
+    """
+    parts = entry["id"].rsplit("_", 1)
+    test_category, index = parts[0], parts[1]
+    # This handles the case where the index is in the form TestCategory_Index-FuncDocSubIndex-PromptSubIndex
+    if "-" in index:
+        index = index.split("-")[0]
+    return (test_category, int(index))
+
+
 def _cast_to_openai_type(properties, mapping, test_category):
     for key, value in properties.items():
         if "type" not in value:
@@ -51,9 +74,67 @@ def _cast_to_openai_type(properties, mapping, test_category):
     return properties
 
 
-def convert_to_tool(
-    functions, mapping, model_style, test_category
-):
+def unpack_test_case(test_case):
+    user_question, functions, test_category = (
+        test_case["question"],
+        test_case["function"],
+        test_case["id"].rsplit("_", 1)[0],
+    )
+    if type(functions) is dict or type(functions) is str:
+        functions = [functions]
+    return user_question, functions, test_category
+
+
+# Number of processed function docs and tool payloads kept in memory.
+FUNC_DOC_CACHE_SIZE = 8192
+
+# Function docs are interned when the dataset is loaded, so that all test cases with the same function doc (the live
+# datasets reuse them across many prompts) share one object. The processed forms are then memoized by object identity,
+# which makes a lookup O(1) instead of hashing the whole doc on every request.
+_INTERNED_FUNC_DOCS = {}
+_FUNC_DOC_CACHE = OrderedDict()
+_FUNC_DOC_CACHE_LOCK = threading.Lock()
+
+
+def intern_func_doc(function):
+    """
+    Return the canonical object for this function doc. Interned docs must not be modified.
+    """
+    return _INTERNED_FUNC_DOCS.setdefault(json.dumps(function), function)
+
+
+def _memoize_by_identity(process, objects, *args):
+    # `objects` are compared by identity. The cache keeps a reference to them, so their ids can't be reused
+    # by other objects while the entry is alive.
+    cache_key = tuple(id(obj) for obj in objects) + args
+    with _FUNC_DOC_CACHE_LOCK:
+        cached = _FUNC_DOC_CACHE.get(cache_key)
+        if cached is not None and all(a is b for a, b in zip(cached[0], objects)):
+            _FUNC_DOC_CACHE.move_to_end(cache_key)
+            return cached[1]
+
+    # The processing functions work in place, so give them a private copy.
+    result = process(*json.loads(json.dumps(objects)), *args)
+
+    with _FUNC_DOC_CACHE_LOCK:
+        _FUNC_DOC_CACHE[cache_key] = (objects, result)
+        if len(_FUNC_DOC_CACHE) > FUNC_DOC_CACHE_SIZE:
+            _FUNC_DOC_CACHE.popitem(last=False)
+    return result
+
+
+def convert_to_tool(functions, mapping, model_style, test_category):
+    """
+    Memoized; the input is not modified, and the returned payload is shared between callers, so it must not be
+    modified either.
+    """
+    return _memoize_by_identity(
+        _convert_to_tool, (functions, mapping), model_style, test_category
+    )
+
+
+def _convert_to_tool(functions, mapping, model_style, test_category):
+    # Converts in place; use `convert_to_tool` instead.
     oai_tool = []
     for item in functions:
         if "." in item["name"] and (
@@ -366,6 +447,14 @@ def func_doc_language_specific_pre_processing(function, test_category):
        return function
 
     assert type(function) == list
+    # Memoized the same way as `convert_to_tool`; neither the input nor the result may be modified.
+    return _memoize_by_identity(
+        _func_doc_language_specific_pre_processing, (function,), test_category
+    )
+
+
+def _func_doc_language_specific_pre_processing(function, test_category):
+    # Processes in place; use `func_doc_language_specific_pre_processing` instead.
     for item in function:
         # Add language specific hints to the function description
         func_description = item["description"]
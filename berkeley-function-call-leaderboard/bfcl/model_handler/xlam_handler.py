@@ -44,7 +44,11 @@ class xLAMHandler(OSSHandler):
                 xlam_tools = {
                     "name": tools["name"],
                     "description": tools["description"],
-                    "parameters": tools["parameters"].get("properties", {}),
+                    # Copied, since the function doc may be shared with other test cases.
+                    "parameters": {
+                        name: dict(param)
+                        for name, param in tools["parameters"].get("properties", {}).items()
+                    },
                 }
                 required = tools["parameters"].get("required", [])
                 for param in required:
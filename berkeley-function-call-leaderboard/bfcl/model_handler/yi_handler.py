@@ -6,8 +6,9 @@ from bfcl.model_handler.utils import (
     func_doc_language_specific_pre_processing,
 )
 from bfcl.model_handler.constant import GORILLA_TO_OPENAPI
+from bfcl.model_handler.transport import get_http_client
 from openai import OpenAI
-import os, time, json
+import os, json
 
 
 class YiHandler(BaseHandler):
@@ -15,7 +16,11 @@ class YiHandler(BaseHandler):
         super().__init__(model_name, temperature, top_p, max_tokens)
         self.model_style = ModelStyle.OpenAI
         self.base_url = "https://api.01.ai/v1"
-        self.client = OpenAI(base_url=self.base_url, api_key=os.getenv("YI_API_KEY"))
+        self.client = OpenAI(
+            base_url=self.base_url,
+            api_key=os.getenv("YI_API_KEY"),
+            http_client=get_http_client(self.base_url),
+        )
 
     def inference(self, prompt, functions, test_category):
         functions = func_doc_language_specific_pre_processing(functions, test_category)
@@ -24,9 +29,9 @@ class YiHandler(BaseHandler):
         oai_tool = convert_to_tool(
             functions, GORILLA_TO_OPENAPI, self.model_style, test_category
         )
-        start_time = time.time()
         if len(oai_tool) > 0:
-            response = self.client.chat.completions.create(
+            response, latency = self._request(
+                self.client.chat.completions.create,
                 messages=message,
                 model=self.model_name,
                 temperature=self.temperature,
@@ -35,14 +40,14 @@ class YiHandler(BaseHandler):
                 tools=oai_tool,
             )
         else:
-            response = self.client.chat.completions.create(
+            response, latency = self._request(
+                self.client.chat.completions.create,
                 messages=message,
                 model=self.model_name,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
                 top_p=self.top_p,
             )
-        latency = time.time() - start_time
         try:
             result = [
                 {func_call.function.name: func_call.function.arguments}
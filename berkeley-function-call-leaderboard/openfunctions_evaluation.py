@@ -1,14 +1,27 @@
-import argparse, json, os, time
+import argparse, asyncio, contextlib, hashlib, json, os, sys, time
 from tqdm import tqdm
+from bfcl.model_handler.batch_api import BatchGenerationJob, run_batch_generation, DEFAULT_POLL_INTERVAL
 from bfcl.model_handler.handler_map import handler_map
 from bfcl.model_handler.model_style import ModelStyle
+from bfcl.model_handler.oss_backend import DEFAULT_MAX_BATCH_TOKENS
+from bfcl.model_handler.oss_handler import order_by_shared_prefix
 from bfcl.model_handler.constant import USE_COHERE_OPTIMIZATION
+from bfcl.model_handler.rate_limiter import get_rate_limiter, get_all_rate_limiter_stats
+from bfcl.model_handler.response_cache import ResponseCache
+from bfcl.model_handler.result_store import get_result_store, close_all_result_stores
+from bfcl.model_handler.transport import (
+    configure_transport,
+    get_all_transport_stats,
+    close_all_transports,
+)
+from bfcl.model_handler.utils import sort_key, intern_func_doc, unpack_test_case
 from bfcl.eval_checker.eval_checker_constant import TEST_COLLECTION_MAPPING, TEST_FILE_MAPPING
-from concurrent.futures import ThreadPoolExecutor
+from collections import defaultdict
+from itertools import zip_longest
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
+# Backoff delays come from the shared per-provider rate limiter (Retry-After or jittered exponential backoff).
 RETRY_LIMIT = 3
-# 60s for the timer to complete. But often we find that even with 60 there is a conflict. So 65 is a safe no.
-RETRY_DELAY = 65  # Delay in seconds
 
 def get_args():
     parser = argparse.ArgumentParser()
@@ -25,35 +38,86 @@ def get_args():
     parser.add_argument("--timeout", default=60, type=int)
     parser.add_argument("--num-threads", default=1, type=int)
     parser.add_argument("--gpu-memory-utilization", default=0.9, type=float)
+    # OSS models generate this many test cases per vLLM call, and their results are committed after each chunk.
+    # The engine stays loaded between chunks. 0 generates everything in one call.
+    parser.add_argument("--oss-chunk-size", default=1000, type=int)
+    # Inference backend for OSS models: vLLM on GPUs, transformers on CPU for machines without a supported GPU, or
+    # a running OSS model server (`python -m bfcl.model_handler.oss_server`) at `--oss-server-url`.
+    parser.add_argument("--oss-backend", default="vllm", choices=["vllm", "transformers", "server"])
+    parser.add_argument("--oss-server-url", default="http://localhost:8000/v1", type=str)
+    # Options of the transformers backend: int8 dynamic quantization, number of CPU threads (0 for all cores),
+    # and the number of padded tokens per batch.
+    parser.add_argument("--cpu-quantize", action="store_true", default=False)
+    parser.add_argument("--cpu-threads", default=0, type=int)
+    parser.add_argument("--cpu-max-batch-tokens", default=DEFAULT_MAX_BATCH_TOKENS, type=int)
+    # Use the asyncio generation engine for hosted models instead of the thread pool.
+    parser.add_argument("--async", dest="use_async", action="store_true", default=False)
+    # Maximum number of in-flight requests per provider when `--async` is set.
+    parser.add_argument("--max-concurrency", default=64, type=int)
+    # Use HTTP/2 for the hosted model endpoints (requires the `h2` package).
+    parser.add_argument("--http2", action="store_true", default=False)
+    # Opt-in on-disk cache of raw model responses, so that byte-identical requests are not sent twice.
+    parser.add_argument("--cache", dest="use_cache", action="store_true", default=False)
+    parser.add_argument("--no-cache", dest="use_cache", action="store_false")
+    # Ignore cached responses and overwrite them with fresh ones. Implies `--cache`.
+    parser.add_argument("--refresh-cache", action="store_true", default=False)
+    parser.add_argument("--cache-dir", default="./cache/", type=str)
+    # Least recently used responses are evicted once the cache grows past this size.
+    parser.add_argument("--cache-max-size", default=2048, type=int, help="Size limit in MB")
+    # Split the test cases into `--num-shards` deterministic parts and only generate part `--shard-index`.
+    parser.add_argument("--num-shards", default=1, type=int)
+    parser.add_argument("--shard-index", default=0, type=int)
+    # Merge the results of all `--num-shards` shards into the regular result files, instead of generating.
+    parser.add_argument("--merge-shards", action="store_true", default=False)
+    # Submit the test cases through the provider's asynchronous batch API (OpenAI and Anthropic models) and wait for
+    # the results, instead of sending one request per test case. Other models are generated as usual.
+    parser.add_argument("--batch-api", action="store_true", default=False)
+    parser.add_argument("--batch-poll-interval", default=DEFAULT_POLL_INTERVAL, type=int, help="In seconds")
     args = parser.parse_args()
+    if not 0 <= args.shard_index < args.num_shards:
+        parser.error("--shard-index must be between 0 and --num-shards - 1")
     return args
 
 
-def build_handler(model_name, temperature, top_p, max_tokens):
+def build_handler(model_name, temperature, top_p, max_tokens, response_cache=None, result_dir=None):
     handler = handler_map[model_name](model_name, temperature, top_p, max_tokens)
+    handler.response_cache = response_cache
+    handler.result_dir = result_dir
     return handler
 
 
-def sort_key(entry):
+def get_result_dir(model_name, shard_index=0, num_shards=1):
+    model_name_dir = model_name.replace("/", "_")
+    if num_shards == 1:
+        return f"./result/{model_name_dir}"
+    # Shards live one level down, where `eval_runner.py` doesn't look, until they are merged.
+    return f"./result/{model_name_dir}/shards/{shard_index}_of_{num_shards}"
+
+
+def assign_shards(test_cases, num_shards):
     """
-    Index comes in two forms: TestCategory_Index or TestCategory_Index-FuncDocSubIndex-PromptSubIndex; both 0-indexed.
-    
-    TestCategory_Index: For example, `simple_20` means the 21st entry in the `simple` test category.
-    
-    TestCategory_Index-FuncDocSubIndex-PromptSubIndex is used when there are multiple prompts for a single function doc; this only happens in the live dataset.
-    FuncDocSubIndex increments for each unique function doc.
-    PromptSubIndex is per function doc. It resets to 0 for each function doc.
-        For example, `live_simple_19-3-15` means the 20th entry in the `live_simple` test category. 
-        This entry has the 4th unique function doc and the 16th prompt for that function doc (there are at least 15 other prompts for this same function doc in this category).
-    
-    In either case, the universal index is enough to sort the entries.
+    Deterministically split the test cases of one dataset file into `num_shards` parts of similar total prompt length.
+
+    This is the longest-processing-time-first heuristic: the longest test case goes to the currently lightest shard.
+    Ties are broken by a hash of the id (not Python's `hash`, which is salted per process), so that every machine
+    computes the same assignment. It only depends on the dataset file, not on which test cases are already done.
+    Returns the shard index of each test case.
     """
-    parts = entry["id"].rsplit("_", 1)
-    test_category, index = parts[0], parts[1]
-    # This handles the case where the index is in the form TestCategory_Index-FuncDocSubIndex-PromptSubIndex
-    if "-" in index:
-        index = index.split("-")[0]
-    return (test_category, int(index))
+    weights = [
+        len(json.dumps(test_case["question"])) + len(json.dumps(test_case["function"]))
+        for test_case in test_cases
+    ]
+    id_hashes = [
+        hashlib.sha256(test_case["id"].encode("utf-8")).hexdigest() for test_case in test_cases
+    ]
+
+    shard_loads = [0] * num_shards
+    shard_indices = [0] * len(test_cases)
+    for i in sorted(range(len(test_cases)), key=lambda i: (-weights[i], id_hashes[i])):
+        shard_index = min(range(num_shards), key=lambda shard: (shard_loads[shard], shard))
+        shard_indices[i] = shard_index
+        shard_loads[shard_index] += weights[i]
+    return shard_indices
 
 
 def parse_test_category_argument(test_category_args):
@@ -72,112 +136,288 @@ def parse_test_category_argument(test_category_args):
     return sorted(list(test_name_total)), sorted(list(test_filename_total))
 
 
-def collect_test_cases(test_filename_total, model_name):
-    model_name_dir = model_name.replace("/", "_")
+def load_test_cases(file_to_open):
+    test_cases = []
+    with open("./data/" + file_to_open) as f:
+        for line in f:
+            test_case = json.loads(line)
+            # Test cases that share a function doc then share its preprocessed form and tool payloads.
+            test_case["function"] = intern_func_doc(test_case["function"])
+            test_cases.append(test_case)
+    return test_cases
+
+
+def collect_test_cases(test_filename_total, model_name, shard_index=0, num_shards=1):
+    # The result store keeps an index of the ids already generated, so this doesn't re-read the result files.
+    result_store = get_result_store(get_result_dir(model_name, shard_index, num_shards))
     test_cases_total = []
     for file_to_open in test_filename_total:
-        test_cases = []
-        with open("./data/" + file_to_open) as f:
-            for line in f:
-                test_cases.append(json.loads(line))
-
-        existing_result = []
-        if os.path.exists(
-            "./result/"
-            + model_name_dir
-            + "/"
-            + file_to_open.replace(".json", "_result.json")
-        ):
-            with open(
-                "./result/"
-                + model_name_dir
-                + "/"
-                + file_to_open.replace(".json", "_result.json")
-            ) as f:
-                for line in f:
-                    existing_result.append(json.loads(line))
-
-        existing_ids = [entry["id"] for entry in existing_result]
+        test_cases = load_test_cases(file_to_open)
+        if num_shards > 1:
+            # Partition the whole file before dropping finished test cases, so that the assignment never changes.
+            shard_indices = assign_shards(test_cases, num_shards)
+            test_cases = [
+                test_case
+                for test_case, assigned_shard in zip(test_cases, shard_indices)
+                if assigned_shard == shard_index
+            ]
+
         test_cases_total.extend(
             [
                 test_case
                 for test_case in test_cases
-                if test_case["id"] not in existing_ids
+                if not result_store.contains(test_case["id"])
             ]
         )
 
     return sorted(test_cases_total, key=sort_key)
 
 
-def multi_threaded_inference(handler, test_case):
-    user_question, functions, test_category = (
-        test_case["question"],
-        test_case["function"],
-        test_case["id"].rsplit("_", 1)[0],
+def merge_shards(test_filename_total, model_name, num_shards):
+    """
+    Merge the results of all shards of one model into its regular result files.
+
+    Entries found in more than one shard are deduplicated. A test category is only merged once every one of its
+    test cases is in some shard (or already in the regular result files); returns False if any category was not.
+    """
+    result_store = get_result_store(get_result_dir(model_name))
+    shard_stores = [
+        get_result_store(get_result_dir(model_name, shard_index, num_shards))
+        for shard_index in range(num_shards)
+    ]
+    complete = True
+    for file_to_open in test_filename_total:
+        test_category = file_to_open.replace("BFCL_v2_", "").replace(".json", "")
+        expected_ids = {test_case["id"] for test_case in load_test_cases(file_to_open)}
+
+        merged = {}
+        duplicate_count = 0
+        for shard_store in shard_stores:
+            for entry in shard_store.read_entries(test_category):
+                if entry["id"] not in expected_ids:
+                    continue
+                if entry["id"] in merged:
+                    duplicate_count += 1
+                merged[entry["id"]] = entry
+
+        missing_ids = [
+            entry_id
+            for entry_id in expected_ids
+            if entry_id not in merged and not result_store.contains(entry_id)
+        ]
+        if missing_ids:
+            complete = False
+            print(
+                f"❗️ {model_name}, {test_category}: {len(missing_ids)} of {len(expected_ids)} test cases are missing from all shards, "
+                f"for example {sorted(missing_ids)[:5]}. Not merging this category."
+            )
+            continue
+
+        for entry in merged.values():
+            result_store.put(entry)
+        print(
+            f"✅ {model_name}, {test_category}: merged {len(merged)} entries from {num_shards} shards "
+            f"({duplicate_count} duplicates dropped)."
+        )
+    return complete
+
+
+def _is_retryable_error(e):
+    # TODO: It might be better to handle the exception in the handler itself rather than a universal catch block here, as each handler use different ways to call the endpoint.
+    # OpenAI has openai.RateLimitError while Anthropic has anthropic.RateLimitError. It would be more robust in the long run.
+    return "rate limit reached" in str(e).lower() or (
+        hasattr(e, "status_code") and (e.status_code in {429, 503, 500})
     )
-    if type(functions) is dict or type(functions) is str:
-        functions = [functions]
 
-    retry_count = 0
+
+def _inference_error_result(test_case, e):
+    # This is usually the case when the model getting stuck on one particular test case.
+    # For example, timeout error or FC model returning invalid JSON response.
+    # Since temperature is already set to 0.001, retrying the same test case will not help.
+    # So we continue the generation process and record the error message as the model response
+    print("-" * 100)
+    print(
+        "❗️❗️ Error occurred during inference. Maximum reties reached for rate limit or other error. Continuing to next test case."
+    )
+    print(f"❗️❗️ Test case ID: {test_case['id']}, Error: {str(e)}")
+    print("-" * 100)
+
+    return {
+        "id": test_case["id"],
+        "result": f"Error during inference: {str(e)}",
+    }
+
+
+class _InferenceRetries:
+    """
+    The retry, backoff and rate limiter bookkeeping of one test case, shared by `multi_threaded_inference` and
+    `async_inference`, which only differ in how they wait for a request slot and call the handler.
+    """
+
+    def __init__(self, test_case, rate_limiter):
+        self.test_case = test_case
+        self.rate_limiter = rate_limiter
+        self.retry_count = 0
+        self.wait_time = 0.0
+
+    @contextlib.contextmanager
+    def waiting(self):
+        # Wraps the wait for a request slot. After a throttled attempt, this is where the provider-wide backoff
+        # is spent.
+        wait_start = time.time()
+        yield
+        if self.retry_count > 0:
+            self.wait_time += time.time() - wait_start
+
+    def should_retry(self, e):
+        self.rate_limiter.release()
+        if self.retry_count < RETRY_LIMIT and _is_retryable_error(e):
+            delay = self.rate_limiter.record_throttle(e, self.retry_count)
+            print(
+                f"Rate limit reached for {self.rate_limiter.provider}. Backing off for {delay:.1f} seconds. Retry {self.retry_count + 1}/{RETRY_LIMIT}"
+            )
+            self.retry_count += 1
+            return True
+        return False
+
+    def error_result(self, e):
+        return self._add_throttle_stats(_inference_error_result(self.test_case, e))
+
+    def result(self, result, metadata):
+        self.rate_limiter.release()
+        self.rate_limiter.record_success()
+        result_to_write = {
+            "id": self.test_case["id"],
+            "result": result,
+        }
+        result_to_write.update(metadata)
+        return self._add_throttle_stats(result_to_write)
+
+    def _add_throttle_stats(self, result_to_write):
+        # Only recorded for throttled test cases, so that the result entries stay unchanged otherwise.
+        if self.retry_count > 0:
+            result_to_write["rate_limit_retry_count"] = self.retry_count
+            result_to_write["rate_limit_wait_time"] = round(self.wait_time, 2)
+        return result_to_write
+
+
+def multi_threaded_inference(handler, test_case, rate_limiter):
+    user_question, functions, test_category = unpack_test_case(test_case)
+    retries = _InferenceRetries(test_case, rate_limiter)
 
     while True:
+        with retries.waiting():
+            rate_limiter.acquire()
         try:
-            result, metadata = handler.inference(
-                user_question, functions, test_category
-            )
-            break  # Success, exit the loop
+            result, metadata = handler.inference(user_question, functions, test_category)
         except Exception as e:
-            # TODO: It might be better to handle the exception in the handler itself rather than a universal catch block here, as each handler use different ways to call the endpoint.
-            # OpenAI has openai.RateLimitError while Anthropic has anthropic.RateLimitError. It would be more robust in the long run.
-            if retry_count < RETRY_LIMIT and (
-                "rate limit reached" in str(e).lower()
-                or (hasattr(e, "status_code") and (e.status_code in {429, 503, 500}))
-            ):
-                print(
-                    f"Rate limit reached. Sleeping for 65 seconds. Retry {retry_count + 1}/{RETRY_LIMIT}"
-                )
-                time.sleep(RETRY_DELAY)
-                retry_count += 1
-            else:
-                # This is usually the case when the model getting stuck on one particular test case.
-                # For example, timeout error or FC model returning invalid JSON response.
-                # Since temperature is already set to 0.001, retrying the same test case will not help.
-                # So we continue the generation process and record the error message as the model response
-                print("-" * 100)
-                print(
-                    "❗️❗️ Error occurred during inference. Maximum reties reached for rate limit or other error. Continuing to next test case."
-                )
-                print(f"❗️❗️ Test case ID: {test_case['id']}, Error: {str(e)}")
-                print("-" * 100)
+            if retries.should_retry(e):
+                continue
+            return retries.error_result(e)
+        return retries.result(result, metadata)
 
-                return {
-                    "id": test_case["id"],
-                    "result": f"Error during inference: {str(e)}",
-                }
 
-    result_to_write = {
-        "id": test_case["id"],
-        "result": result,
-    }
-    
-    result_to_write.update(metadata)
+async def async_inference(handler, test_case, rate_limiter):
+    user_question, functions, test_category = unpack_test_case(test_case)
+    retries = _InferenceRetries(test_case, rate_limiter)
 
-    return result_to_write
+    while True:
+        with retries.waiting():
+            await rate_limiter.acquire_async()
+        try:
+            result, metadata = await handler.inference_async(user_question, functions, test_category)
+        except Exception as e:
+            if retries.should_retry(e):
+                continue
+            return retries.error_result(e)
+        return retries.result(result, metadata)
+
+
+def print_rate_limiter_stats():
+    for stats in get_all_rate_limiter_stats():
+        if stats["throttle_count"] == 0:
+            continue
+        print(
+            f"⏳ {stats['provider']}: {stats['throttle_count']} of {stats['request_count']} requests throttled, "
+            f"{stats['backoff_time']}s total backoff, concurrency limit went down to {stats['lowest_concurrency_limit']} "
+            f"and ended at {stats['concurrency_limit']}."
+        )
 
 
-def generate_results(args, model_name, test_cases_total):
+def print_response_cache_stats(response_cache):
+    stats = response_cache.get_stats()
+    print(
+        f"🗄️ Response cache: {stats['hit_count']} hits, {stats['miss_count']} misses "
+        f"(hit rate {stats['hit_rate']:.1%}), {stats['eviction_count']} evicted, "
+        f"{stats['entry_count']} entries using {stats['size_mb']} MB."
+    )
 
-    handler = build_handler(model_name, args.temperature, args.top_p, args.max_tokens)
 
-    if handler.model_style == ModelStyle.OSSMODEL:
+def print_transport_stats():
+    for stats in get_all_transport_stats():
+        print(
+            f"🔌 {stats['host']}: {stats['request_count']} requests over {stats['connection_count']} connections "
+            f"({stats['connection_reuse_rate']:.1%} reused)."
+        )
+
+
+def generate_oss_results(args, handler, test_cases_total):
+    """
+    Generate the results of a local model chunk by chunk. Each chunk's results are committed to the result store
+    before the next chunk starts, so a crash only loses the current chunk, and a rerun resumes after the last
+    committed test case (`collect_test_cases` skips the ids that are already in the store).
+
+    Test cases are generated grouped by shared prompt prefix, for vLLM's prefix cache; the result store's export
+    puts the result files back in dataset order.
+    """
+    test_cases_total = order_by_shared_prefix(test_cases_total)
+    handler.backend = args.oss_backend
+    if args.oss_backend == "transformers":
+        handler.backend_options = {
+            "quantize": args.cpu_quantize,
+            "num_threads": args.cpu_threads,
+            "max_batch_tokens": args.cpu_max_batch_tokens,
+        }
+    elif args.oss_backend == "server":
+        handler.backend_options = {
+            "base_url": args.oss_server_url,
+            "max_concurrency": args.max_concurrency,
+        }
+    chunk_size = args.oss_chunk_size if args.oss_chunk_size > 0 else len(test_cases_total)
+    result_store = get_result_store(handler.result_dir)
+    num_chunks = (len(test_cases_total) + chunk_size - 1) // chunk_size
+
+    for chunk_index, start in enumerate(range(0, len(test_cases_total), chunk_size)):
+        chunk = test_cases_total[start : start + chunk_size]
+        start_time = time.time()
         results, processed_messages = handler.inference(
-            test_question=test_cases_total,
+            test_question=chunk,
             num_gpus=args.num_gpus,
             gpu_memory_utilization=args.gpu_memory_utilization,
         )
-        for test_case, result, processed_message in zip(test_cases_total, results, processed_messages):
+        for test_case, result, processed_message in zip(chunk, results, processed_messages):
             result_to_write = {"id": test_case["id"], "result": result, "processed_message": processed_message}
             handler.write(result_to_write)
+        result_store.flush()
+
+        # The first chunk also includes loading the engine.
+        elapsed_time = time.time() - start_time
+        throughput = f"{len(chunk) / elapsed_time:.2f} test cases/s"
+        if handler.last_token_counts is not None:
+            throughput += f", {handler.last_token_counts['output_token_count'] / elapsed_time:.1f} output tokens/s"
+        if handler.last_prefix_hit_rate is not None:
+            throughput += f", estimated prefix cache hit rate {handler.last_prefix_hit_rate:.1%}"
+        print(
+            f"Chunk {chunk_index + 1}/{num_chunks} for {handler.model_name}: "
+            f"{len(chunk)} test cases in {elapsed_time:.1f}s ({throughput})."
+        )
+
+
+def generate_results(args, handler, test_cases_total):
+    model_name = handler.model_name
+
+    if handler.model_style == ModelStyle.OSSMODEL:
+        generate_oss_results(args, handler, test_cases_total)
 
     else:
         futures = []
@@ -186,19 +426,73 @@ def generate_results(args, model_name, test_cases_total):
                 total=len(test_cases_total), desc=f"Generating results for {model_name}"
             ) as pbar:
 
+                rate_limiter = get_rate_limiter(handler.provider, args.num_threads)
                 for test_case in test_cases_total:
                     future = executor.submit(
-                        multi_threaded_inference, handler, test_case
+                        multi_threaded_inference, handler, test_case, rate_limiter
                     )
                     futures.append(future)
 
-                for future in futures:
-                    # This will wait for the task to complete, so that we are always writing in order
+                # Persist each result as soon as it completes, so that a slow request doesn't hold back the ones
+                # behind it. The result files are put back in dataset order when the result store is exported.
+                for future in as_completed(futures):
                     result = future.result()
                     handler.write(result)
                     pbar.update()
 
 
+async def async_generate_results(args, generation_jobs):
+    """
+    Run inference for several hosted models on one shared event loop.
+
+    `generation_jobs` is a list of (handler, test_cases) pairs. Each provider gets its own semaphore of
+    `--max-concurrency` slots, and a test case is only scheduled once a slot for its provider is free, so
+    the number of pending tasks stays bounded no matter how many test cases there are. Within that bound,
+    the provider's adaptive rate limiter decides how many requests are actually in flight.
+    """
+    # Handlers that stay synchronous are offloaded to the default executor; size it so that it is not the bottleneck.
+    num_providers = len({handler.provider for handler, _ in generation_jobs})
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=args.max_concurrency * num_providers)
+    )
+
+    # Interleave the test cases of models that share a provider, so that they make progress together.
+    provider_queues = defaultdict(list)
+    for handler, test_cases in generation_jobs:
+        provider_queues[handler.provider].append(
+            [(handler, test_case) for test_case in test_cases]
+        )
+
+    total = sum(len(test_cases) for _, test_cases in generation_jobs)
+    with tqdm(total=total, desc=f"Generating results for {len(generation_jobs)} model(s)") as pbar:
+
+        async def run_one(semaphore, handler, test_case):
+            try:
+                rate_limiter = get_rate_limiter(handler.provider, args.max_concurrency)
+                result = await async_inference(handler, test_case, rate_limiter)
+                # Written in completion order; the result store's export puts the files back in dataset order.
+                handler.write(result)
+                pbar.update()
+            finally:
+                semaphore.release()
+
+        async def run_provider(queues):
+            semaphore = asyncio.Semaphore(args.max_concurrency)
+            tasks = set()
+            for round_robin in zip_longest(*queues):
+                for job in round_robin:
+                    if job is None:
+                        continue
+                    # Backpressure: wait for a free slot before scheduling the next request.
+                    await semaphore.acquire()
+                    task = asyncio.create_task(run_one(semaphore, *job))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+            await asyncio.gather(*tasks)
+
+        await asyncio.gather(*[run_provider(queues) for queues in provider_queues.values()])
+
+
 if __name__ == "__main__":
     args = get_args()
 
@@ -209,17 +503,91 @@ if __name__ == "__main__":
 
     test_name_total, test_filename_total = parse_test_category_argument(args.test_category)
 
+    if args.merge_shards:
+        complete = True
+        try:
+            for model_name in args.model:
+                if USE_COHERE_OPTIMIZATION and "command-r-plus" in model_name:
+                    model_name = model_name + "-optimized"
+                complete = merge_shards(test_filename_total, model_name, args.num_shards) and complete
+        finally:
+            close_all_result_stores(export=True)
+        sys.exit(0 if complete else 1)
+
+    # Size the per-host connection pools so that they are never the bottleneck.
+    configure_transport(
+        pool_size=(
+            args.max_concurrency
+            if args.use_async or args.oss_backend == "server"
+            else args.num_threads
+        ),
+        http2=args.http2,
+    )
+
+    if args.num_shards > 1:
+        print(f"Running shard {args.shard_index} of {args.num_shards}.")
+
     print(f"Generating results for {args.model} on test category: {test_name_total}.")
 
-    for model_name in args.model:
-        if USE_COHERE_OPTIMIZATION and "command-r-plus" in model_name:
-            model_name = model_name + "-optimized"
+    response_cache = None
+    if args.use_cache or args.refresh_cache:
+        response_cache = ResponseCache(
+            args.cache_dir, max_size_mb=args.cache_max_size, refresh=args.refresh_cache
+        )
 
-        test_cases_total = collect_test_cases(test_filename_total, model_name)
+    try:
+        async_generation_jobs = []
+        batch_generation_jobs = []
 
-        if len(test_cases_total) == 0:
-            print(
-                f"All selected test cases have been previously generated for {model_name}. No new test cases to generate."
+        for model_name in args.model:
+            if USE_COHERE_OPTIMIZATION and "command-r-plus" in model_name:
+                model_name = model_name + "-optimized"
+
+            test_cases_total = collect_test_cases(
+                test_filename_total, model_name, args.shard_index, args.num_shards
             )
-        else:
-            generate_results(args, model_name, test_cases_total)
+
+            if len(test_cases_total) == 0:
+                print(
+                    f"All selected test cases have been previously generated for {model_name}. No new test cases to generate."
+                )
+                continue
+
+            # Built once per model, so that OSS models only load their tokenizer once.
+            result_dir = get_result_dir(model_name, args.shard_index, args.num_shards)
+            handler = build_handler(
+                model_name, args.temperature, args.top_p, args.max_tokens, response_cache, result_dir
+            )
+
+            if args.batch_api:
+                if handler.batch_api is not None:
+                    batch_generation_job = BatchGenerationJob(handler, test_cases_total, result_dir)
+                    # Submit right away, so that the provider works on the batch while the other models generate.
+                    batch_generation_job.submit()
+                    batch_generation_jobs.append(batch_generation_job)
+                    continue
+                print(f"{model_name} has no batch API support; generating its results one request at a time.")
+
+            if args.use_async:
+                # OSS models are batched locally by vLLM, so they don't go through the async engine.
+                if handler.model_style != ModelStyle.OSSMODEL:
+                    async_generation_jobs.append((handler, test_cases_total))
+                    continue
+
+            generate_results(args, handler, test_cases_total)
+
+        if async_generation_jobs:
+            asyncio.run(async_generate_results(args, async_generation_jobs))
+        if batch_generation_jobs:
+            run_batch_generation(batch_generation_jobs, args.batch_poll_interval)
+    finally:
+        # Commit the pending writes (also when interrupted), then rewrite the result files deduplicated and in dataset order.
+        close_all_result_stores(export=True)
+
+    print_rate_limiter_stats()
+    print_transport_stats()
+    close_all_transports()
+
+    if response_cache is not None:
+        print_response_cache_stats(response_cache)
+        response_cache.close()
@@ -0,0 +1,252 @@
+"""
+Local stand-in for the OpenAI Batch and Anthropic Message Batches endpoints, to try `--batch-api` without network access.
+
+    python scripts/batch_api_stub.py --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8765 \
+        python openfunctions_evaluation.py --model gpt-4o-2024-05-13-FC --test-category simple --batch-api --batch-poll-interval 1
+
+Batches finish on the second status check. Every request is answered with a canned completion: a call to the first
+tool with empty arguments if the request has tools, a fixed text otherwise.
+"""
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_TEXT = "This is a stub response."
+
+_ids = itertools.count()
+_lock = threading.Lock()
+_files = {}
+_batches = {}
+
+
+def _new_id(prefix):
+    return f"{prefix}{next(_ids)}"
+
+
+def _openai_completion(body):
+    tools = body.get("tools") or []
+    if tools:
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [
+                {
+                    "id": _new_id("call_"),
+                    "type": "function",
+                    "function": {"name": tools[0]["function"]["name"], "arguments": "{}"},
+                }
+            ],
+        }
+        finish_reason = "tool_calls"
+    else:
+        message = {"role": "assistant", "content": STUB_TEXT}
+        finish_reason = "stop"
+    return {
+        "id": _new_id("chatcmpl-"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body["model"],
+        "choices": [
+            {"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}
+        ],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+
+
+def _anthropic_message(params):
+    tools = params.get("tools") or []
+    if tools:
+        content = [{"type": "tool_use", "id": _new_id("toolu_"), "name": tools[0]["name"], "input": {}}]
+        stop_reason = "tool_use"
+    else:
+        content = [{"type": "text", "text": STUB_TEXT}]
+        stop_reason = "end_turn"
+    return {
+        "id": _new_id("msg_"),
+        "type": "message",
+        "role": "assistant",
+        "model": params["model"],
+        "content": content,
+        "stop_reason": stop_reason,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1, "output_tokens": 1},
+    }
+
+
+def _openai_batch_object(batch):
+    return {
+        "id": batch["id"],
+        "object": "batch",
+        "endpoint": batch["endpoint"],
+        "input_file_id": batch["input_file_id"],
+        "completion_window": batch["completion_window"],
+        "status": batch["status"],
+        "output_file_id": batch.get("output_file_id"),
+        "error_file_id": None,
+        "created_at": batch["created_at"],
+    }
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data, status=200):
+        self._send(json.dumps(data).encode("utf-8"), "application/json", status)
+
+    def _send(self, payload, content_type, status=200):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _read_body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        body = self._read_body()
+        with _lock:
+            if self.path == "/v1/files":
+                self._upload_file(body)
+            elif self.path == "/v1/batches":
+                self._create_openai_batch(json.loads(body))
+            elif self.path == "/v1/messages/batches":
+                self._create_anthropic_batch(json.loads(body))
+            else:
+                self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def do_GET(self):
+        with _lock:
+            parts = self.path.strip("/").split("/")
+            if parts[:2] == ["v1", "batches"] and len(parts) == 3:
+                self._retrieve_openai_batch(parts[2])
+            elif parts[:2] == ["v1", "files"] and len(parts) == 4 and parts[3] == "content":
+                self._send(_files[parts[2]], "application/jsonl")
+            elif parts[:3] == ["v1", "messages", "batches"] and len(parts) == 4:
+                self._retrieve_anthropic_batch(parts[3])
+            elif parts[:3] == ["v1", "messages", "batches"] and len(parts) == 5 and parts[4] == "results":
+                self._send(_batches[parts[3]]["results"], "application/jsonl")
+            else:
+                self._send_json({"error": {"message": f"Unknown path {self.path}"}}, 404)
+
+    def _upload_file(self, body):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body
+        )
+        content = filename = None
+        for part in message.iter_parts():
+            if part.get_param("name", header="content-disposition") == "file":
+                content = part.get_payload(decode=True)
+                filename = part.get_filename()
+        file_id = _new_id("file-")
+        _files[file_id] = content
+        self._send_json(
+            {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(content),
+                "created_at": int(time.time()),
+                "filename": filename,
+                "purpose": "batch",
+                "status": "processed",
+            }
+        )
+
+    def _create_openai_batch(self, request):
+        batch = {
+            "id": _new_id("batch_"),
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request["completion_window"],
+            "status": "in_progress",
+            "created_at": int(time.time()),
+        }
+        _batches[batch["id"]] = batch
+        self._send_json(_openai_batch_object(batch))
+
+    def _retrieve_openai_batch(self, batch_id):
+        batch = _batches[batch_id]
+        if batch["status"] == "in_progress":
+            # Finish on the second status check, so that the client goes through at least one poll.
+            if batch.get("checked"):
+                output = []
+                for line in _files[batch["input_file_id"]].decode("utf-8").splitlines():
+                    if not line.strip():
+                        continue
+                    request = json.loads(line)
+                    output.append(
+                        json.dumps(
+                            {
+                                "id": _new_id("batch_req_"),
+                                "custom_id": request["custom_id"],
+                                "response": {
+                                    "status_code": 200,
+                                    "request_id": _new_id("req_"),
+                                    "body": _openai_completion(request["body"]),
+                                },
+                                "error": None,
+                            }
+                        )
+                    )
+                output_file_id = _new_id("file-")
+                _files[output_file_id] = ("\n".join(output) + "\n").encode("utf-8")
+                batch["output_file_id"] = output_file_id
+                batch["status"] = "completed"
+            batch["checked"] = True
+        self._send_json(_openai_batch_object(batch))
+
+    def _create_anthropic_batch(self, request):
+        batch_id = _new_id("msgbatch_")
+        results = [
+            json.dumps(
+                {
+                    "custom_id": entry["custom_id"],
+                    "result": {"type": "succeeded", "message": _anthropic_message(entry["params"])},
+                }
+            )
+            for entry in request["requests"]
+        ]
+        _batches[batch_id] = {
+            "results": ("\n".join(results) + "\n").encode("utf-8"),
+            "checked": False,
+        }
+        self._send_json({"id": batch_id, "type": "message_batch", "processing_status": "in_progress"})
+
+    def _retrieve_anthropic_batch(self, batch_id):
+        batch = _batches[batch_id]
+        status = "ended" if batch["checked"] else "in_progress"
+        batch["checked"] = True
+        host, port = self.server.server_address[:2]
+        self._send_json(
+            {
+                "id": batch_id,
+                "type": "message_batch",
+                "processing_status": status,
+                "results_url": (
+                    f"http://{host}:{port}/v1/messages/batches/{batch_id}/results"
+                    if status == "ended"
+                    else None
+                ),
+            }
+        )
+
+
+def run_stub_server(port, host="127.0.0.1"):
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    print(f"Batch API stub server listening on http://{host}:{port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", default=8765, type=int)
+    args = parser.parse_args()
+    run_stub_server(args.port)
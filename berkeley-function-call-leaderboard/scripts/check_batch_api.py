@@ -0,0 +1,86 @@
+"""
+Check that `--batch-api` sends the same request and writes the same result as a normal run, for one test case of a
+prompting (non-FC) GPT model, whose handler edits the question in place. Runs offline with a canned answer.
+
+    python scripts/check_batch_api.py
+"""
+
+import copy
+import json
+import os
+import sys
+
+LEADERBOARD_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, LEADERBOARD_DIR)
+# The client is never used to send anything.
+os.environ.setdefault("OPENAI_API_KEY", "unused")
+
+from bfcl.model_handler.batch_api import OpenAIBatchClient, parse_response, render_request
+from bfcl.model_handler.gpt_handler import OpenAIHandler
+from bfcl.model_handler.utils import unpack_test_case
+
+MODEL_NAME = "gpt-4o-2024-05-13"
+DATASET_PATH = os.path.join(LEADERBOARD_DIR, "data", "BFCL_v2_simple.json")
+CANNED_RESPONSE = {
+    "id": "chatcmpl-check",
+    "object": "chat.completion",
+    "created": 0,
+    "model": MODEL_NAME,
+    "choices": [
+        {
+            "index": 0,
+            "message": {"role": "assistant", "content": "[calculate_triangle_area(base=10, height=5)]"},
+            "finish_reason": "stop",
+        }
+    ],
+    "usage": {"prompt_tokens": 100, "completion_tokens": 10, "total_tokens": 110},
+}
+
+
+def run_normally(handler, test_case, response):
+    # What `multi_threaded_inference` does, with the SDK call answered by `response`.
+    sent_requests = []
+
+    def answer(send, request):
+        sent_requests.append(copy.deepcopy(request))
+        return response, None
+
+    handler._request_interceptor = answer
+    try:
+        user_question, functions, test_category = unpack_test_case(copy.deepcopy(test_case))
+        result, metadata = handler.inference(user_question, functions, test_category)
+    finally:
+        handler._request_interceptor = None
+    del metadata["latency"]
+
+    result_to_write = {"id": test_case["id"], "result": result}
+    result_to_write.update(metadata)
+    return sent_requests[0], result_to_write
+
+
+def main():
+    with open(DATASET_PATH) as f:
+        test_case = json.loads(f.readline())
+    handler = OpenAIHandler(MODEL_NAME)
+    response = OpenAIBatchClient.to_response(CANNED_RESPONSE)
+
+    request, result = run_normally(handler, test_case, response)
+    batch_request = render_request(handler, test_case)
+    batch_result = parse_response(handler, test_case, response)
+
+    mismatches = []
+    if batch_request != request:
+        mismatches.append(("request", request, batch_request))
+    if batch_result != result:
+        mismatches.append(("result", result, batch_result))
+    for name, expected, actual in mismatches:
+        print(f"The batch {name} of {test_case['id']} differs from a normal run.")
+        print(f"  normal: {json.dumps(expected)}")
+        print(f"  batch:  {json.dumps(actual)}")
+    if mismatches:
+        sys.exit(1)
+    print(f"The batch request and result of {test_case['id']} match a normal run.")
+
+
+if __name__ == "__main__":
+    main()